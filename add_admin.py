@@ -4,17 +4,29 @@
 """
 Скрипт для добавления администратора в базу данных notes.db.
 Использует модель User из models.py.
+
+Веб-приложение (app.py) не импортируется: достаточно настроек из config.py
+и подключения к базе. Схема должна быть создана заранее (flask --app app init-db).
 """
 
-from app import app, db
-from models import User
+from flask import Flask
+
+import config
+from models import db, User
+
+def create_script_app():
+    """Минимальное приложение Flask для работы с базой из скрипта."""
+    app = Flask(__name__)
+    app.config.update(config.load_config(instance_path=app.instance_path))
+    db.init_app(app)
+    return app
 
 def add_admin_user():
     """Добавляет администратора Ars1 с паролем Admin1."""
     username = 'Ars1'
     password = 'Admin1'
 
-    with app.app_context():
+    with create_script_app().app_context():
         # Проверяем, существует ли уже пользователь с таким именем
         existing_user = User.query.filter_by(username=username).first()
 
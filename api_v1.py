@@ -0,0 +1,493 @@
+# api_v1.py
+# -*- coding: utf-8 -*-
+
+"""
+JSON API /api/v1 (Flask-RESTX + JWT).
+
+Для скриптов и мобильного клиента вместо разбора HTML и отправки форм:
+- POST /api/v1/auth/token — JWT по имени и паролю, дальше заголовок
+  Authorization: Bearer <токен>; роль хранится в токене, база не читается;
+- /notes, /articles, /tasks, /events, /categories — списки с курсорной
+  пагинацией (?cursor=, ?limit=) и выбором полей (?fields=id,title);
+  в списках по умолчанию нет тяжёлых полей (content, full_content);
+- POST /<коллекция>/batch — создание, изменение и удаление пачкой в одной
+  транзакции: либо применяется всё, либо ничего;
+- GET /sync?cursor= — только изменения и удаления после курсора (sync.py).
+
+Документация Swagger: /api/v1/docs.
+"""
+
+from datetime import datetime
+
+from flask import Blueprint, request
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
+from flask_jwt_extended.exceptions import JWTExtendedException
+from flask_restx import Api, Namespace, Resource
+from jwt.exceptions import PyJWTError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer, selectinload
+
+import calendar_feed
+import sync
+from models import db, Category, Event, Note, Task, User, note_categories
+from pagination import paginate_by_id, paginate_notes
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_BATCH_SIZE = 1000
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+api = Api(
+    api_v1,
+    version='1.0',
+    title='Мой Блокнот API',
+    doc='/docs',
+    authorizations={'Bearer': {'type': 'apiKey', 'in': 'header', 'name': 'Authorization'}},
+    security='Bearer',
+)
+
+
+class ApiError(Exception):
+    """Ошибка данных запроса; внутри пачки — с номером элемента."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+@api.errorhandler(ApiError)
+def _handle_api_error(error):
+    return {'message': error.message}, error.status
+
+
+# Flask-RESTX перехватывает исключения раньше обработчиков JWTManager
+@api.errorhandler(JWTExtendedException)
+@api.errorhandler(PyJWTError)
+def _handle_auth_error(error):
+    return {'message': f'Требуется авторизация: {error}'}, 401
+
+
+# --- Текущий пользователь из токена ---
+def current_user_id():
+    return int(get_jwt_identity())
+
+
+def current_is_admin():
+    return bool(get_jwt().get('is_admin'))
+
+
+def require_admin():
+    if not current_is_admin():
+        raise ApiError('Access denied', 403)
+# --- /Текущий пользователь из токена ---
+
+
+# --- Преобразование значений ---
+def _parse_datetime(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(value).replace(tzinfo=None)
+    except (TypeError, ValueError):
+        raise ApiError(f'{field}: ожидается дата в формате ISO 8601')
+
+
+_TYPE_NAMES = {str: 'строка', bool: 'true или false', int: 'целое число'}
+
+
+def _check_scalar(column, value, field):
+    """Значение должно иметь тип колонки: объект или список вместо строки — ошибка клиента, а не базы."""
+    expected = column.type.python_type
+    if value is None or (isinstance(value, expected) and (expected is bool or not isinstance(value, bool))):
+        return value
+    raise ApiError(f'{field}: ожидается {_TYPE_NAMES.get(expected, expected.__name__)}')
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def requested_fields(spec, listing):
+    """Поля из ?fields=; по умолчанию — все, в списках — без тяжёлых."""
+    raw = request.args.get('fields')
+    if not raw:
+        return spec.list_fields if listing else spec.fields
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(fields) - set(spec.fields)
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return fields if 'id' in fields else ['id', *fields]
+
+
+def requested_limit():
+    limit = request.args.get('limit', DEFAULT_LIMIT, type=int)
+    return min(max(limit, 1), MAX_LIMIT)
+# --- /Преобразование значений ---
+
+
+class ModelSpec:
+    """Описание коллекции API: модель, поля, права и правила записи."""
+
+    model = None
+    fields = ()
+    heavy_fields = () # Не выводятся в списках без явного ?fields=
+    writable = ()
+    required = ()
+    datetime_fields = ()
+    admin_only_writes = False
+
+    @property
+    def list_fields(self):
+        return [name for name in self.fields if name not in self.heavy_fields]
+
+    def base_query(self):
+        return self.model.query.filter(self.model.user_id == current_user_id())
+
+    def writable_query(self):
+        return self.base_query()
+
+    def paginate(self, query, cursor, limit):
+        return paginate_by_id(query, self.model, cursor, limit)
+
+    def with_options(self, query, fields):
+        return query
+
+    def serialize(self, obj, fields):
+        return {name: _to_json(getattr(obj, name)) for name in fields}
+
+    def create(self, data):
+        missing = [name for name in self.required if data.get(name) in (None, '')]
+        if missing:
+            raise ApiError(f'Обязательные поля: {", ".join(missing)}')
+        obj = self.model()
+        self.assign(obj, data)
+        if hasattr(self.model, 'user_id'):
+            obj.user_id = current_user_id()
+        db.session.add(obj)
+        return obj
+
+    def delete(self, obj):
+        db.session.delete(obj)
+
+    def assign(self, obj, data):
+        unknown = set(data) - set(self.writable) - {'id'}
+        if unknown:
+            raise ApiError(f'Поля только для чтения или неизвестные: {", ".join(sorted(unknown))}')
+        # Частичное изменение не может обнулить обязательное поле
+        cleared = [name for name in self.required if name in data and data[name] in (None, '')]
+        if cleared:
+            raise ApiError(f'Обязательные поля: {", ".join(cleared)}')
+        for name in self.writable:
+            if name in data:
+                value = data[name]
+                if name in self.datetime_fields:
+                    value = _parse_datetime(value, name)
+                else:
+                    value = _check_scalar(self.model.__table__.c[name], value, name)
+                setattr(obj, name, value)
+
+
+class NoteSpec(ModelSpec):
+    model = Note
+    fields = ('id', 'title', 'note_type', 'summary', 'excerpt', 'content', 'full_content', 'rendered_html',
+              'word_count', 'reading_time', 'lead_image', 'tags', 'categories', 'background_color',
+              'image_filename', 'preview_image', 'is_published', 'user_id', 'created_at', 'updated_at')
+    heavy_fields = ('content', 'full_content', 'rendered_html')
+    writable = ('title', 'note_type', 'summary', 'content', 'full_content', 'tags', 'categories',
+                'background_color', 'image_filename', 'preview_image', 'is_published')
+    admin_only_writes = True
+    note_type = None # Тип, которым ограничена коллекция (статьи)
+
+    def base_query(self):
+        # Как на сайте: админ работает со своими записями, остальные видят опубликованные
+        if current_is_admin():
+            query = Note.query.filter(Note.user_id == current_user_id())
+        else:
+            query = Note.query.filter(Note.is_published.is_(True))
+        if self.note_type:
+            query = query.filter(Note.note_type == self.note_type)
+        return query
+
+    def writable_query(self):
+        query = Note.query.filter(Note.user_id == current_user_id())
+        return query.filter(Note.note_type == self.note_type) if self.note_type else query
+
+    def paginate(self, query, cursor, limit):
+        return paginate_notes(query, cursor, limit)
+
+    def with_options(self, query, fields):
+        # Не читаем из базы тяжёлые колонки, которые не попадут в ответ
+        query = query.options(*[defer(getattr(Note, name)) for name in self.heavy_fields if name not in fields])
+        if 'categories' in fields:
+            query = query.options(selectinload(Note.categories))
+        return query
+
+    def serialize(self, obj, fields):
+        data = {name: _to_json(getattr(obj, name)) for name in fields if name != 'categories'}
+        if 'categories' in fields:
+            data['categories'] = [category.id for category in obj.categories]
+        return data
+
+    def create(self, data):
+        if self.note_type:
+            data = {**data, 'note_type': self.note_type}
+        return super().create(data)
+
+    def assign(self, obj, data):
+        categories = data.get('categories')
+        super().assign(obj, {k: v for k, v in data.items() if k != 'categories'})
+        if self.note_type:
+            obj.note_type = self.note_type
+        if categories is not None:
+            if not isinstance(categories, list):
+                raise ApiError('categories: ожидается список id')
+            ids = {int(cid) for cid in categories if str(cid).isdigit()}
+            obj.categories = Category.query.filter(Category.id.in_(ids)).all() if ids else []
+
+
+class ArticleSpec(NoteSpec):
+    note_type = 'article'
+
+
+class TaskSpec(ModelSpec):
+    model = Task
+    fields = ('id', 'title', 'description', 'due_date', 'completed', 'priority', 'created_at', 'updated_at')
+    writable = ('title', 'description', 'due_date', 'completed', 'priority')
+    required = ('title',)
+    datetime_fields = ('due_date',)
+
+    def assign(self, obj, data):
+        if 'priority' in data and data['priority'] not in ('low', 'normal', 'high'):
+            raise ApiError('priority: low, normal или high')
+        super().assign(obj, data)
+
+
+class EventSpec(ModelSpec):
+    model = Event
+    fields = ('id', 'title', 'description', 'start_time', 'end_time', 'location', 'recurrence',
+              'recurrence_until', 'created_at', 'updated_at')
+    writable = ('title', 'description', 'start_time', 'end_time', 'location', 'recurrence', 'recurrence_until')
+    required = ('title', 'start_time')
+    datetime_fields = ('start_time', 'end_time', 'recurrence_until')
+
+    def assign(self, obj, data):
+        if data.get('recurrence') not in (None, *calendar_feed.RECURRENCE_CHOICES):
+            raise ApiError(f'recurrence: {", ".join(calendar_feed.RECURRENCE_CHOICES)} или null')
+        super().assign(obj, data)
+
+
+class CategorySpec(ModelSpec):
+    model = Category
+    fields = ('id', 'name')
+    writable = ('name',)
+    required = ('name',)
+    admin_only_writes = True
+
+    def base_query(self):
+        return Category.query
+
+    def delete(self, obj):
+        # Связи с записями удаляются одним запросом, как в delete_category()
+        db.session.execute(note_categories.delete().where(note_categories.c.category_id == obj.id))
+        db.session.delete(obj)
+
+
+# --- Ресурсы коллекций ---
+def _is_object_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _apply_batch(spec, payload):
+    """Применяет пачку в текущей транзакции. Возвращает id по операциям."""
+    if not isinstance(payload, dict):
+        raise ApiError('Ожидается объект {"create": [...], "update": [...], "delete": [...]}')
+    creates, updates, deletes = (payload.get(key) or [] for key in ('create', 'update', 'delete'))
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        raise ApiError('create, update и delete должны быть списками')
+    if len(creates) + len(updates) + len(deletes) > MAX_BATCH_SIZE:
+        raise ApiError(f'Не больше {MAX_BATCH_SIZE} операций в одной пачке', 413)
+
+    for index, item in enumerate(updates):
+        if not isinstance(item, dict) or not _is_object_id(item.get('id')):
+            raise ApiError(f'update[{index}]: ожидается объект с целым id')
+    for index, object_id in enumerate(deletes):
+        if not _is_object_id(object_id):
+            raise ApiError(f'delete[{index}]: ожидается целый id')
+
+    # Все изменяемые и удаляемые объекты — двумя запросами, а не по одному на элемент
+    wanted = {item['id'] for item in updates} | set(deletes)
+    existing = {obj.id: obj for obj in spec.writable_query().filter(spec.model.id.in_(wanted))} if wanted else {}
+
+    created = []
+    for index, item in enumerate(creates):
+        if not isinstance(item, dict):
+            raise ApiError(f'create[{index}]: ожидается объект')
+        try:
+            created.append(spec.create(item))
+        except ApiError as error:
+            raise ApiError(f'create[{index}]: {error.message}', error.status)
+    for index, item in enumerate(updates):
+        obj = existing.get(item['id'])
+        if obj is None:
+            raise ApiError(f'update[{index}]: объект не найден', 404)
+        try:
+            spec.assign(obj, item)
+        except ApiError as error:
+            raise ApiError(f'update[{index}]: {error.message}', error.status)
+    for index, object_id in enumerate(deletes):
+        obj = existing.get(object_id)
+        if obj is None:
+            raise ApiError(f'delete[{index}]: объект не найден', 404)
+        spec.delete(obj)
+
+    db.session.flush()
+    return {
+        'created': [obj.id for obj in created],
+        'updated': [item['id'] for item in updates],
+        'deleted': list(deletes),
+    }
+
+
+def _constraint_error(error):
+    """409 — только для повтора уникального значения; прочие ограничения базы — ошибка данных."""
+    if 'UNIQUE constraint failed' in str(error.orig):
+        return ApiError('Нарушено ограничение уникальности', 409)
+    return ApiError(f'Данные нарушают ограничения базы: {error.orig}', 400)
+
+
+def _commit():
+    try:
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        raise _constraint_error(error)
+
+
+def register_collection(name, spec, description):
+    ns = Namespace(name, description=description)
+
+    @ns.route('/')
+    class Collection(Resource):
+        method_decorators = [jwt_required()]
+
+        @ns.doc(params={'fields': 'Поля через запятую', 'cursor': 'Курсор следующей страницы',
+                        'limit': f'Размер страницы (до {MAX_LIMIT})'})
+        def get(self):
+            fields = requested_fields(spec, listing=True)
+            query = spec.with_options(spec.base_query(), fields)
+            page = spec.paginate(query, request.args.get('cursor'), requested_limit())
+            return {'items': [spec.serialize(obj, fields) for obj in page.items], 'next_cursor': page.next_cursor}
+
+        def post(self):
+            if spec.admin_only_writes:
+                require_admin()
+            obj = spec.create(request.get_json(silent=True) or {})
+            _commit()
+            return spec.serialize(obj, spec.fields), 201
+
+    @ns.route('/<int:object_id>')
+    class Item(Resource):
+        method_decorators = [jwt_required()]
+
+        @ns.doc(params={'fields': 'Поля через запятую'})
+        def get(self, object_id):
+            fields = requested_fields(spec, listing=False)
+            obj = spec.with_options(spec.base_query(), fields).filter(spec.model.id == object_id).first()
+            if obj is None:
+                raise ApiError('Не найдено', 404)
+            return spec.serialize(obj, fields)
+
+        def patch(self, object_id):
+            if spec.admin_only_writes:
+                require_admin()
+            obj = spec.writable_query().filter(spec.model.id == object_id).first()
+            if obj is None:
+                raise ApiError('Не найдено', 404)
+            spec.assign(obj, request.get_json(silent=True) or {})
+            _commit()
+            return spec.serialize(obj, spec.fields)
+
+        def delete(self, object_id):
+            if spec.admin_only_writes:
+                require_admin()
+            obj = spec.writable_query().filter(spec.model.id == object_id).first()
+            if obj is None:
+                raise ApiError('Не найдено', 404)
+            spec.delete(obj)
+            _commit()
+            return '', 204
+
+    @ns.route('/batch')
+    class Batch(Resource):
+        method_decorators = [jwt_required()]
+
+        def post(self):
+            """Пачка {"create": [...], "update": [{"id": ..}], "delete": [id, ..]} в одной транзакции."""
+            if spec.admin_only_writes:
+                require_admin()
+            try:
+                result = _apply_batch(spec, request.get_json(silent=True))
+            except ApiError:
+                db.session.rollback()
+                raise
+            except IntegrityError as error:
+                db.session.rollback()
+                raise _constraint_error(error)
+            _commit()
+            return result
+
+    api.add_namespace(ns)
+    return ns
+
+
+register_collection('notes', NoteSpec(), 'Записи')
+register_collection('articles', ArticleSpec(), 'Статьи')
+register_collection('tasks', TaskSpec(), 'Задачи')
+register_collection('events', EventSpec(), 'События')
+register_collection('categories', CategorySpec(), 'Категории')
+# --- /Ресурсы коллекций ---
+
+
+# --- Синхронизация ---
+sync_ns = Namespace('sync', description='Изменения после курсора')
+
+
+@sync_ns.route('')
+class Sync(Resource):
+    method_decorators = [jwt_required()]
+
+    @sync_ns.doc(params={'cursor': 'Курсор из прошлого ответа (без него — полный снимок)',
+                         'limit': f'Строк каждого типа (до {sync.MAX_LIMIT})'})
+    def get(self):
+        """Записи, задачи и события, изменённые или удалённые после курсора; 410 — нужен полный снимок."""
+        try:
+            return sync.collect_changes(current_user_id(), current_is_admin(), request.args.get('cursor'),
+                                        request.args.get('limit', sync.DEFAULT_LIMIT, type=int))
+        except sync.SyncResetRequired as error:
+            raise ApiError(f'Нужна полная синхронизация: {error}', 410)
+
+
+api.add_namespace(sync_ns)
+# --- /Синхронизация ---
+
+
+# --- Получение токена ---
+auth_ns = Namespace('auth', description='JWT-токены')
+
+
+@auth_ns.route('/token')
+class Token(Resource):
+    @auth_ns.doc(security=None)
+    def post(self):
+        """Выдаёт access-токен по {"username": ..., "password": ...}."""
+        data = request.get_json(silent=True) or {}
+        user = User.query.filter_by(username=data.get('username')).first()
+        if user is None or not user.check_password(data.get('password') or ''):
+            raise ApiError('Неверное имя пользователя или пароль', 401)
+        token = create_access_token(identity=str(user.id), additional_claims={'is_admin': bool(user.is_admin)})
+        return {'access_token': token, 'token_type': 'Bearer'}
+
+
+api.add_namespace(auth_ns)
+# --- /Получение токена ---
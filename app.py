@@ -1,59 +1,330 @@
 # app.py
 # -*- coding: utf-8 -*-
 import os
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory, flash, jsonify
-from werkzeug.utils import secure_filename
-from models import db, Note, Category, User, Task, Event, note_categories
+import tarfile
+import click
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, send_from_directory, flash, jsonify, make_response, abort, stream_with_context
+from models import db, Note, Category, User, Task, Event, PushSubscription, note_categories, ensure_autoincrement, ensure_columns, ensure_indexes, schema_changes
 from datetime import datetime
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_caching import Cache
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///notes.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-UPLOAD_FOLDER = 'static/uploads'
+from sqlalchemy.orm import defer, load_only
+from flask_login import login_user, logout_user, login_required, current_user
+from extensions import cache, jwt, login_manager
+import config as app_config
+import search
+import tags
+import page_cache
+from page_cache import cached_page
+import http_cache
+import note_content
+import images
+import media_store
+import chunked_upload
+import calendar_feed
+import database
+import instrumentation
+import reminders
+import service_worker
+import assets
+import principals
+import backup
+import sync
+from api_v1 import api_v1
+from pagination import paginate_notes
+
+# Маршруты объявляются декоратором @route и добавляются в приложение в create_app()
+# без префикса blueprint'а: url_for('wall'), а не url_for('notebook.wall')
+ROUTES = []
+
+def route(rule, **options):
+    def decorator(view_func):
+        ROUTES.append((rule, options.pop('endpoint', None) or view_func.__name__, view_func, options))
+        return view_func
+    return decorator
+
+# Команды CLI, фильтры и глобальные переменные шаблонов подключаются blueprint'ом
+bp = Blueprint('notebook', __name__, cli_group=None)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-
-os.makedirs(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), exist_ok=True)
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def save_uploaded_image(file):
+    """Сохраняет изображение в хранилище по хешу и ставит создание его копий в очередь."""
+    filename, is_new = media_store.store_upload(file)
+    # Повторная загрузка того же файла: копии уже есть
+    if is_new:
+        images.schedule_processing(filename)
+    return filename
+
 # --- Настройка Flask-Login ---
-login_manager = LoginManager()
 # login_manager.login_view = 'login' # Убираем, так как теперь / может быть публичной
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-login_manager.init_app(app)
+    # Роль и имя из кэша в памяти процесса: запросы не обращаются к таблице user (см. principals.py)
+    return principals.load_principal(user_id)
 # --- /Настройка Flask-Login ---
 
-# --- Настройка кэширования ---
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
-# --- /Настройка кэширования ---
-
-db.init_app(app)
+# --- Фабрика приложения ---
+def create_app(config=None):
+    """Создаёт приложение.
+
+    config — имя профиля из config.py или словарь настроек поверх профиля
+    (NOTEBOOK_CONFIG, по умолчанию production). Схема базы создаётся здесь
+    только при AUTO_INIT_DB (development, testing); в production — командой
+    flask --app app init-db до запуска воркеров.
+    """
+    app = Flask(__name__)
+    overrides = config if isinstance(config, dict) else {}
+    app.config.update(app_config.load_config(config if isinstance(config, str) else overrides.get('CONFIG_PROFILE'),
+                                             app.instance_path))
+    app.config.update(overrides)
+
+    login_manager.init_app(app)
+    cache.init_app(app)
+    jwt.init_app(app)
+    app.register_blueprint(api_v1)
+    app.register_blueprint(bp)
+    for rule, endpoint, view_func, options in ROUTES:
+        app.add_url_rule(rule, endpoint, view_func, **options)
+    # Статические файлы: отпечатки в URL и сжатые копии (см. assets.py)
+    assets.init_app(app)
+
+    # Профиль SQLite (WAL, PRAGMA, пул соединений; см. database.py)
+    database.configure_database(app, app.config['DB_PROFILE'])
+    db.init_app(app)
+    with app.app_context():
+        database.install_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+        instrumentation.init_app(app, db.engine, cache)
+        if app.config['AUTO_INIT_DB']:
+            init_database()
+        else:
+            search.detect_search_index()
+    return app
 
-with app.app_context():
+def init_database():
+    """Создаёт и обновляет схему, переносит старые данные, строит индексы. Повторный запуск безопасен."""
+    os.makedirs(media_store.uploads_dir(), exist_ok=True)
     db.create_all()
-
-# --- Вспомогательная функция для работы с category_ids ---
+    ensure_columns(db.engine)
+    ensure_autoincrement(db.engine)
+    ensure_indexes(db.engine)
+    database.optimize(db.engine)
+    migrate_legacy_category_ids()
+    note_content.backfill_derived_fields()
+    # Индекс полнотекстового поиска; для существующей базы заполняем его сразу
+    if search.init_search_index():
+        search.rebuild_search_index()
+    # Индекс тегов для базы, созданной до появления таблиц tag/note_tag
+    if tags.tag_index_needs_rebuild():
+        tags.rebuild_tag_index()
+    # Ссылки записей на загрузки для базы, созданной до появления таблицы note_image
+    if note_content.image_index_needs_rebuild():
+        note_content.rebuild_image_index()
+# --- /Фабрика приложения ---
+
+# --- Вспомогательные функции для работы с категориями ---
 def parse_category_ids(category_ids_str):
     if category_ids_str:
-        return [int(id) for id in category_ids_str.split(',')]
+        return [int(id) for id in category_ids_str.split(',') if id.strip().isdigit()]
     return []
 
-def format_category_ids(category_list):
-    return ','.join(str(cat.id) for cat in category_list)
+def set_note_categories(note, selected_category_ids):
+    """Записывает категории записи в таблицу связи note_categories."""
+    ids = {int(cid) for cid in selected_category_ids if str(cid).isdigit()}
+    note.categories = Category.query.filter(Category.id.in_(ids)).all() if ids else []
+
+def filter_by_category(query, category_id):
+    # JOIN по индексу (category_id, note_id) вместо LIKE по строке category_ids
+    return query.join(note_categories, note_categories.c.note_id == Note.id) \
+                .filter(note_categories.c.category_id == category_id)
+
+def delete_category_links(category_id):
+    """Удаляет категорию и все её привязки двумя set-based запросами."""
+    db.session.execute(note_categories.delete().where(note_categories.c.category_id == category_id))
+    db.session.execute(Category.__table__.delete().where(Category.__table__.c.id == category_id))
+    # Bulk-запросы идут мимо ORM, поэтому кэш страниц сбрасываем явно
+    page_cache.mark_changed(db.session, page_cache.LISTS, page_cache.CATEGORIES)
+
+def merge_categories(source_id, target_id):
+    """Переносит записи категории source_id в target_id и удаляет source_id.
+
+    Записи, уже привязанные к обеим категориям, не дублируются (INSERT OR IGNORE).
+    Время выполнения зависит только от числа записей в категории, а не от всей таблицы.
+    """
+    db.session.execute(
+        note_categories.insert().prefix_with('OR IGNORE').from_select(
+            ['note_id', 'category_id'],
+            db.select(note_categories.c.note_id, db.literal(target_id))
+            .where(note_categories.c.category_id == source_id)
+        )
+    )
+    delete_category_links(source_id)
+
+def migrate_legacy_category_ids(batch_size=500):
+    """Переносит категории из строки Note.category_ids в таблицу note_categories.
+
+    Обрабатываются только записи с непустым category_ids; после переноса поле
+    очищается, поэтому повторный запуск ничего не делает. Возвращает число записей.
+    """
+    valid_ids = set(db.session.scalars(db.select(Category.id)))
+    note_table = Note.__table__
+    migrated = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Note.id, Note.category_ids)
+            .where(Note.category_ids.isnot(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        links = [
+            {'note_id': note_id, 'category_id': cid}
+            for note_id, category_ids_str in rows
+            for cid in set(parse_category_ids(category_ids_str)) if cid in valid_ids
+        ]
+        if links:
+            db.session.execute(note_categories.insert().prefix_with('OR IGNORE'), links)
+        # updated_at передаём явно, чтобы миграция не меняла дату изменения записей
+        db.session.execute(
+            note_table.update()
+            .where(note_table.c.id.in_([note_id for note_id, _ in rows]))
+            .values(category_ids=None, updated_at=note_table.c.updated_at)
+        )
+        db.session.commit()
+        migrated += len(rows)
+    return migrated
+
+# --- Команды CLI (flask --app app <команда>) ---
+@bp.cli.command('init-db')
+def init_db_command():
+    """Создаёт или обновляет схему базы и индексы (перед запуском воркеров и после обновления кода)."""
+    init_database()
+    missing = schema_changes(db.engine)
+    if missing:
+        raise click.ClickException('Схема не обновлена: ' + ', '.join(missing))
+    print("База данных готова")
+
+@bp.cli.command('migrate-categories')
+def migrate_categories_command():
+    """Переносит категории из Note.category_ids в note_categories."""
+    count = migrate_legacy_category_ids()
+    print(f"Перенесено записей: {count}")
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Перестраивает полнотекстовый индекс записей."""
+    search.init_search_index()
+    count = search.rebuild_search_index()
+    print(f"Проиндексировано записей: {count}")
+
+@bp.cli.command('rebuild-tag-index')
+def rebuild_tag_index_command():
+    """Перестраивает индекс тегов (tag/note_tag) по строкам Note.tags."""
+    count = tags.rebuild_tag_index()
+    print(f"Обработано записей: {count}")
+
+@bp.cli.command('backfill-note-content')
+def backfill_note_content_command():
+    """Заполняет очищенный HTML, превью, число слов и время чтения у старых записей."""
+    count = note_content.backfill_derived_fields()
+    print(f"Обработано записей: {count}")
+
+@bp.cli.command('process-images')
+def process_images_command():
+    """Создаёт уменьшенные копии для загрузок, у которых их ещё нет."""
+    if not images.processing_available():
+        print("Pillow не установлен: pip install Pillow")
+        return
+    count = images.process_pending()
+    print(f"Обработано изображений: {count}")
+
+@bp.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Только показать файлы без ссылок.')
+def gc_uploads_command(dry_run):
+    """Удаляет загрузки из хранилища, на которые не ссылается ни одна запись."""
+    removed = media_store.collect_garbage(dry_run=dry_run)
+    for name in removed:
+        print(name)
+    print(f"{'Будет удалено' if dry_run else 'Удалено'} файлов: {len(removed)}")
+
+@bp.cli.command('build-assets')
+def build_assets_command():
+    """Создаёт сжатые копии (.br/.gz) текстовых статических файлов."""
+    count = assets.compress_assets(current_app.static_folder, force=True)
+    print(f"Создано сжатых файлов: {count}")
+
+@bp.cli.command('prune-tombstones')
+def prune_tombstones_command():
+    """Удаляет отметки об удалении старше срока хранения (клиенты с такими курсорами загрузят снимок заново)."""
+    count = sync.prune_tombstones()
+    print(f"Удалено отметок: {count}")
+
+@bp.cli.command('telegram-bot')
+def telegram_bot_command():
+    """Запускает Telegram-бота для быстрых записей (NOTEBOOK_TELEGRAM_TOKEN)."""
+    try:
+        import telegram_bot # python-telegram-bot нужен только этой команде
+        telegram_bot.run_bot(current_app._get_current_object())
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
+
+@bp.cli.command('reminders')
+def reminders_command():
+    """Запускает планировщик напоминаний о задачах и событиях (отдельный процесс)."""
+    try:
+        scheduler = reminders.ReminderScheduler(current_app._get_current_object())
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        pass
+
+@bp.cli.command('link-telegram')
+@click.argument('username')
+@click.argument('telegram_id', type=int)
+def link_telegram_command(username, telegram_id):
+    """Привязывает Telegram ID (его показывает /start в боте) к пользователю."""
+    user = _cli_user(username)
+    user.telegram_id = telegram_id
+    db.session.commit()
+    print(f"Telegram ID {telegram_id} привязан к {user.username}")
+
+def _cli_user(username):
+    """Пользователь по имени или первый администратор."""
+    query = User.query.filter_by(username=username) if username else User.query.filter_by(is_admin=True).order_by(User.id)
+    user = query.first()
+    if user is None:
+        raise click.ClickException(f"Пользователь не найден: {username or 'администратор'}")
+    return user
+
+@bp.cli.command('export')
+@click.argument('directory')
+@click.option('--user', 'username', help='Выгрузить только записи, задачи и события этого пользователя.')
+def export_command(directory, username):
+    """Выгружает блокнот в DIRECTORY (notebook.ndjson + uploads.tar)."""
+    user_id = _cli_user(username).id if username else None
+    lines, files = backup.export_to_directory(directory, user_id)
+    print(f"Строк NDJSON: {lines}, файлов загрузок: {files}")
+
+@bp.cli.command('import')
+@click.argument('directory')
+@click.option('--user', 'username', help='Владелец импортированных данных (по умолчанию — первый администратор).')
+def import_command(directory, username):
+    """Загружает блокнот из DIRECTORY, созданного командой export."""
+    try:
+        counts, files = backup.import_from_directory(directory, _cli_user(username).id)
+    except backup.BackupFormatError as error:
+        raise click.ClickException(str(error))
+    print(', '.join(f"{name}: {count}" for name, count in counts.items()) + f", файлов загрузок: {files}")
+    if files:
+        print("Копии изображений: flask --app app process-images")
+# --- /Команды CLI ---
 
 # --- Маршрут для загрузки изображений ---
-@app.route('/upload_image', methods=['POST'])
+@route('/upload_image', methods=['POST'])
 @login_required
 def upload_image():
     if not current_user.is_admin:
@@ -68,40 +339,200 @@ def upload_image():
         return {'error': 'No file selected'}, 400
 
     if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        file_url = url_for('static', filename=f'uploads/{filename}')
+        filename = save_uploaded_image(file)
+        file_url = media_store.media_url(filename)
         # Очищаем кэш списка изображений при загрузке новой
         cache.delete('api_images')
         return {'location': file_url}
     else:
         return {'error': 'File type not allowed'}, 400
 
+# --- Загрузка изображений частями с докачкой (см. chunked_upload.py) ---
+def _upload_error(error):
+    return jsonify(error.to_dict()), error.status
+
+@route('/uploads', methods=['POST'])
+@login_required
+def start_chunked_upload():
+    if not current_user.is_admin:
+        return {'error': 'Access denied'}, 403
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = chunked_upload.start_upload(current_user.id, data.get('filename'), data.get('size'),
+                                             current_app.config['UPLOAD_MAX_SIZE'])
+    except chunked_upload.UploadError as error:
+        return _upload_error(error)
+    return jsonify(upload), 201
+
+@route('/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def chunked_upload_part(upload_id):
+    if not current_user.is_admin:
+        return {'error': 'Access denied'}, 403
+    try:
+        if request.method == 'GET':
+            response = jsonify(chunked_upload.upload_status(upload_id, current_user.id))
+            response.cache_control.no_store = True
+            return response
+        if request.method == 'DELETE':
+            chunked_upload.cancel_upload(upload_id, current_user.id)
+            return '', 204
+        offset = request.headers.get('Upload-Offset', type=int)
+        if offset is None:
+            return {'error': 'Нет заголовка Upload-Offset'}, 400
+        # Тело читается из потока по мере прихода, без разбора формы
+        offset = chunked_upload.append_chunk(upload_id, current_user.id, offset, request.stream)
+    except chunked_upload.UploadError as error:
+        return _upload_error(error)
+    return jsonify({'id': upload_id, 'offset': offset})
+
+@route('/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    if not current_user.is_admin:
+        return {'error': 'Access denied'}, 403
+    try:
+        filename, is_new = chunked_upload.complete_upload(upload_id, current_user.id)
+    except chunked_upload.UploadError as error:
+        return _upload_error(error)
+    if is_new:
+        images.schedule_processing(filename)
+    cache.delete('api_images')
+    return {'location': media_store.media_url(filename)}
+
+# --- Загруженные файлы ---
+@route('/media/<path:filename>')
+def media(filename):
+    response = send_from_directory(media_store.uploads_dir(), filename)
+    if media_store.is_content_addressed(filename):
+        # Имя — хеш содержимого: файл по этому URL никогда не изменится
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = media_store.IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+# --- Экспорт и импорт блокнота (см. backup.py) ---
+@route('/admin/export/notebook.ndjson')
+@login_required
+def export_notebook():
+    if not current_user.is_admin:
+        abort(403)
+    response = current_app.response_class(stream_with_context(backup.iter_export(current_user.id)), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=notebook.ndjson'
+    return response
+
+@route('/admin/export/uploads.tar')
+@login_required
+def export_uploads():
+    if not current_user.is_admin:
+        abort(403)
+    response = current_app.response_class(stream_with_context(backup.iter_uploads_tar(backup.referenced_uploads(current_user.id))), mimetype='application/x-tar')
+    response.headers['Content-Disposition'] = 'attachment; filename=uploads.tar'
+    return response
+
+@route('/admin/import', methods=['POST'])
+@login_required
+def import_notebook():
+    """Импорт файлов notebook (NDJSON) и uploads (tar); крупные архивы — командой flask import."""
+    if not current_user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    if 'notebook' not in request.files:
+        return jsonify({'error': 'No notebook file'}), 400
+    try:
+        files = backup.import_uploads_tar(request.files['uploads'].stream) if 'uploads' in request.files else 0
+        counts = backup.import_lines(request.files['notebook'].stream, current_user.id)
+    except (backup.BackupFormatError, tarfile.TarError) as error:
+        return jsonify({'error': str(error)}), 400
+    return jsonify({'imported': counts, 'uploads': files})
+
+# --- Service worker: отдаётся из корня, чтобы управлять всем сайтом ---
+@route('/service-worker.js')
+def service_worker_script():
+    body, version = service_worker.render_service_worker()
+    response = make_response(body)
+    response.mimetype = 'application/javascript'
+    response.set_etag(version)
+    response.headers['Service-Worker-Allowed'] = '/'
+    # Браузер обязан проверять обновления worker'а при каждой навигации
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# --- Синхронизация для service worker'а (по сессии; API-клиенты используют /api/v1/sync) ---
+@route('/sync')
+@login_required
+def sync_changes():
+    try:
+        data = sync.collect_changes(current_user.id, current_user.is_admin, request.args.get('cursor'),
+                                    request.args.get('limit', sync.DEFAULT_LIMIT, type=int))
+    except sync.SyncResetRequired as error:
+        return jsonify({'error': str(error), 'reset': True}), 410
+    response = jsonify(data)
+    response.cache_control.no_store = True
+    return response
+
+# --- Подписки на web push (напоминания, см. reminders.py) ---
+@route('/push/public-key')
+@login_required
+def push_public_key():
+    return jsonify({'key': current_app.config['VAPID_PUBLIC_KEY']})
+
+@route('/push/subscribe', methods=['POST'])
+@login_required
+def push_subscribe():
+    data = request.get_json(silent=True) or {}
+    keys = data.get('keys') or {}
+    if not data.get('endpoint') or not keys.get('p256dh') or not keys.get('auth'):
+        return jsonify({'error': 'Неверная подписка'}), 400
+    subscription = PushSubscription.query.filter_by(endpoint=data['endpoint']).first()
+    if subscription is None:
+        subscription = PushSubscription(endpoint=data['endpoint'])
+        db.session.add(subscription)
+    subscription.user_id = current_user.id
+    subscription.p256dh = keys['p256dh']
+    subscription.auth = keys['auth']
+    db.session.commit()
+    return jsonify({'status': 'ok'})
+
+@route('/push/unsubscribe', methods=['POST'])
+@login_required
+def push_unsubscribe():
+    data = request.get_json(silent=True) or {}
+    PushSubscription.query.filter_by(endpoint=data.get('endpoint'), user_id=current_user.id).delete()
+    db.session.commit()
+    return jsonify({'status': 'ok'})
+
 # --- Маршрут для получения списка изображений (для TinyMCE File Picker) ---
-@app.route('/api/images')
+@route('/api/images')
 @login_required
 def api_images():
     if not current_user.is_admin:
         return jsonify({'error': 'Access denied'}), 403
 
-    uploads_dir = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+    uploads_dir = os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+    # mtime каталога меняется при добавлении/удалении файлов — этого достаточно для ETag
+    dir_mtime = datetime.utcfromtimestamp(os.stat(uploads_dir).st_mtime)
+    etag = http_cache.make_etag('api_images', os.stat(uploads_dir).st_mtime_ns)
+    cached_response = http_cache.not_modified(etag, dir_mtime)
+    if cached_response:
+        return cached_response
+
     image_files = []
-    for filename in os.listdir(uploads_dir):
+    for filename in media_store.iter_uploads():
         if allowed_file(filename):
             filepath = os.path.join(uploads_dir, filename)
             size = os.path.getsize(filepath)
-            url = url_for('static', filename=f'uploads/{filename}')
+            url = media_store.media_url(filename)
             image_files.append({
                 'name': filename,
                 'url': url,
                 'size': size
             })
 
-    return jsonify({'images': image_files})
+    return http_cache.with_validators(jsonify({'images': image_files}), etag, dir_mtime)
 
 # --- Маршруты аутентификации ---
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
@@ -115,13 +546,16 @@ def login():
             flash('Неверное имя пользователя или пароль.')
     return render_template('login.html')
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    response = redirect(url_for('index'))
+    # Браузер сбрасывает HTTP-кэш страниц вышедшего пользователя
+    response.headers['Clear-Site-Data'] = '"cache"'
+    return response
 
-@app.route('/register', methods=['GET', 'POST'])
+@route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
@@ -141,68 +575,89 @@ def register():
     return render_template('register.html')
 
 # --- Маршрут главной страницы (публичные статьи для не-админов) ---
-@app.route('/')
+@route('/')
+@cached_page(lambda: [page_cache.LISTS])
 def index():
     if current_user.is_authenticated and current_user.is_admin:
         # Админ может видеть админ-панель
         return redirect(url_for('admin_index'))
     else:
         # Показываем опубликованные статьи всем (авторизованным и не авторизованным)
-        articles = Note.query.filter_by(note_type='article', is_published=True).order_by(Note.updated_at.desc()).all()
-        return render_template('public_articles.html', articles=articles)
+        return render_public_articles('index')
+
+# --- Общий подсчёт записей для списков ---
+NOTES_PER_PAGE = 10
+NOTE_COUNT_CACHE_TIMEOUT = 3600 # Счётчик также сбрасывается при любом изменении записей
+
+def cached_note_count(query, scope):
+    """Возвращает COUNT(*) для запроса, кэшируя его по набору фильтров (scope)."""
+    key = page_cache.versioned_key('note_count', [page_cache.LISTS], scope)
+    total = cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(key, total, timeout=NOTE_COUNT_CACHE_TIMEOUT)
+    return total
+
+def count_scope(endpoint, filters, is_admin):
+    user_part = f'user:{current_user.id}' if is_admin else 'public'
+    return f'{endpoint}|{user_part}|' + '&'.join(f'{k}={v}' for k, v in sorted(filters.items()))
+# --- /Общий подсчёт записей ---
 
 # --- Маршрут администратора ---
-@app.route('/admin')
+@route('/admin')
 @login_required
 def admin_index():
     if not current_user.is_admin:
         flash('Доступ запрещён.')
         return redirect(url_for('index'))
 
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor')
     category_id = request.args.get('category', type=int)
     search_query = request.args.get('search', '')
     tag_filter = request.args.get('tag', '')
 
-    query = Note.query.filter_by(user_id=current_user.id).order_by(Note.updated_at.desc())
+    query = Note.query.filter_by(user_id=current_user.id).options(defer(Note.content), defer(Note.full_content), defer(Note.rendered_html))
 
     if category_id:
         category = Category.query.get_or_404(category_id)
-        query = query.filter(Note.category_ids.contains(str(category_id)))
+        query = filter_by_category(query, category_id)
     if search_query:
-        query = query.filter(
-            Note.title.contains(search_query) |
-            Note.content.contains(search_query) |
-            Note.full_content.contains(search_query)
-        )
+        # Полнотекстовый поиск (FTS5), результаты по релевантности
+        query = search.filter_notes(query, search_query)
     if tag_filter:
-        query = query.filter(Note.tags.contains(tag_filter))
+        query = tags.filter_by_tag(query, tag_filter)
 
-    # --- ПАГИНАЦИЯ ---
-    per_page = 10
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # --- ПАГИНАЦИЯ (по курсору) ---
+    filters = {k: v for k, v in (('search', search_query), ('category', category_id), ('tag', tag_filter)) if v}
+    pagination = paginate_notes(query, cursor, NOTES_PER_PAGE, ranked=bool(search_query))
+    if current_app.config['NOTES_SHOW_TOTAL']:
+        pagination.total = cached_note_count(query, count_scope('admin_index', filters, True))
     notes = pagination.items
     # --- /ПАГИНАЦИЯ ---
 
+    snippets = search.search_snippets(search_query, [note.id for note in notes]) if search_query else {}
+    images.prefetch_assets(notes)
+
     categories = Category.query.all()
-    all_tags = set()
-    for note in notes:
-        if note.tags:
-            all_tags.update(tag.strip() for tag in note.tags.split(','))
+    all_tags = tags.tag_cloud()
 
-    return render_template('index.html', notes=notes, categories=categories, all_tags=all_tags, pagination=pagination)
+    response = make_response(render_template('index.html', notes=notes, categories=categories, all_tags=all_tags, pagination=pagination, filters=filters, snippets=snippets))
+    # Разметка админки не должна оседать ни в HTTP-кэше, ни в кэше service worker'а
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
 
 # --- Стена записей ---
-@app.route('/wall')
-def wall():
-    page = request.args.get('page', 1, type=int)
-
+def build_wall_query():
+    """Запрос записей стены с учётом прав и фильтров из request.args."""
     if current_user.is_authenticated and current_user.is_admin:
         # Админ видит всё
-        query = Note.query.order_by(Note.updated_at.desc())
+        query = Note.query
     else:
         # Не-админ видит только ОПУБЛИКОВАННЫЕ ЗАПИСИ (любого типа)
-        query = Note.query.filter_by(is_published=True).order_by(Note.updated_at.desc())
+        query = Note.query.filter_by(is_published=True)
+    # Карточкам хватает excerpt — полный текст не загружаем
+    query = query.options(defer(Note.content), defer(Note.full_content), defer(Note.rendered_html))
 
     # --- Применение фильтров ---
     category_id = request.args.get('category', type=int)
@@ -211,36 +666,75 @@ def wall():
     search_query = request.args.get('search', '')
 
     if category_id:
-        query = query.filter(Note.category_ids.contains(str(category_id)))
+        query = filter_by_category(query, category_id)
     if tag_filter:
-        query = query.filter(Note.tags.contains(tag_filter))
+        query = tags.filter_by_tag(query, tag_filter)
     if type_filter:
         query = query.filter(Note.note_type == type_filter)
     if search_query:
-        query = query.filter(
-            Note.title.contains(search_query) |
-            Note.content.contains(search_query) |
-            Note.full_content.contains(search_query) |
-            Note.summary.contains(search_query)
-        )
+        # Полнотекстовый поиск (FTS5), результаты по релевантности
+        query = search.filter_notes(query, search_query)
     # --- /Применение фильтров ---
 
-    # --- ПАГИНАЦИЯ ---
-    per_page = 10
-    pagination_wall = query.paginate(page=page, per_page=per_page, error_out=False)
+    filters = {k: v for k, v in (('search', search_query), ('category', category_id), ('tag', tag_filter), ('type', type_filter)) if v}
+    return query, filters, search_query
+
+@route('/wall')
+@cached_page(lambda: [page_cache.LISTS])
+def wall():
+    is_admin = current_user.is_authenticated and current_user.is_admin
+    etag = http_cache.request_etag(*page_cache.get_versions([page_cache.LISTS]))
+    cached_response = http_cache.not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    query, filters, search_query = build_wall_query()
+
+    # --- ПАГИНАЦИЯ (по курсору) ---
+    pagination_wall = paginate_notes(query, request.args.get('cursor'), NOTES_PER_PAGE, ranked=bool(search_query))
+    if current_app.config['NOTES_SHOW_TOTAL']:
+        pagination_wall.total = cached_note_count(query, count_scope('wall', filters, is_admin))
     all_notes = pagination_wall.items
     # --- /ПАГИНАЦИЯ ---
 
-    categories = Category.query.all()
-    all_tags = set()
-    for note in all_notes:
-        if note.tags:
-            all_tags.update(tag.strip() for tag in note.tags.split(','))
+    snippets = search.search_snippets(search_query, [note.id for note in all_notes]) if search_query else {}
+    images.prefetch_assets(all_notes)
 
-    return render_template('wall.html', notes=all_notes, categories=categories, all_tags=all_tags, is_admin=current_user.is_authenticated and current_user.is_admin, pagination=pagination_wall)
+    categories = Category.query.all()
+    # Облако тегов по всем (для гостя — по опубликованным) записям, из кэша
+    all_tags = tags.tag_cloud(published_only=not is_admin)
+
+    response = make_response(render_template('wall.html', notes=all_notes, categories=categories, all_tags=all_tags, is_admin=is_admin, pagination=pagination_wall, filters=filters, snippets=snippets))
+    return http_cache.with_validators(response, etag)
+
+# --- JSON-лента стены для бесконечной прокрутки ---
+@route('/api/wall')
+@cached_page(lambda: [page_cache.LISTS])
+def api_wall():
+    is_admin = current_user.is_authenticated and current_user.is_admin
+    etag = http_cache.request_etag(*page_cache.get_versions([page_cache.LISTS]))
+    cached_response = http_cache.not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    query, filters, search_query = build_wall_query()
+
+    page = paginate_notes(query, request.args.get('cursor'), NOTES_PER_PAGE, ranked=bool(search_query))
+    snippets = search.search_snippets(search_query, [note.id for note in page.items]) if search_query else {}
+    images.prefetch_assets(page.items)
+
+    payload = {
+        # Те же карточки, что и на /wall, — клиент просто добавляет их в список
+        'html': render_template('note_cards.html', notes=page.items, is_admin=is_admin, snippets=snippets),
+        'count': len(page.items),
+        'next_cursor': page.next_cursor,
+    }
+    if request.args.get('count', type=int):
+        payload['total'] = cached_note_count(query, count_scope('wall', filters, is_admin))
+    return http_cache.with_validators(jsonify(payload), etag)
 
 # --- Маршруты для заметок ---
-@app.route('/edit', methods=['GET', 'POST'])
+@route('/edit', methods=['GET', 'POST'])
 @login_required
 def create_note():
     if not current_user.is_admin:
@@ -263,28 +757,25 @@ def create_note():
         if 'image' in request.files:
             image = request.files['image']
             if image.filename != '' and allowed_file(image.filename):
-                image_filename = secure_filename(image.filename)
-                image.save(os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
-
-        category_ids_str = ','.join(selected_category_ids) if selected_category_ids else None
+                image_filename = save_uploaded_image(image)
 
         new_note = Note(
             title=title,
             content=content,
             note_type=note_type,
             image_filename=image_filename,
-            category_ids=category_ids_str,
             tags=tags,
             background_color=background_color,
             is_published=is_published, # Сохраняем публикацию
             user_id=current_user.id # Привязываем к пользователю
         )
+        set_note_categories(new_note, selected_category_ids)
         db.session.add(new_note)
         db.session.commit()
         return redirect(url_for('admin_index'))
     return render_template('edit.html', note=Note(), categories=all_categories)
 
-@app.route('/edit/<int:id>', methods=['GET', 'POST'])
+@route('/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_note(id):
     if not current_user.is_admin:
@@ -293,7 +784,7 @@ def edit_note(id):
 
     note = Note.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
     all_categories = Category.query.all()
-    current_category_ids = parse_category_ids(note.category_ids)
+    current_category_ids = [category.id for category in note.categories]
 
     if request.method == 'POST':
         note.title = request.form.get('title', '')
@@ -303,11 +794,9 @@ def edit_note(id):
         if 'image' in request.files:
             image = request.files['image']
             if image.filename != '' and allowed_file(image.filename):
-                note.image_filename = secure_filename(image.filename)
-                image.save(os.path.join(app.config['UPLOAD_FOLDER'], note.image_filename))
+                note.image_filename = save_uploaded_image(image)
 
-        selected_category_ids = request.form.getlist('categories')
-        note.category_ids = ','.join(selected_category_ids) if selected_category_ids else None
+        set_note_categories(note, request.form.getlist('categories'))
 
         note.tags = request.form.get('tags', '')
         note.background_color = request.form.get('background_color', 'white')
@@ -318,7 +807,7 @@ def edit_note(id):
     return render_template('edit.html', note=note, categories=all_categories, current_category_ids=current_category_ids)
 
 # --- Маршруты для статей ---
-@app.route('/edit_article', methods=['GET', 'POST'])
+@route('/edit_article', methods=['GET', 'POST'])
 @login_required
 def create_article():
     if not current_user.is_admin:
@@ -340,10 +829,7 @@ def create_article():
         if 'preview_image' in request.files:
             image = request.files['preview_image']
             if image.filename != '' and allowed_file(image.filename):
-                preview_image = secure_filename(image.filename)
-                image.save(os.path.join(app.config['UPLOAD_FOLDER'], preview_image))
-
-        category_ids_str = ','.join(selected_category_ids) if selected_category_ids else None
+                preview_image = save_uploaded_image(image)
 
         new_article = Note(
             title=title,
@@ -351,18 +837,18 @@ def create_article():
             full_content=full_content,
             note_type=note_type,
             preview_image=preview_image,
-            category_ids=category_ids_str,
             tags=tags,
             background_color=background_color,
             is_published=is_published,
             user_id=current_user.id # Привязываем к пользователю
         )
+        set_note_categories(new_article, selected_category_ids)
         db.session.add(new_article)
         db.session.commit()
         return redirect(url_for('admin_index'))
     return render_template('edit_article.html', note=Note(), categories=all_categories)
 
-@app.route('/edit_article/<int:id>', methods=['GET', 'POST'])
+@route('/edit_article/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_article(id):
     if not current_user.is_admin:
@@ -371,7 +857,7 @@ def edit_article(id):
 
     article = Note.query.filter_by(id=id, note_type='article', user_id=current_user.id).first_or_404() # Проверяем владельца
     all_categories = Category.query.all()
-    current_category_ids = parse_category_ids(article.category_ids)
+    current_category_ids = [category.id for category in article.categories]
 
     if request.method == 'POST':
         article.title = request.form.get('title', '')
@@ -385,28 +871,40 @@ def edit_article(id):
         if 'preview_image' in request.files:
             image = request.files['preview_image']
             if image.filename != '' and allowed_file(image.filename):
-                article.preview_image = secure_filename(image.filename)
-                image.save(os.path.join(app.config['UPLOAD_FOLDER'], article.preview_image))
+                article.preview_image = save_uploaded_image(image)
 
-        article.category_ids = ','.join(selected_category_ids) if selected_category_ids else None
+        set_note_categories(article, selected_category_ids)
         db.session.commit()
         return redirect(url_for('admin_index'))
     return render_template('edit_article.html', note=article, categories=all_categories, current_category_ids=current_category_ids)
 
 # --- Маршрут просмотра статьи ---
-@app.route('/read_article/<int:id>')
+@route('/read_article/<int:id>')
+@cached_page(lambda id: [page_cache.note_version_name(id), page_cache.CATEGORIES])
 def read_article(id):
     # Проверяем, что статья опубликована, если пользователь НЕ администратор
     if current_user.is_authenticated and current_user.is_admin:
-        article = Note.query.filter_by(id=id, note_type='article').first_or_404()
+        article_query = Note.query.filter_by(id=id, note_type='article')
     else:
-        article = Note.query.filter_by(id=id, note_type='article', is_published=True).first_or_404()
-
-    note_categories = [Category.query.get(cid) for cid in parse_category_ids(article.category_ids)]
-    return render_template('read_article.html', note=article, note_categories=note_categories, display_content=article.full_content)
+        article_query = Note.query.filter_by(id=id, note_type='article', is_published=True)
+
+    # Дешёвая проверка: только updated_at, без загрузки full_content и рендеринга
+    updated_at = article_query.with_entities(Note.updated_at).scalar()
+    if updated_at is None:
+        abort(404)
+    # Версия записи меняется и без updated_at — например, когда готовы копии изображений в тексте
+    etag = http_cache.make_etag('article', id, updated_at.isoformat(), *page_cache.get_versions([page_cache.note_version_name(id), page_cache.CATEGORIES]))
+    cached_response = http_cache.not_modified(etag, updated_at)
+    if cached_response:
+        return cached_response
+
+    # Показывается HTML, очищенный при сохранении (note_content.py); исходники не читаем
+    article = article_query.options(defer(Note.content), defer(Note.full_content)).first_or_404()
+    response = make_response(render_template('read_article.html', note=article, note_categories=article.categories, display_content=article.rendered_html))
+    return http_cache.with_validators(response, etag, article.updated_at)
 
 # --- Маршрут просмотра заметки (только для админов) ---
-@app.route('/view/<int:id>')
+@route('/view/<int:id>')
 @login_required
 def view_note(id):
     note = Note.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
@@ -414,12 +912,11 @@ def view_note(id):
         flash('Доступ запрещён.')
         return redirect(url_for('index'))
 
-    display_content = note.content
-    note_categories = [Category.query.get(cid) for cid in parse_category_ids(note.category_ids)]
-    return render_template('view.html', note=note, display_content=display_content, note_categories=note_categories)
+    display_content = note.rendered_html
+    return render_template('view.html', note=note, display_content=display_content, note_categories=note.categories)
 
 # --- Маршрут удаления заметки ---
-@app.route('/delete/<int:id>', methods=['POST'])
+@route('/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_note(id):
     if not current_user.is_admin:
@@ -432,14 +929,14 @@ def delete_note(id):
     return redirect(url_for('admin_index'))
 
 # --- Маршруты для УПРАВЛЕНИЯ ЗАДАЧАМИ ---
-@app.route('/tasks')
+@route('/tasks')
 @login_required
 def list_tasks():
     # Фильтруем задачи по пользователю
     tasks = Task.query.filter_by(user_id=current_user.id).order_by(Task.due_date.asc(), Task.priority.desc()).all()
     return render_template('tasks.html', tasks=tasks)
 
-@app.route('/tasks/new', methods=['GET', 'POST'])
+@route('/tasks/new', methods=['GET', 'POST'])
 @login_required
 def create_task():
     if request.method == 'POST':
@@ -462,7 +959,7 @@ def create_task():
         return redirect(url_for('list_tasks'))
     return render_template('edit_task.html', task=Task())
 
-@app.route('/tasks/edit/<int:id>', methods=['GET', 'POST'])
+@route('/tasks/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_task(id):
     task = Task.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
@@ -488,7 +985,7 @@ def edit_task(id):
         return redirect(url_for('list_tasks'))
     return render_template('edit_task.html', task=task)
 
-@app.route('/tasks/delete/<int:id>', methods=['POST'])
+@route('/tasks/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_task(id):
     task = Task.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
@@ -497,14 +994,26 @@ def delete_task(id):
     return redirect(url_for('list_tasks'))
 
 # --- Маршруты для УПРАВЛЕНИЯ СОБЫТИЯМИ ---
-@app.route('/events')
+def parse_event_recurrence(form):
+    """Повторение события из формы: (recurrence, recurrence_until); неизвестные значения игнорируются."""
+    recurrence = form.get('recurrence') or None
+    if recurrence not in calendar_feed.RECURRENCE_CHOICES:
+        return None, None
+    try:
+        # Дата последнего повтора включительно
+        until = datetime.strptime(form.get('recurrence_until', ''), '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+    except ValueError:
+        until = None
+    return recurrence, until
+
+@route('/events')
 @login_required
 def list_events():
     # Фильтруем события по пользователю
     events = Event.query.filter_by(user_id=current_user.id).order_by(Event.start_time.asc()).all()
     return render_template('events.html', events=events)
 
-@app.route('/events/new', methods=['GET', 'POST'])
+@route('/events/new', methods=['GET', 'POST'])
 @login_required
 def create_event():
     if request.method == 'POST':
@@ -528,13 +1037,15 @@ def create_event():
                 flash('Неверный формат времени окончания.')
                 return redirect(url_for('create_event'))
 
-        new_event = Event(title=title, description=description, start_time=start_time, end_time=end_time, location=location, user_id=current_user.id)
+        recurrence, recurrence_until = parse_event_recurrence(request.form)
+        new_event = Event(title=title, description=description, start_time=start_time, end_time=end_time, location=location,
+                          recurrence=recurrence, recurrence_until=recurrence_until, user_id=current_user.id)
         db.session.add(new_event)
         db.session.commit()
         return redirect(url_for('list_events'))
-    return render_template('edit_event.html', event=Event())
+    return render_template('edit_event.html', event=Event(), recurrence_choices=calendar_feed.RECURRENCE_CHOICES)
 
-@app.route('/events/edit/<int:id>', methods=['GET', 'POST'])
+@route('/events/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_event(id):
     event = Event.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
@@ -560,11 +1071,12 @@ def edit_event(id):
                 flash('Неверный формат времени окончания.')
                 return redirect(url_for('edit_event', id=id))
 
+        event.recurrence, event.recurrence_until = parse_event_recurrence(request.form)
         db.session.commit()
         return redirect(url_for('list_events'))
-    return render_template('edit_event.html', event=event)
+    return render_template('edit_event.html', event=event, recurrence_choices=calendar_feed.RECURRENCE_CHOICES)
 
-@app.route('/events/delete/<int:id>', methods=['POST'])
+@route('/events/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_event(id):
     event = Event.query.filter_by(id=id, user_id=current_user.id).first_or_404() # Проверяем владельца
@@ -573,30 +1085,36 @@ def delete_event(id):
     return redirect(url_for('list_events'))
 
 # --- Маршрут для получения событий в формате JSON (для FullCalendar) ---
-@app.route('/api/events')
+@route('/api/events')
 @login_required
 def api_events():
-    events = Event.query.filter_by(user_id=current_user.id).all()
-    calendar_events = []
-    for event in events:
-        calendar_events.append({
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_time.isoformat(), # ISO 8601 строка
-            'end': event.end_time.isoformat() if event.end_time else None,
-            'description': event.description,
-            'location': event.location
-        })
-    return jsonify(calendar_events)
+    # max(updated_at) и count(*) меняются при любом добавлении, правке или удалении события
+    last_modified, total = db.session.query(db.func.max(Event.updated_at), db.func.count(Event.id)) \
+                                     .filter(Event.user_id == current_user.id).one()
+    etag = http_cache.request_etag('api_events', last_modified.isoformat() if last_modified else '', total)
+    cached_response = http_cache.not_modified(etag, last_modified)
+    if cached_response:
+        return cached_response
+
+    # Только видимое окно календаря: FullCalendar передаёт ?start=...&end=...
+    window = calendar_feed.parse_window(request.args)
+    if window is None:
+        return jsonify({'error': 'Invalid start/end'}), 400
+    start, end = window
+
+    query = calendar_feed.window_query(current_user.id, start, end)
+    response = current_app.response_class(stream_with_context(calendar_feed.stream_events(query, start, end)),
+                                  mimetype='application/json')
+    return http_cache.with_validators(response, etag, last_modified)
 
 # --- Маршрут для календаря ---
-@app.route('/calendar')
+@route('/calendar')
 @login_required
 def calendar():
     return render_template('calendar.html')
 
 # --- Маршруты для УПРАВЛЕНИЯ КАТЕГОРИЯМИ ---
-@app.route('/categories')
+@route('/categories')
 @login_required
 def list_categories():
     if not current_user.is_admin:
@@ -606,7 +1124,7 @@ def list_categories():
     categories = Category.query.all()
     return render_template('categories.html', categories=categories)
 
-@app.route('/categories/new', methods=['GET', 'POST'])
+@route('/categories/new', methods=['GET', 'POST'])
 @login_required
 def create_category():
     if not current_user.is_admin:
@@ -622,7 +1140,7 @@ def create_category():
         return redirect(url_for('list_categories'))
     return render_template('edit_category.html', category=Category())
 
-@app.route('/categories/edit/<int:id>', methods=['GET', 'POST'])
+@route('/categories/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_category(id):
     if not current_user.is_admin:
@@ -631,39 +1149,77 @@ def edit_category(id):
 
     category = Category.query.get_or_404(id)
     if request.method == 'POST':
-        category.name = request.form['name']
+        name = request.form['name'].strip()
+        if not name:
+            flash('Название категории не может быть пустым.')
+            return redirect(url_for('edit_category', id=id))
+
+        existing = Category.query.filter(Category.name == name, Category.id != id).first()
+        if existing:
+            # Переименование в уже существующее название = слияние категорий
+            merge_categories(category.id, existing.id)
+            db.session.commit()
+            flash(f'Категория объединена с "{existing.name}".')
+            return redirect(url_for('list_categories'))
+
+        category.name = name
         db.session.commit()
         return redirect(url_for('list_categories'))
     return render_template('edit_category.html', category=category)
 
-@app.route('/categories/delete/<int:id>', methods=['POST'])
+@route('/categories/merge/<int:id>', methods=['POST'])
+@login_required
+def merge_category(id):
+    if not current_user.is_admin:
+        flash('Доступ запрещён.')
+        return redirect(url_for('index'))
+
+    source = Category.query.get_or_404(id)
+    target = Category.query.get_or_404(request.form.get('target_id', type=int))
+    if source.id != target.id:
+        message = f'Категория "{source.name}" объединена с "{target.name}".'
+        merge_categories(source.id, target.id)
+        db.session.commit()
+        flash(message)
+    return redirect(url_for('list_categories'))
+
+@route('/categories/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_category(id):
     if not current_user.is_admin:
         flash('Доступ запрещён.')
         return redirect(url_for('index'))
 
-    category = Category.query.get_or_404(id)
-    # Удаляем привязки категории из заметок
-    all_notes = Note.query.all()
-    for note in all_notes:
-        ids = parse_category_ids(note.category_ids)
-        if id in ids:
-            ids.remove(id)
-            note.category_ids = format_category_ids([Category.query.get(cid) for cid in ids])
-    db.session.delete(category)
+    Category.query.get_or_404(id)
+    # Привязки удаляются одним запросом по индексу, без загрузки записей в сессию
+    delete_category_links(id)
     db.session.commit()
     return redirect(url_for('list_categories'))
 
 # --- Маршрут публичных статей ---
-@app.route('/public_articles')
+@route('/public_articles')
+@cached_page(lambda: [page_cache.LISTS])
 def public_articles():
     # Показываем опубликованные статьи ВСЕМ
-    articles = Note.query.filter_by(note_type='article', is_published=True).order_by(Note.updated_at.desc()).all()
-    return render_template('public_articles.html', articles=articles)
+    return render_public_articles('public_articles')
+
+def render_public_articles(endpoint):
+    """Постраничный список опубликованных статей для / и /public_articles."""
+    # Список меняется только вместе с версией списков — сверяем ETag до запроса к БД
+    etag = http_cache.request_etag(*page_cache.get_versions([page_cache.LISTS]))
+    cached_response = http_cache.not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    # Только колонки карточки: full_content/content (мегабайты HTML) не читаются
+    query = Note.query.filter_by(note_type='article', is_published=True) \
+                      .options(load_only(Note.id, Note.title, Note.summary, Note.excerpt, Note.reading_time, Note.updated_at))
+    pagination = paginate_notes(query, request.args.get('cursor'), NOTES_PER_PAGE)
+    response = make_response(render_template('public_articles.html', articles=pagination.items, pagination=pagination, endpoint=endpoint))
+    return http_cache.with_validators(response, etag)
 
 # --- Фильтр Jinja2 для отображения времени как "X назад" ---
-@app.template_filter('time_ago')
+@bp.app_template_filter('time_ago')
 def time_ago_filter(dt):
     if not dt:
         return "Неизвестно"
@@ -682,5 +1238,11 @@ def time_ago_filter(dt):
     else:
         return "Только что"
 
+# --- Адаптивные изображения в шаблонах (см. images.py) ---
+@bp.record_once
+def _register_template_globals(state):
+    state.app.jinja_env.globals.update(responsive_image=images.responsive_image, image_state=images.image_state,
+                                       media_url=media_store.media_url)
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    create_app('development').run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,166 @@
+# assets.py
+# -*- coding: utf-8 -*-
+
+"""
+Статические файлы с отпечатками и предварительным сжатием.
+
+При запуске для файлов static/ считаются хеши содержимого, и
+url_for('static', filename='css/style.css') возвращает
+/static/css/style.<хеш>.css. Такой URL меняется вместе с файлом, поэтому
+отдаётся с Cache-Control: immutable на год: после деплоя браузеры сразу
+получают новые файлы, а до него ничего не перепроверяют. Рядом с
+текстовыми файлами лежат сжатые копии .br/.gz (flask --app app build-assets),
+которые отдаются клиентам, поддерживающим такое сжатие.
+
+Не обрабатываются uploads/ (у загрузок свои URL, см. media_store.py) и
+tinymce/ — редактор подгружает свои плагины относительно имени
+tinymce.min.js.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError: # Без пакета Brotli создаются только .gz
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+EXCLUDE_DIRS = ('uploads', 'tinymce')
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.txt', '.html', '.map'}
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+MIN_COMPRESS_SIZE = 512 # Байт; маленькие файлы сжимать нет смысла
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+FINGERPRINT_LENGTH = 10
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def iter_static_files(static_folder):
+    """Относительные пути файлов static/, которые получают отпечатки."""
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if dirpath == static_folder:
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDE_DIRS]
+        for filename in filenames:
+            if filename.startswith('.') or filename.endswith(tuple(COMPRESSED_SUFFIXES.values())):
+                continue
+            yield os.path.relpath(os.path.join(dirpath, filename), static_folder).replace(os.sep, '/')
+
+
+def fingerprinted_name(filename, file_hash):
+    stem, ext = os.path.splitext(filename)
+    return f'{stem}.{file_hash}{ext}'
+
+
+def build_manifest(static_folder):
+    """{'css/style.css': 'css/style.<хеш>.css', ...}"""
+    return {
+        filename: fingerprinted_name(filename, _file_hash(os.path.join(static_folder, filename)))
+        for filename in iter_static_files(static_folder)
+    }
+
+
+def compress_assets(static_folder, force=False):
+    """Создаёт .gz (и .br, если установлен Brotli) рядом с текстовыми файлами. Возвращает число файлов."""
+    written = 0
+    for filename in iter_static_files(static_folder):
+        path = os.path.join(static_folder, filename)
+        if os.path.splitext(filename)[1] not in COMPRESSIBLE_EXTENSIONS or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            continue
+        source_mtime = os.path.getmtime(path)
+        data = None
+        for encoding, suffix in COMPRESSED_SUFFIXES.items():
+            if encoding == 'br' and brotli is None:
+                continue
+            target = path + suffix
+            if not force and os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                continue
+            if data is None:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            compressed = brotli.compress(data, quality=11) if encoding == 'br' else gzip.compress(data, compresslevel=9, mtime=0)
+            with open(target, 'wb') as f:
+                f.write(compressed)
+            written += 1
+    return written
+
+
+def init_app(app):
+    """Строит манифест отпечатков и подменяет URL и обработчик static."""
+    manifest = build_manifest(app.static_folder) if app.config.get('ASSETS_FINGERPRINT', True) else {}
+    app.extensions['asset_manifest'] = manifest
+    # Обратная карта: имя с отпечатком -> исходный файл
+    app.extensions['asset_files'] = {hashed: original for original, hashed in manifest.items()}
+    # Версия всех отпечатков: входит в ETag и ключи кэша страниц, где эти URL выводятся
+    app.extensions['asset_version'] = hashlib.sha1(
+        '|'.join(sorted(manifest.values())).encode('utf-8')).hexdigest()[:12]
+
+    if app.config.get('ASSETS_COMPRESS_ON_STARTUP', True):
+        try:
+            compress_assets(app.static_folder)
+        except OSError as error: # static/ может быть доступен только для чтения
+            logger.warning('Не удалось создать сжатые копии статических файлов: %s', error)
+
+    @app.url_defaults
+    def _fingerprint_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = manifest.get(values['filename'], values['filename'])
+
+    app.view_functions['static'] = static_view
+
+
+def asset_version():
+    return current_app.extensions.get('asset_version', '')
+
+
+def _accepted_encoding():
+    for encoding in ('br', 'gzip'):
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def _is_fresh_copy(static_folder, filename, sibling):
+    """Сжатая копия существует и не старше исходника (исходник могли обновить без build-assets)."""
+    try:
+        return os.path.getmtime(os.path.join(static_folder, sibling)) >= os.path.getmtime(os.path.join(static_folder, filename))
+    except OSError:
+        return False
+
+
+def static_view(filename):
+    """Замена стандартного обработчика static с учётом отпечатков и сжатых копий."""
+    app = current_app
+    original = app.extensions.get('asset_files', {}).get(filename)
+    immutable = original is not None
+    filename = original or filename
+
+    max_age = IMMUTABLE_MAX_AGE if immutable else app.get_send_file_max_age(filename)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = _accepted_encoding()
+    sibling = filename + COMPRESSED_SUFFIXES[encoding] if encoding else None
+    if sibling and _is_fresh_copy(app.static_folder, filename, sibling):
+        response = send_from_directory(app.static_folder, sibling, mimetype=mimetype, max_age=max_age)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(app.static_folder, filename, max_age=max_age)
+    if os.path.splitext(filename)[1] in COMPRESSIBLE_EXTENSIONS:
+        response.vary.add('Accept-Encoding')
+
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    return response
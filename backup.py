@@ -0,0 +1,323 @@
+# backup.py
+# -*- coding: utf-8 -*-
+
+"""
+Экспорт и импорт всего блокнота.
+
+Данные выгружаются в NDJSON (одна JSON-строка на объект: категории,
+записи, задачи, события), загрузки, на которые ссылаются записи, — в tar.
+Оба потока пишутся по мере чтения: строки читаются пачками (yield_per),
+поэтому память не зависит от размера блокнота.
+
+Импорт читает NDJSON построчно и вставляет строки пачками (executemany с
+RETURNING id). Старые id сопоставляются с новыми через таблицу в памяти
+(id -> id), поэтому связи записей с категориями сохраняются, а данные
+можно загрузить в непустую базу. Производные данные (превью, индексы
+поиска и тегов) пересчитываются после импорта.
+"""
+
+import io
+import json
+import os
+import posixpath
+import tarfile
+from datetime import datetime
+
+from sqlalchemy import insert
+
+import media_store
+import note_content
+import page_cache
+import reminders
+import search
+import sync
+import tags
+from models import db, Category, Event, Note, Task, note_categories
+
+FORMAT_VERSION = 1
+BATCH_SIZE = 1000
+# Модели в порядке выгрузки: категории раньше записей, чтобы связи можно было сопоставить
+EXPORT_MODELS = (('category', Category), ('note', Note), ('task', Task), ('event', Event))
+# Колонки, которые не переносятся: владелец задаётся при импорте, остальное вычисляется заново
+SKIPPED_COLUMNS = {'user_id', 'category_ids', *note_content.DERIVED_FIELDS}
+
+
+def _columns(model):
+    return [column for column in model.__table__.columns if column.name not in SKIPPED_COLUMNS]
+
+
+def _json_line(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=_json_default) + '\n'
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Не сериализуется в JSON: {type(value).__name__}')
+
+
+# --- Экспорт ---
+def _note_category_ids(note_ids):
+    links = {}
+    rows = db.session.execute(
+        db.select(note_categories.c.note_id, note_categories.c.category_id)
+        .where(note_categories.c.note_id.in_(note_ids))
+    )
+    for note_id, category_id in rows:
+        links.setdefault(note_id, []).append(category_id)
+    return links
+
+
+def iter_export(user_id=None):
+    """Генератор строк NDJSON. user_id ограничивает записи, задачи и события одним владельцем."""
+    yield _json_line({'type': 'meta', 'version': FORMAT_VERSION, 'exported_at': datetime.utcnow()})
+    for record_type, model in EXPORT_MODELS:
+        columns = _columns(model)
+        stmt = db.select(*columns).order_by(model.id).execution_options(yield_per=BATCH_SIZE)
+        if user_id is not None and hasattr(model, 'user_id'):
+            stmt = stmt.where(model.user_id == user_id)
+        for partition in db.session.execute(stmt).partitions():
+            links = _note_category_ids([row.id for row in partition]) if model is Note else None
+            for row in partition:
+                record = {'type': record_type, **row._asdict()}
+                if links is not None:
+                    record['categories'] = links.get(row.id, [])
+                yield _json_line(record)
+
+
+def referenced_uploads(user_id=None):
+    """Имена загрузок, на которые ссылаются записи (с user_id — только выгружаемые) и которые есть на диске."""
+    root = media_store.uploads_dir()
+    for name in sorted(media_store.reference_counts(user_id)):
+        path = os.path.join(root, name)
+        if _safe_upload_name(name) and os.path.isfile(path):
+            yield name
+
+
+class _ChunkBuffer(io.RawIOBase):
+    """Файл только для записи: tarfile пишет в него, генератор забирает накопленное."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+
+def iter_uploads_tar(names=None):
+    """Генератор байтов tar-архива с загрузками (потоковый режим tarfile, без временных файлов)."""
+    root = media_store.uploads_dir()
+    buffer = _ChunkBuffer()
+    with tarfile.open(fileobj=buffer, mode='w|') as archive:
+        for name in (referenced_uploads() if names is None else names):
+            archive.add(os.path.join(root, name), arcname=f'uploads/{name}', recursive=False)
+            data = buffer.drain()
+            if data:
+                yield data
+    yield buffer.drain()
+
+
+def export_to_directory(directory, user_id=None):
+    """Пишет notebook.ndjson и uploads.tar в каталог. Возвращает (строк, файлов)."""
+    os.makedirs(directory, exist_ok=True)
+    lines = 0
+    with open(os.path.join(directory, 'notebook.ndjson'), 'w', encoding='utf-8') as out:
+        for line in iter_export(user_id):
+            out.write(line)
+            lines += 1
+    names = list(referenced_uploads(user_id))
+    with open(os.path.join(directory, 'uploads.tar'), 'wb') as out:
+        for chunk in iter_uploads_tar(names):
+            out.write(chunk)
+    return lines, len(names)
+# --- /Экспорт ---
+
+
+# --- Импорт ---
+class BackupFormatError(ValueError):
+    """Ошибка формата файла импорта."""
+
+
+def _parse_row(model, record):
+    row = {}
+    for column in _columns(model):
+        if column.name == 'id' or column.name not in record:
+            continue
+        value = record[column.name]
+        if value is not None and isinstance(column.type, db.DateTime):
+            value = datetime.fromisoformat(value)
+        row[column.name] = value
+    return row
+
+
+class _Importer:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.id_map = {record_type: {} for record_type, _ in EXPORT_MODELS} # старый id -> новый id
+        self.pending = {record_type: [] for record_type, _ in EXPORT_MODELS}
+        self.counts = {record_type: 0 for record_type, _ in EXPORT_MODELS}
+        self.categories_by_name = {
+            name: category_id for category_id, name in db.session.execute(db.select(Category.id, Category.name))
+        }
+
+    def add(self, record):
+        if not isinstance(record, dict):
+            raise BackupFormatError('ожидается объект JSON')
+        record_type = record.get('type')
+        if record_type == 'meta':
+            if record.get('version') != FORMAT_VERSION:
+                raise BackupFormatError(f'Неподдерживаемая версия формата: {record.get("version")}')
+            return
+        if record_type not in self.pending:
+            raise BackupFormatError(f'Неизвестный тип строки: {record_type}')
+        # Записи ссылаются на категории — категории сохраняем раньше
+        if record_type != 'category' and self.pending['category']:
+            self.flush('category')
+        self.pending[record_type].append(record)
+        if len(self.pending[record_type]) >= BATCH_SIZE:
+            self.flush(record_type)
+
+    def flush(self, record_type):
+        records, self.pending[record_type] = self.pending[record_type], []
+        if records:
+            getattr(self, f'_insert_{record_type}')(records)
+            self.counts[record_type] += len(records)
+
+    def finish(self):
+        for record_type, _ in EXPORT_MODELS:
+            self.flush(record_type)
+
+    def _insert_returning_ids(self, model, rows):
+        stmt = insert(model.__table__).returning(model.__table__.c.id, sort_by_parameter_order=True)
+        return [row.id for row in db.session.execute(stmt, rows)]
+
+    def _insert_category(self, records):
+        # Категории с тем же именем объединяются с существующими
+        new_records = []
+        for record in records:
+            existing_id = self.categories_by_name.get(record.get('name'))
+            if existing_id is not None:
+                self.id_map['category'][record.get('id')] = existing_id
+            else:
+                new_records.append(record)
+        if new_records:
+            ids = self._insert_returning_ids(Category, [_parse_row(Category, record) for record in new_records])
+            for record, new_id in zip(new_records, ids):
+                self.id_map['category'][record.get('id')] = new_id
+                self.categories_by_name[record.get('name')] = new_id
+
+    def _insert_note(self, records):
+        rows = [{**_parse_row(Note, record), 'user_id': self.user_id} for record in records]
+        ids = self._insert_returning_ids(Note, rows)
+        links = []
+        for record, new_id in zip(records, ids):
+            self.id_map['note'][record.get('id')] = new_id
+            for category_id in record.get('categories') or []:
+                if category_id in self.id_map['category']:
+                    links.append({'note_id': new_id, 'category_id': self.id_map['category'][category_id]})
+        if links:
+            db.session.execute(insert(note_categories).prefix_with('OR IGNORE'), links)
+
+    def _insert_owned(self, record_type, model, records):
+        ids = self._insert_returning_ids(model, [{**_parse_row(model, r), 'user_id': self.user_id} for r in records])
+        self.id_map[record_type].update(zip((record.get('id') for record in records), ids))
+
+    def _insert_task(self, records):
+        self._insert_owned('task', Task, records)
+
+    def _insert_event(self, records):
+        self._insert_owned('event', Event, records)
+
+
+def import_lines(lines, user_id):
+    """Импортирует строки NDJSON (итерируемый объект str/bytes) в одной транзакции.
+
+    Возвращает число импортированных объектов по типам.
+    """
+    importer = _Importer(user_id)
+    try:
+        for number, line in enumerate(lines, start=1):
+            line = line.decode('utf-8') if isinstance(line, bytes) else line
+            if not line.strip():
+                continue
+            try:
+                importer.add(json.loads(line))
+            except (ValueError, TypeError) as error: # JSONDecodeError и BackupFormatError — подклассы ValueError
+                raise BackupFormatError(f'Строка {number}: {error}') from error
+        importer.finish()
+        page_cache.mark_changed(db.session, page_cache.LISTS, page_cache.CATEGORIES)
+        # Импортированные строки сохраняют старые updated_at — инкрементальная синхронизация их не увидит
+        sync.request_resync(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # Bulk-вставка обходит события сессии — индексируем только импортированные записи
+    note_ids = list(importer.id_map['note'].values())
+    note_content.backfill_derived_fields()
+    tags.index_note_tags(note_ids)
+    if search.init_search_index():
+        search.rebuild_search_index() # Таблица индекса только что создана — заполняем целиком
+    else:
+        search.index_notes(note_ids)
+    reminders.ensure_reminders(importer.id_map['task'].values(), importer.id_map['event'].values())
+    return importer.counts
+
+
+def _safe_upload_name(name):
+    normalized = posixpath.normpath(name)
+    return (
+        normalized == name and not name.startswith(('/', '../', '.'))
+        and '/..' not in name and '\\' not in name
+    )
+
+
+def import_uploads_tar(fileobj):
+    """Распаковывает загрузки из tar (потоково). Существующие файлы не перезаписываются."""
+    root = media_store.uploads_dir()
+    written = 0
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.startswith('uploads/'):
+                continue
+            name = member.name[len('uploads/'):]
+            if not _safe_upload_name(name) or name.startswith(media_store.VARIANTS_DIR + '/'):
+                continue
+            target = os.path.join(root, name)
+            if os.path.exists(target):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            source = archive.extractfile(member)
+            with open(target, 'wb') as out:
+                while True:
+                    chunk = source.read(64 * 1024)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            written += 1
+    if written:
+        os.utime(root)
+    return written
+
+
+def import_from_directory(directory, user_id):
+    """Импорт notebook.ndjson и (если есть) uploads.tar из каталога экспорта."""
+    uploads_path = os.path.join(directory, 'uploads.tar')
+    files = 0
+    if os.path.exists(uploads_path):
+        with open(uploads_path, 'rb') as f:
+            files = import_uploads_tar(f)
+    with open(os.path.join(directory, 'notebook.ndjson'), encoding='utf-8') as f:
+        counts = import_lines(f, user_id)
+    return counts, files
+# --- /Импорт ---
@@ -0,0 +1,284 @@
+# bench/generate.py
+# -*- coding: utf-8 -*-
+
+"""
+Генератор синтетического блокнота для бенчмарков.
+
+Заполняет отдельную базу (не instance/notes.db) записями, задачами,
+событиями и категориями в масштабе 1k / 100k / 1m. Всё определяется
+зерном (--seed): одно и то же зерно даёт одну и ту же базу, поэтому
+замеры разных версий кода сравнимы. Время в данных отсчитывается от
+BASE_TIME, а не от текущего момента.
+
+Строки вставляются пачками через Core (executemany), вычисляемые поля
+записей считаются здесь же, индексы тегов, изображений (note_image) и
+поиска строятся один раз в конце — так же, как после импорта блокнота (backup.py).
+
+    python bench/generate.py --scale 1k
+    python bench/generate.py --scale 100k --seed 7 --database /tmp/notes-100k.db
+"""
+
+import argparse
+import os
+import random
+import secrets
+import sys
+import time
+from datetime import datetime, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_ROOT, 'bench', 'data')
+
+# Число записей; задач и событий — доля от него
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_SEED = 42
+BATCH_SIZE = 5000
+BASE_TIME = datetime(2026, 1, 1)
+HISTORY_DAYS = 3 * 365
+BENCH_ADMIN = ('bench', 'bench')
+BENCH_READER = ('reader', 'reader')
+
+WORDS = (
+    'блокнот запись статья задача событие календарь заметка список идея проект встреча отчёт '
+    'python flask sqlite индекс запрос кэш страница шаблон сервер клиент данные поиск тег '
+    'категория изображение превью публикация черновик ссылка текст абзац заголовок неделя '
+    'месяц план покупки книга фильм рецепт путешествие спорт здоровье работа дом сад '
+    'raspberry gunicorn nginx docker backup export import sync telegram reminder '
+    'быстро медленно важно срочно потом сегодня завтра вчера всегда иногда никогда'
+).split()
+TAG_STEMS = (
+    'работа дом идеи python flask sqlite linux книги фильмы рецепты путешествия спорт '
+    'здоровье финансы учёба музыка фото сад покупки проекты'
+).split()
+CATEGORY_STEMS = ('Работа', 'Личное', 'Проекты', 'Учёба', 'Хобби', 'Архив', 'Чтение', 'Дом', 'Поездки', 'Разное')
+COLORS = ('white', 'white', 'white', 'lightyellow', 'lightblue', 'lightgreen', 'mistyrose')
+PRIORITIES = ('low', 'normal', 'normal', 'high')
+RECURRENCES = (None, None, None, None, 'daily', 'weekly', 'monthly', 'yearly')
+# Частые слова встречаются чаще (примерно закон Ципфа) — поиск по ним тяжелее
+WORD_WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def default_database(scale):
+    return os.path.join(DATA_DIR, f'notes-{scale}.db')
+
+
+def database_url(path):
+    return 'sqlite:///' + os.path.abspath(path)
+
+
+def load_app(path):
+    """Создаёт приложение, направленное на базу path (создаёт схему при первом запуске)."""
+    os.environ['NOTEBOOK_DATABASE_URL'] = database_url(path)
+    # Профиль production требует ключей; для замеров подходят одноразовые
+    for variable in ('NOTEBOOK_SECRET_KEY', 'NOTEBOOK_JWT_SECRET_KEY'):
+        os.environ.setdefault(variable, secrets.token_hex(32))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from app import create_app
+    return create_app({'AUTO_INIT_DB': True})
+
+
+class NotebookGenerator:
+    """Строки таблиц для одного масштаба; случайность — только из self.rng."""
+
+    def __init__(self, notes, seed=DEFAULT_SEED):
+        self.rng = random.Random(seed)
+        self.notes = notes
+        self.tasks = max(notes // 5, 10)
+        self.events = max(notes // 10, 10)
+        self.tags = [f'{stem}{suffix}' for suffix in ('', *range(2, max(notes // 500, 1) + 1)) for stem in TAG_STEMS]
+        self.categories = [f'{stem} {number}' for number in range(1, max(notes // 1000, 2) + 1) for stem in CATEGORY_STEMS]
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(WORDS, WORD_WEIGHTS, k=count))
+
+    def sentence(self):
+        text = self.words(self.rng.randint(5, 16))
+        return text[0].upper() + text[1:] + '.'
+
+    def moment(self, days_back=HISTORY_DAYS):
+        return BASE_TIME - timedelta(seconds=self.rng.randint(0, days_back * 86400))
+
+    def article_html(self):
+        parts = []
+        for section in range(self.rng.randint(2, 6)):
+            parts.append(f'<h2>{self.words(3).capitalize()}</h2>')
+            for _ in range(self.rng.randint(1, 4)):
+                paragraph = ' '.join(self.sentence() for _ in range(self.rng.randint(2, 6)))
+                if self.rng.random() < 0.3:
+                    paragraph += f' <a href="https://example.com/{self.rng.randint(1, 9999)}">{self.words(2)}</a>'
+                if self.rng.random() < 0.2:
+                    paragraph = f'<strong>{self.words(2)}</strong> ' + paragraph
+                parts.append(f'<p>{paragraph}</p>')
+            if self.rng.random() < 0.3:
+                items = ''.join(f'<li>{self.words(self.rng.randint(2, 6))}</li>' for _ in range(self.rng.randint(2, 6)))
+                parts.append(f'<ul>{items}</ul>')
+            if section == 0 and self.rng.random() < 0.2:
+                parts.append(f'<img src="/static/uploads/bench-{self.rng.randint(1, 50)}.jpg" alt="{self.words(2)}">')
+        return '\n'.join(parts)
+
+    def note_row(self, user_id):
+        kind = self.rng.choices(('note', 'article', 'list', 'image_note'), (50, 30, 15, 5))[0]
+        created = self.moment()
+        row = {
+            'title': self.words(self.rng.randint(2, 7)).capitalize(),
+            'note_type': kind,
+            'content': None,
+            'full_content': None,
+            'summary': None,
+            'image_filename': None,
+            'preview_image': None,
+            'tags': ', '.join(self.rng.sample(self.tags, self.rng.randint(0, 4))) or None,
+            'background_color': self.rng.choice(COLORS),
+            'is_published': self.rng.random() < 0.3,
+            'created_at': created,
+            'updated_at': created + timedelta(seconds=self.rng.randint(0, 30 * 86400)),
+            'user_id': user_id,
+        }
+        if kind == 'article':
+            row['summary'] = self.sentence()
+            row['full_content'] = self.article_html()
+        elif kind == 'list':
+            row['content'] = '<ul>' + ''.join(f'<li>{self.words(self.rng.randint(1, 4))}</li>'
+                                              for _ in range(self.rng.randint(3, 12))) + '</ul>'
+        else:
+            row['content'] = ''.join(f'<p>{self.sentence()}</p>' for _ in range(self.rng.randint(1, 5)))
+            if kind == 'image_note':
+                row['image_filename'] = f'bench-{self.rng.randint(1, 50)}.jpg'
+        return row
+
+    def note_category_ids(self, category_ids):
+        return self.rng.sample(category_ids, self.rng.choices((0, 1, 2, 3), (20, 50, 20, 10))[0])
+
+    def task_row(self, user_id):
+        created = self.moment()
+        due = created + timedelta(days=self.rng.randint(-10, 60)) if self.rng.random() < 0.8 else None
+        return {
+            'title': self.words(self.rng.randint(2, 6)).capitalize(),
+            'description': self.sentence() if self.rng.random() < 0.6 else None,
+            'due_date': due,
+            'completed': due is not None and due < BASE_TIME and self.rng.random() < 0.7,
+            'priority': self.rng.choice(PRIORITIES),
+            'created_at': created,
+            'updated_at': created,
+            'user_id': user_id,
+        }
+
+    def event_row(self, user_id):
+        # События вокруг BASE_TIME: и прошлые, и запланированные
+        start = BASE_TIME + timedelta(minutes=30 * self.rng.randint(-2 * 365 * 48, 365 * 48))
+        recurrence = self.rng.choice(RECURRENCES)
+        return {
+            'title': self.words(self.rng.randint(2, 5)).capitalize(),
+            'description': self.sentence() if self.rng.random() < 0.5 else None,
+            'start_time': start,
+            'end_time': start + timedelta(minutes=30 * self.rng.randint(1, 6)) if self.rng.random() < 0.8 else None,
+            'location': self.words(2) if self.rng.random() < 0.4 else None,
+            'recurrence': recurrence,
+            'recurrence_until': start + timedelta(days=self.rng.randint(30, 730)) if recurrence and self.rng.random() < 0.5 else None,
+            'created_at': start - timedelta(days=7),
+            'updated_at': start - timedelta(days=7),
+            'user_id': user_id,
+        }
+
+
+def _batches(total, make_row):
+    batch = []
+    for _ in range(total):
+        batch.append(make_row())
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def populate(generator, log=print):
+    """Заполняет пустую базу текущего приложения. Возвращает число строк по таблицам."""
+    from sqlalchemy import insert
+
+    import note_content
+    import search
+    import tags
+    from models import db, Category, Event, Note, Task, User, note_categories
+
+    if db.session.scalar(db.select(db.func.count(Note.id))):
+        raise SystemExit('База уже заполнена — укажите новый файл (--database) или удалите старый.')
+
+    users = {}
+    for (username, password), is_admin in ((BENCH_ADMIN, True), (BENCH_READER, False)):
+        user = User.query.filter_by(username=username).first() or User(username=username, is_admin=is_admin)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.flush()
+        users[username] = user.id
+    admin_id = users[BENCH_ADMIN[0]]
+
+    category_ids = db.session.execute(
+        insert(Category.__table__).returning(Category.__table__.c.id, sort_by_parameter_order=True),
+        [{'name': name} for name in generator.categories],
+    ).scalars().all()
+    db.session.commit()
+
+    note_stmt = insert(Note.__table__).returning(Note.__table__.c.id, sort_by_parameter_order=True)
+    written = 0
+    for batch in _batches(generator.notes, lambda: generator.note_row(admin_id)):
+        for row in batch:
+            row.update(note_content.derive_fields(row['content'], row['full_content']))
+        note_ids = db.session.execute(note_stmt, batch).scalars().all()
+        links = [{'note_id': note_id, 'category_id': category_id}
+                 for note_id in note_ids for category_id in generator.note_category_ids(category_ids)]
+        if links:
+            db.session.execute(insert(note_categories), links)
+        db.session.commit()
+        written += len(batch)
+        log(f'  записи: {written}/{generator.notes}')
+
+    for model, total, make_row in ((Task, generator.tasks, generator.task_row), (Event, generator.events, generator.event_row)):
+        for batch in _batches(total, lambda: make_row(admin_id)):
+            db.session.execute(insert(model.__table__), batch)
+            db.session.commit()
+
+    # Вставка мимо ORM — индексы тегов, изображений и поиска строим целиком
+    log('  индекс тегов...')
+    tags.rebuild_tag_index()
+    note_content.rebuild_image_index()
+    search.init_search_index() # Таблица уже создана при импорте app, но пуста
+    if search.fts_enabled():
+        log('  индекс поиска...')
+        search.rebuild_search_index()
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+    return {'notes': generator.notes, 'tasks': generator.tasks, 'events': generator.events,
+            'categories': len(category_ids), 'note_categories': db.session.scalar(
+                db.select(db.func.count()).select_from(note_categories))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синтетический блокнот для бенчмарков.')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--database', help='Файл SQLite (по умолчанию bench/data/notes-<scale>.db).')
+    parser.add_argument('--force', action='store_true', help='Перезаписать существующий файл.')
+    args = parser.parse_args(argv)
+
+    path = args.database or default_database(args.scale)
+    if os.path.exists(path):
+        if not args.force:
+            raise SystemExit(f'{path} уже существует (--force — пересоздать).')
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    started = time.perf_counter()
+    app = load_app(path)
+    # Контекст запроса — для url_for в ссылках на изображения (note_content.derive_fields)
+    with app.app_context(), app.test_request_context():
+        counts = populate(NotebookGenerator(SCALES[args.scale], args.seed))
+    print(f'{path}: ' + ', '.join(f'{name} {count}' for name, count in counts.items())
+          + f' за {time.perf_counter() - started:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# bench/load.py
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный тест запущенного сервера (gunicorn или flask run).
+
+Несколько потоков в течение --duration секунд запрашивают маршруты из
+routes.py (кроме изменяющих базу), каждый со своей сессией. Отчёт по
+маршрутам — число запросов и ошибок, запросы в секунду, p50/p95; если
+сервер запущен с NOTEBOOK_INSTRUMENTATION=1 — среднее число SQL-запросов.
+С --pid добавляется пиковый RSS процесса сервера (VmHWM из /proc, Linux).
+
+    NOTEBOOK_SECRET_KEY=$(openssl rand -hex 32) NOTEBOOK_JWT_SECRET_KEY=$(openssl rand -hex 32) \\
+    NOTEBOOK_DATABASE_URL=sqlite:///$PWD/bench/data/notes-100k.db NOTEBOOK_INSTRUMENTATION=1 \\
+        gunicorn -w 4 -b 127.0.0.1:8000 app:app
+    python bench/load.py --url http://127.0.0.1:8000 --concurrency 16 --duration 30
+"""
+
+import argparse
+import http.cookiejar
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+import routes
+
+CONCURRENCY = 8
+DURATION = 30
+TIMEOUT = 30
+
+
+class Worker(threading.Thread):
+    """Поток со своей сессией: по кругу запрашивает маршруты одного пользователя."""
+
+    def __init__(self, base_url, user, route_list, deadline, offset):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.route_list = route_list
+        self.deadline = deadline
+        self.offset = offset # Потоки начинают с разных маршрутов
+        self.samples = defaultdict(list) # имя -> [(мс, SQL)]
+        self.errors = defaultdict(int)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        if user:
+            self.login(user)
+
+    def login(self, user):
+        data = urllib.parse.urlencode({'username': user[0], 'password': user[1]}).encode()
+        self.opener.open(self.base_url + '/login', data=data, timeout=TIMEOUT).read()
+
+    def run(self):
+        index = self.offset
+        while time.monotonic() < self.deadline:
+            route = self.route_list[index % len(self.route_list)]
+            index += 1
+            started = time.perf_counter()
+            try:
+                with self.opener.open(self.base_url + route.path, timeout=TIMEOUT) as response:
+                    response.read()
+                    queries = routes.query_count(response.headers)
+            except (urllib.error.URLError, OSError):
+                self.errors[route.name] += 1
+                continue
+            self.samples[route.name].append(((time.perf_counter() - started) * 1000, queries))
+
+
+def peak_rss_mb(pid):
+    with open(f'/proc/{pid}/status', encoding='ascii') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест запущенного сервера блокнота.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--routes', help='Имена маршрутов через запятую (по умолчанию все неизменяющие).')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY)
+    parser.add_argument('--duration', type=float, default=DURATION, help='Секунды.')
+    parser.add_argument('--pid', type=int, help='PID процесса сервера для пикового RSS.')
+    args = parser.parse_args(argv)
+
+    selected = [route for route in routes.select_routes(args.routes) if not route.mutates]
+    by_user = defaultdict(list)
+    for route in selected:
+        by_user[route.user].append(route)
+    base_url = args.url.rstrip('/')
+    deadline = time.monotonic() + args.duration
+    # Потоки распределяются между пользователями поровну
+    users = list(by_user)
+    workers = [Worker(base_url, users[i % len(users)], by_user[users[i % len(users)]], deadline, i)
+               for i in range(args.concurrency)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+
+    print(f'{"маршрут":<20} {"запросов":>9} {"ошибок":>7} {"в сек":>7} {"p50, мс":>9} {"p95, мс":>9} {"SQL":>6}')
+    total = 0
+    for route in selected:
+        samples = sorted(sample for worker in workers for sample in worker.samples[route.name])
+        errors = sum(worker.errors[route.name] for worker in workers)
+        total += len(samples)
+        timings = [timing for timing, _ in samples]
+        counts = [queries for _, queries in samples if queries is not None]
+        p50, p95 = routes.percentile(timings, 0.5), routes.percentile(timings, 0.95)
+        print(f'{route.name:<20} {len(samples):>9} {errors:>7} {len(samples) / elapsed:>7.1f} '
+              f'{p50 or 0:>9.1f} {p95 or 0:>9.1f} {(sum(counts) / len(counts)) if counts else 0:>6.1f}')
+    print(f'Всего: {total} запросов за {elapsed:.1f} с ({total / elapsed:.1f} в сек), потоков: {args.concurrency}')
+    if args.pid:
+        print(f'Пиковый RSS сервера: {peak_rss_mb(args.pid):.1f} МБ')
+
+
+if __name__ == '__main__':
+    main()
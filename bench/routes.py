@@ -0,0 +1,89 @@
+# bench/routes.py
+# -*- coding: utf-8 -*-
+
+"""
+Маршруты, которые замеряют run.py (тестовый клиент) и load.py (живой сервер).
+
+Запросы рассчитаны на базу из generate.py: пользователи bench/reader,
+слова и время событий оттуда же. Маршрут с prepare изменяет базу: перед
+каждым повтором prepare (вне замера) готовит данные и возвращает путь.
+"""
+
+import math
+
+from generate import BASE_TIME, BENCH_ADMIN, BENCH_READER
+
+EVENTS_WINDOW = (BASE_TIME.isoformat(), BASE_TIME.replace(month=2, day=12).isoformat()) # Месяц FullCalendar с краями
+DELETED_CATEGORY_STRIDE = 20 # В удаляемой категории каждая 20-я запись (5%)
+
+
+class Route:
+    def __init__(self, name, path, user=None, method='GET', prepare=None):
+        self.name = name
+        self.path = path
+        self.user = user # (имя, пароль) или None — гость
+        self.method = method
+        self.prepare = prepare
+
+    @property
+    def mutates(self):
+        return self.prepare is not None
+
+
+def prepare_category(iteration):
+    """Новая категория с каждой DELETED_CATEGORY_STRIDE-й записью — её удалит следующий запрос."""
+    from sqlalchemy import insert
+
+    from models import db, Category, Note, note_categories
+
+    category_id = db.session.execute(
+        insert(Category.__table__).values(name=f'bench-delete-{iteration}').returning(Category.__table__.c.id)
+    ).scalar_one()
+    db.session.execute(note_categories.insert().from_select(
+        ['note_id', 'category_id'],
+        db.select(Note.id, db.literal(category_id))
+        .where(Note.id % DELETED_CATEGORY_STRIDE == iteration % DELETED_CATEGORY_STRIDE),
+    ))
+    db.session.commit()
+    return f'/categories/delete/{category_id}'
+
+
+ROUTES = [
+    Route('wall_guest', '/wall'),
+    Route('wall_admin', '/wall', BENCH_ADMIN),
+    Route('wall_search', '/wall?search=python', BENCH_ADMIN),
+    Route('wall_reader_search', '/wall?search=sqlite', BENCH_READER),
+    Route('admin_index', '/admin', BENCH_ADMIN),
+    Route('admin_search', '/admin?search=flask', BENCH_ADMIN),
+    Route('api_events', f'/api/events?start={EVENTS_WINDOW[0]}&end={EVENTS_WINDOW[1]}', BENCH_ADMIN),
+    Route('delete_category', None, BENCH_ADMIN, method='POST', prepare=prepare_category),
+]
+ROUTES_BY_NAME = {route.name: route for route in ROUTES}
+
+
+def select_routes(names):
+    """Маршруты по списку имён через запятую (пусто — все)."""
+    if not names:
+        return list(ROUTES)
+    unknown = [name for name in names.split(',') if name not in ROUTES_BY_NAME]
+    if unknown:
+        raise SystemExit(f'Неизвестные маршруты: {", ".join(unknown)} (есть: {", ".join(ROUTES_BY_NAME)})')
+    return [ROUTES_BY_NAME[name] for name in names.split(',')]
+
+
+def query_count(response_headers):
+    """Число SQL-запросов из заголовка Server-Timing (instrumentation.py) или None."""
+    header = response_headers.get('Server-Timing') or ''
+    for part in header.split(','):
+        name, _, rest = part.strip().partition(';')
+        if name == 'db' and 'desc="' in rest:
+            return int(rest.split('desc="', 1)[1].split(' ', 1)[0])
+    return None
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу (values отсортированы)."""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, math.ceil(share * len(values)) - 1))
+    return values[index]
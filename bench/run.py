@@ -0,0 +1,207 @@
+# bench/run.py
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк маршрутов через тестовый клиент Flask.
+
+Каждый маршрут замеряется в отдельном процессе (свой пик RSS, холодный
+кэш процесса): WARMUP повторов прогрева, затем ITERATIONS замеров. Отчёт —
+p50/p95 задержки, число SQL-запросов на запрос (из Server-Timing,
+instrumentation.py) и пиковый RSS процесса. Кэш страниц по умолчанию
+выключен (NullCache), чтобы замерялась работа маршрута, а не попадание в
+кэш; --cache включает его.
+
+Результаты сравниваются с bench/baselines.json; при регрессии (больше
+SQL-запросов, p95 или RSS выше допуска) код выхода 1. --update-baseline
+записывает текущие значения как новые эталонные.
+
+    python bench/generate.py --scale 1k
+    python bench/run.py --scale 1k
+    python bench/run.py --scale 1k --routes wall_admin,api_events --update-baseline
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import routes
+from generate import SCALES, default_database, load_app
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+ITERATIONS = 30
+WARMUP = 3
+LATENCY_TOLERANCE = 0.5 # p95 может вырасти на 50% — разброс на разных машинах
+LATENCY_SLACK_MS = 2.0 # Для быстрых маршрутов — абсолютный допуск
+RSS_TOLERANCE = 0.25
+
+
+# --- Замер в процессе-исполнителе ---
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024 # macOS — байты, Linux — КиБ
+
+
+def _login(app, client, user):
+    from models import db, User
+
+    with app.app_context():
+        user_id = db.session.scalar(db.select(User.id).where(User.username == user[0]))
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+
+def measure(route, database, iterations, warmup, use_cache):
+    """Замеряет маршрут в текущем процессе. Возвращает словарь результатов."""
+    os.environ['NOTEBOOK_INSTRUMENTATION'] = '1'
+    if not use_cache:
+        os.environ['NOTEBOOK_CACHE_TYPE'] = 'NullCache'
+    app = load_app(database)
+    client = app.test_client()
+    if route.user:
+        _login(app, client, route.user)
+
+    timings, queries = [], []
+    for iteration in range(warmup + iterations):
+        path = route.path
+        if route.prepare:
+            with app.app_context():
+                path = route.prepare(iteration)
+        started = time.perf_counter()
+        response = client.open(path, method=route.method)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise SystemExit(f'{route.name}: {route.method} {path} -> {response.status_code}')
+        if iteration >= warmup:
+            timings.append(elapsed)
+            queries.append(routes.query_count(response.headers))
+    timings.sort()
+    return {
+        'p50_ms': round(routes.percentile(timings, 0.5), 2),
+        'p95_ms': round(routes.percentile(timings, 0.95), 2),
+        'queries': max(queries) if None not in queries else None,
+        'rss_mb': round(_peak_rss_mb(), 1),
+    }
+# --- /Замер в процессе-исполнителе ---
+
+
+# --- Запуск и сравнение ---
+def _copy_database(source, target):
+    # API резервного копирования SQLite учитывает WAL
+    with sqlite3.connect(source) as src, sqlite3.connect(target) as dst:
+        src.backup(dst)
+
+
+def run_route(route, database, args):
+    """Запускает замер маршрута в отдельном процессе; изменяющие маршруты — на копии базы."""
+    workdir = tempfile.mkdtemp(prefix='notebook-bench-') if route.mutates else None
+    try:
+        if workdir:
+            copy = os.path.join(workdir, 'notes.db')
+            _copy_database(database, copy)
+            database = copy
+        command = [sys.executable, os.path.abspath(__file__), '--worker', route.name, '--database', database,
+                   '--iterations', str(args.iterations), '--warmup', str(args.warmup)]
+        if args.cache:
+            command.append('--cache')
+        completed = subprocess.run(command, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise SystemExit(f'{route.name}: исполнитель завершился с ошибкой\n{completed.stderr[-2000:]}')
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(name, result, baseline, args):
+    """Список описаний регрессий маршрута относительно эталона."""
+    problems = []
+    if baseline is None:
+        return problems
+    if result['queries'] is not None and baseline.get('queries') is not None and result['queries'] > baseline['queries']:
+        problems.append(f'{name}: SQL-запросов {result["queries"]} > {baseline["queries"]}')
+    limit = baseline['p95_ms'] * (1 + args.latency_tolerance) + LATENCY_SLACK_MS
+    if result['p95_ms'] > limit:
+        problems.append(f'{name}: p95 {result["p95_ms"]} мс > {limit:.1f} мс (эталон {baseline["p95_ms"]})')
+    limit = baseline['rss_mb'] * (1 + args.rss_tolerance)
+    if result['rss_mb'] > limit:
+        problems.append(f'{name}: RSS {result["rss_mb"]} МБ > {limit:.1f} МБ (эталон {baseline["rss_mb"]})')
+    return problems
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(path, baselines):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарк маршрутов блокнота.')
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='Масштаб данных и ключ эталонов.')
+    parser.add_argument('--database', help='База из generate.py (по умолчанию bench/data/notes-<scale>.db).')
+    parser.add_argument('--routes', help='Имена маршрутов через запятую (по умолчанию все).')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS)
+    parser.add_argument('--warmup', type=int, default=WARMUP)
+    parser.add_argument('--cache', action='store_true', help='Не отключать кэш страниц.')
+    parser.add_argument('--baseline', default=BASELINES_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--latency-tolerance', type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument('--rss-tolerance', type=float, default=RSS_TOLERANCE)
+    parser.add_argument('--json', help='Записать результаты в файл.')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    database = args.database or default_database(args.scale)
+    if not os.path.exists(database):
+        raise SystemExit(f'Нет базы {database}: python bench/generate.py --scale {args.scale}')
+
+    if args.worker:
+        result = measure(routes.ROUTES_BY_NAME[args.worker], database, args.iterations, args.warmup, args.cache)
+        print(json.dumps(result))
+        return
+
+    results = {}
+    print(f'{"маршрут":<20} {"p50, мс":>9} {"p95, мс":>9} {"SQL":>5} {"RSS, МБ":>9}')
+    for route in routes.select_routes(args.routes):
+        result = results[route.name] = run_route(route, database, args)
+        print(f'{route.name:<20} {result["p50_ms"]:>9} {result["p95_ms"]:>9} {result["queries"]!s:>5} {result["rss_mb"]:>9}')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'scale': args.scale, 'results': results}, f, ensure_ascii=False, indent=2)
+
+    baselines = load_baselines(args.baseline)
+    if args.update_baseline:
+        baselines.setdefault(args.scale, {}).update(results)
+        save_baselines(args.baseline, baselines)
+        print(f'Эталоны обновлены: {args.baseline}')
+        return
+
+    scale_baselines = baselines.get(args.scale, {})
+    problems = [problem for name, result in results.items()
+                for problem in compare(name, result, scale_baselines.get(name), args)]
+    missing = [name for name in results if name not in scale_baselines]
+    if missing:
+        print(f'Нет эталонов для: {", ".join(missing)} (--update-baseline)')
+    if problems:
+        print('Регрессии:\n  ' + '\n  '.join(problems))
+        sys.exit(1)
+    print('Регрессий нет.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# calendar_feed.py
+# -*- coding: utf-8 -*-
+
+"""
+Лента событий для FullCalendar (/api/events).
+
+FullCalendar при каждом переключении вида запрашивает только видимый
+диапазон (?start=...&end=...). Из базы выбираются события, пересекающиеся
+с этим окном (индекс (user_id, start_time)), повторяющиеся события
+разворачиваются в отдельные вхождения только внутри окна, а JSON отдаётся
+потоком — без сборки всего списка в памяти.
+"""
+
+import calendar
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_
+
+from models import Event
+
+RECURRENCE_CHOICES = {
+    'daily': 'Каждый день',
+    'weekly': 'Каждую неделю',
+    'monthly': 'Каждый месяц',
+    'yearly': 'Каждый год',
+}
+DEFAULT_WINDOW_DAYS = 42 # Без параметров — примерно видимая сетка месяца
+MAX_WINDOW_DAYS = 400 # Ограничение на размер разворачиваемого окна
+_FIXED_STEPS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+_MONTH_STEPS = {'monthly': 1, 'yearly': 12}
+
+
+def _parse_datetime(value):
+    """ISO-дата из FullCalendar; смещение отбрасывается — время событий хранится "настенным"."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace(' ', '+'))
+    except ValueError:
+        return None
+    return parsed.replace(tzinfo=None)
+
+
+def parse_window(args):
+    """Возвращает (start, end) видимого окна из параметров запроса или None при ошибке."""
+    start = _parse_datetime(args.get('start'))
+    end = _parse_datetime(args.get('end'))
+    if args.get('start') and start is None or args.get('end') and end is None:
+        return None
+    if start is None:
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=today.day - 1)
+    if end is None or end <= start:
+        end = start + timedelta(days=DEFAULT_WINDOW_DAYS)
+    return start, min(end, start + timedelta(days=MAX_WINDOW_DAYS))
+
+
+def window_query(user_id, start, end):
+    """События пользователя, которые (или повторы которых) попадают в [start, end)."""
+    single = and_(
+        Event.recurrence.is_(None),
+        func.coalesce(Event.end_time, Event.start_time) >= start,
+    )
+    recurring = and_(
+        Event.recurrence.isnot(None),
+        or_(Event.recurrence_until.is_(None), Event.recurrence_until >= start),
+    )
+    return Event.query.filter(Event.user_id == user_id, Event.start_time < end, or_(single, recurring)) \
+                      .order_by(Event.start_time)
+
+
+def _add_months(value, months):
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    # 31 января + 1 месяц = последний день февраля
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def iter_occurrences(event, start, end):
+    """Вхождения события (начало, конец) внутри окна [start, end), лениво."""
+    duration = (event.end_time - event.start_time) if event.end_time else timedelta(0)
+    if not event.recurrence:
+        yield event.start_time, event.end_time
+        return
+
+    limit = min(end, event.recurrence_until + timedelta(microseconds=1)) if event.recurrence_until else end
+    if event.recurrence in _FIXED_STEPS:
+        step = _FIXED_STEPS[event.recurrence]
+        # Сразу к первому вхождению, которое может пересечь окно
+        skip = max(0, (start - duration - event.start_time) // step)
+        occurrence = event.start_time + step * skip
+        while occurrence < limit:
+            if occurrence + duration >= start:
+                yield occurrence, (occurrence + duration if event.end_time else None)
+            occurrence += step
+    elif event.recurrence in _MONTH_STEPS:
+        months = _MONTH_STEPS[event.recurrence]
+        first = start - duration
+        skip = max(0, ((first.year - event.start_time.year) * 12 + first.month - event.start_time.month) // months - 1)
+        while True:
+            # Считаем от исходной даты, чтобы 31-е число не "сползало" к 28-му
+            occurrence = _add_months(event.start_time, skip * months)
+            if occurrence >= limit:
+                break
+            if occurrence + duration >= start:
+                yield occurrence, (occurrence + duration if event.end_time else None)
+            skip += 1
+
+
+def _event_json(event, occurrence_start, occurrence_end):
+    item = {'id': event.id, 'title': event.title, 'start': occurrence_start.isoformat()}
+    if occurrence_end:
+        item['end'] = occurrence_end.isoformat()
+    if event.recurrence:
+        item['groupId'] = event.id # FullCalendar подсвечивает все повторы вместе
+    if event.description:
+        item['description'] = event.description
+    if event.location:
+        item['location'] = event.location
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':'))
+
+
+def stream_events(query, start, end, batch_size=200):
+    """Генератор компактного JSON-массива вхождений для StreamingResponse."""
+    yield '['
+    first = True
+    for event in query.yield_per(batch_size):
+        for occurrence_start, occurrence_end in iter_occurrences(event, start, end):
+            yield ('' if first else ',') + _event_json(event, occurrence_start, occurrence_end)
+            first = False
+    yield ']'
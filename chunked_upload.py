@@ -0,0 +1,206 @@
+# chunked_upload.py
+# -*- coding: utf-8 -*-
+
+"""
+Загрузка больших изображений частями с докачкой.
+
+Обычная загрузка (/upload_image) приходит одним multipart-запросом: Werkzeug
+сохраняет его целиком во временный файл, прежде чем маршрут что-то увидит,
+а при обрыве связи всё начинается с нуля. Здесь файл передаётся частями
+(маршруты /uploads в app.py):
+
+    POST   /uploads               {"filename", "size"} -> {"id", "offset": 0, "chunk_size"}
+    PUT    /uploads/<id>          тело — байты части, заголовок Upload-Offset -> {"offset"}
+    GET    /uploads/<id>          -> {"offset", "size"} — с чего продолжить после обрыва
+    POST   /uploads/<id>/complete -> {"location"}
+    DELETE /uploads/<id>
+
+Часть пишется из потока запроса прямо в файл <id>.part в каталоге
+незавершённых загрузок хранилища (media_store.INCOMING_DIR). Смещение
+загрузки — размер этого файла: часть принимается, только если
+Upload-Offset с ним совпадает. Байты, дошедшие до обрыва, остаются в файле,
+и клиент продолжает с отданного GET смещения. Описание загрузки (владелец,
+размер, имя) лежит рядом в <id>.json, поэтому продолжить можно в любом
+воркере gunicorn.
+
+Тип файла определяется по первым байтам (media_store.detect_image_type),
+а не по расширению имени. Готовый файл хешируется и атомарно переносится в
+хранилище. Брошенные загрузки удаляет gc-uploads (старше суток).
+"""
+
+import json
+import os
+import re
+import secrets
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows — без блокировки файла части
+    fcntl = None
+
+import media_store
+
+CHUNK_SIZE = 1024 * 1024 # Рекомендуемый клиенту размер части
+READ_SIZE = 64 * 1024
+_UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadError(Exception):
+    """Ошибка протокола загрузки; status — код ответа HTTP."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset # Текущее смещение — клиенту, чтобы продолжить с него
+
+    def to_dict(self):
+        data = {'error': self.message}
+        if self.offset is not None:
+            data['offset'] = self.offset
+        return data
+
+
+# --- Файлы загрузки ---
+def _incoming_dir():
+    path = os.path.join(media_store.uploads_dir(), media_store.INCOMING_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _paths(upload_id):
+    if not _UPLOAD_ID_RE.match(upload_id or ''):
+        raise UploadError('Загрузка не найдена', 404)
+    base = os.path.join(_incoming_dir(), upload_id)
+    return base + '.part', base + '.json'
+
+
+def _load(upload_id, user_id):
+    part_path, meta_path = _paths(upload_id)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise UploadError('Загрузка не найдена', 404) from None
+    if meta['user_id'] != user_id:
+        raise UploadError('Загрузка не найдена', 404)
+    return meta, part_path, meta_path
+
+
+@contextmanager
+def _locked_part(part_path, mode):
+    """Файл части под исключительной блокировкой: её берут и дописывание, и завершение."""
+    try:
+        f = open(part_path, mode)
+    except FileNotFoundError:
+        raise UploadError('Загрузка не найдена', 404) from None
+    with f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Повтор части или завершение, пока предыдущий запрос ещё пишет
+                raise UploadError('Часть уже загружается', 409) from None
+            # Между open и flock загрузку могли завершить и перенести файл в хранилище
+            try:
+                current = os.path.samestat(os.fstat(f.fileno()), os.stat(part_path))
+            except FileNotFoundError:
+                current = False
+            if not current:
+                raise UploadError('Загрузка не найдена', 404)
+        yield f
+
+
+def _remove(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+# --- /Файлы загрузки ---
+
+
+def start_upload(user_id, filename, size, max_size):
+    """Создаёт пустую загрузку. Возвращает описание для клиента."""
+    if not isinstance(size, int) or size <= 0:
+        raise UploadError('Не указан размер файла')
+    if size > max_size:
+        raise UploadError(f'Файл больше {max_size // (1024 * 1024)} МБ', 413)
+    upload_id = secrets.token_hex(16)
+    part_path, meta_path = _paths(upload_id)
+    open(part_path, 'xb').close()
+    meta = {'user_id': user_id, 'filename': str(filename or '')[:255], 'size': size, 'created_at': time.time()}
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return {'id': upload_id, 'offset': 0, 'size': size, 'chunk_size': CHUNK_SIZE}
+
+
+def upload_status(upload_id, user_id):
+    meta, part_path, _ = _load(upload_id, user_id)
+    return {'id': upload_id, 'offset': os.path.getsize(part_path), 'size': meta['size']}
+
+
+def append_chunk(upload_id, user_id, offset, stream):
+    """Дописывает часть из потока запроса с позиции offset. Возвращает новое смещение.
+
+    Смещение должно совпадать с размером уже записанного; иначе 409 с
+    текущим смещением. При обрыве соединения записанное остаётся в файле.
+    """
+    meta, part_path, meta_path = _load(upload_id, user_id)
+    with _locked_part(part_path, 'r+b') as out:
+        current = os.fstat(out.fileno()).st_size
+        if offset != current:
+            raise UploadError('Смещение не совпадает с загруженным', 409, offset=current)
+        out.seek(current)
+        # Тип проверяем по первой части, чтобы не принимать мегабайты не-изображения
+        first = current == 0
+        try:
+            while True:
+                chunk = stream.read(READ_SIZE)
+                if not chunk:
+                    break
+                if first:
+                    first = False
+                    if len(chunk) >= media_store.SIGNATURE_LENGTH and media_store.detect_image_type(chunk) is None:
+                        raise UploadError('Файл не является изображением PNG, JPEG или GIF', 415)
+                if out.tell() + len(chunk) > meta['size']:
+                    raise UploadError('Данных больше заявленного размера', 413)
+                out.write(chunk)
+        except UploadError:
+            # Отбрасываем всю эту часть: смещение остаётся прежним
+            out.truncate(current)
+            raise
+        finally:
+            out.flush()
+        offset = out.tell()
+    # Брошенными считаются загрузки без новых частей больше суток (gc-uploads)
+    try:
+        os.utime(meta_path)
+    except FileNotFoundError: # Загрузку уже завершили или отменили
+        pass
+    return offset
+
+
+def complete_upload(upload_id, user_id):
+    """Проверяет и переносит готовый файл в хранилище. Возвращает (имя, True если файл новый).
+
+    Размер проверяется под той же блокировкой, что и дописывание: часть,
+    которая ещё пишется, не попадёт в хранилище обрезанной.
+    """
+    meta, part_path, meta_path = _load(upload_id, user_id)
+    with _locked_part(part_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size != meta['size']:
+            raise UploadError('Файл загружен не полностью', 409, offset=size)
+        ext = media_store.detect_image_type(f.read(media_store.SIGNATURE_LENGTH))
+        if ext is None:
+            _remove(part_path, meta_path)
+            raise UploadError('Файл не является изображением PNG, JPEG или GIF', 415)
+        result = media_store.store_file(part_path, ext)
+    _remove(meta_path)
+    return result
+
+
+def cancel_upload(upload_id, user_id):
+    _, part_path, meta_path = _load(upload_id, user_id)
+    _remove(part_path, meta_path)
@@ -0,0 +1,144 @@
+# config.py
+# -*- coding: utf-8 -*-
+
+"""
+Настройки приложения по профилям.
+
+Профиль выбирается аргументом create_app() или переменной окружения
+NOTEBOOK_CONFIG: development (python app.py), production (gunicorn через
+wsgi.py, по умолчанию) или testing (база в памяти). Профиль задаёт
+значения по умолчанию; переменные NOTEBOOK_* их переопределяют.
+
+В production схема базы и сжатые копии статики не создаются при запуске:
+это отдельные шаги (flask --app app init-db, build-assets), чтобы воркеры
+gunicorn не выполняли их одновременно.
+"""
+
+import os
+from datetime import timedelta
+
+DEFAULT_PROFILE = 'production'
+
+# Без них production не запускается: ключи по умолчанию известны всем, и
+# по ним можно подписать cookie сессии или JWT администратора для /api/v1
+REQUIRED_SECRETS = {'production': ('NOTEBOOK_SECRET_KEY', 'NOTEBOOK_JWT_SECRET_KEY')}
+
+BASE_CONFIG = {
+    'SECRET_KEY': 'your-secret-key-here',
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///notes.db',
+    'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    'UPLOAD_FOLDER': 'static/uploads',
+    'MAX_CONTENT_LENGTH': 16 * 1024 * 1024,
+    'UPLOAD_MAX_SIZE': 64 * 1024 * 1024, # Изображение, загружаемое частями (chunked_upload.py)
+    'IMAGE_WORKERS': 2, # Потоки для создания уменьшенных копий изображений (images.py)
+    'NOTES_SHOW_TOTAL': True, # Показывать общее число записей в списках (кэшируется)
+    'CACHE_TYPE': 'SimpleCache',
+    # Страницы сбрасываются по изменениям Note/Category; TTL ограничивает только
+    # "возраст" относительных дат ("5 мин. назад") в закэшированных карточках
+    'PAGE_CACHE_ENABLED': True,
+    'PAGE_CACHE_TIMEOUT': 300,
+    'ERROR_404_HELP': False, # Без подсказок Flask-RESTX "did you mean ..." в ответах 404
+    'WARM_UP': True, # Прогрев шаблонов и кэшей в wsgi.py
+    # Измерения запросов (instrumentation.py); в testing переменные окружения не читаются
+    'INSTRUMENTATION_ENABLED': False,
+    'SLOW_REQUEST_SECONDS': 0.5,
+    'PROFILE_SLOW_REQUESTS': False,
+}
+
+CONFIG_PROFILES = {
+    'development': {
+        'DEBUG': True,
+        'TEMPLATES_AUTO_RELOAD': True,
+        'DB_PROFILE': 'development',
+        'AUTO_INIT_DB': True, # Схема создаётся и обновляется при каждом запуске
+        'ASSETS_COMPRESS_ON_STARTUP': True,
+    },
+    'production': {
+        'DB_PROFILE': 'production',
+        'AUTO_INIT_DB': False,
+        'ASSETS_COMPRESS_ON_STARTUP': False,
+    },
+    'testing': {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://', # В памяти; пул production для неё не подходит
+        'DB_PROFILE': 'development',
+        'AUTO_INIT_DB': True,
+        'CACHE_TYPE': 'NullCache',
+        'ASSETS_COMPRESS_ON_STARTUP': False,
+        'IMAGE_WORKERS': 1,
+    },
+}
+
+
+def _env_list(name, default):
+    return [item.strip() for item in os.environ.get(name, default).split(',') if item.strip()]
+
+
+def _environment(instance_path):
+    """Значения из переменных окружения (None — переменная не задана)."""
+    env = os.environ.get
+    secret_key = env('NOTEBOOK_SECRET_KEY')
+    settings = {
+        'SECRET_KEY': secret_key,
+        'SQLALCHEMY_DATABASE_URI': env('NOTEBOOK_DATABASE_URL'), # Другая база — например, для bench/
+        'DB_PROFILE': env('NOTEBOOK_DB_PROFILE'),
+        'WARM_UP': env('NOTEBOOK_WARM_UP', '1') != '0',
+        'UPLOAD_MAX_SIZE': int(env('NOTEBOOK_UPLOAD_MAX_MB')) * 1024 * 1024 if env('NOTEBOOK_UPLOAD_MAX_MB') else None,
+
+        # --- Кэш: SimpleCache — в памяти процесса, FileSystemCache — общий для воркеров gunicorn каталог ---
+        'CACHE_TYPE': env('NOTEBOOK_CACHE_TYPE'),
+        'CACHE_DIR': env('NOTEBOOK_CACHE_DIR', os.path.join(instance_path, 'cache')),
+        'CACHE_REDIS_URL': env('NOTEBOOK_CACHE_REDIS_URL'),
+        'CACHE_DEFAULT_TIMEOUT': int(env('NOTEBOOK_CACHE_TIMEOUT', 3600)),
+
+        # --- JSON API /api/v1 (JWT, см. api_v1.py) ---
+        'JWT_SECRET_KEY': env('NOTEBOOK_JWT_SECRET_KEY', secret_key),
+        'JWT_ACCESS_TOKEN_EXPIRES': timedelta(hours=int(env('NOTEBOOK_JWT_EXPIRES_HOURS', 12))),
+
+        # --- Telegram-бот (flask --app app telegram-bot, см. telegram_bot.py) ---
+        'TELEGRAM_BOT_TOKEN': env('NOTEBOOK_TELEGRAM_TOKEN'),
+        # Адреса Bot API; переопределяются для проверки на локальной заглушке
+        'TELEGRAM_API_URL': env('NOTEBOOK_TELEGRAM_API_URL'),
+        'TELEGRAM_FILE_URL': env('NOTEBOOK_TELEGRAM_FILE_URL'),
+
+        # --- Напоминания (flask --app app reminders, см. reminders.py) ---
+        'REMINDER_SINKS': _env_list('NOTEBOOK_REMINDER_SINKS', 'log,telegram,webpush'),
+        # Ключи VAPID для web push (нужен пакет pywebpush)
+        'VAPID_PUBLIC_KEY': env('NOTEBOOK_VAPID_PUBLIC_KEY'),
+        'VAPID_PRIVATE_KEY': env('NOTEBOOK_VAPID_PRIVATE_KEY'),
+        'VAPID_CLAIMS_EMAIL': env('NOTEBOOK_VAPID_CLAIMS_EMAIL'),
+
+        # --- Измерения запросов: Server-Timing, /metrics, поиск N+1 (см. instrumentation.py) ---
+        'INSTRUMENTATION_ENABLED': env('NOTEBOOK_INSTRUMENTATION') == '1',
+        'SLOW_REQUEST_SECONDS': float(env('NOTEBOOK_SLOW_REQUEST_MS', 500)) / 1000,
+        'PROFILE_SLOW_REQUESTS': env('NOTEBOOK_PROFILE_SLOW') == '1',
+        'METRICS_TOKEN': env('NOTEBOOK_METRICS_TOKEN'), # Bearer-токен для сборщика Prometheus
+    }
+    return {key: value for key, value in settings.items() if value is not None}
+
+
+def get_profile(name=None):
+    name = name or os.environ.get('NOTEBOOK_CONFIG', DEFAULT_PROFILE)
+    if name not in CONFIG_PROFILES:
+        raise ValueError(f'Неизвестный профиль настроек: {name} (доступны: {", ".join(CONFIG_PROFILES)})')
+    return name, CONFIG_PROFILES[name]
+
+
+def load_config(profile=None, instance_path='instance'):
+    """Настройки профиля: BASE_CONFIG, затем профиль, затем переменные окружения.
+
+    Для testing окружение не учитывается — тесты не должны зависеть от него.
+    Профиль production требует ключей из REQUIRED_SECRETS (RuntimeError).
+    """
+    name, settings = get_profile(profile)
+    missing = [variable for variable in REQUIRED_SECRETS.get(name, ()) if not os.environ.get(variable)]
+    if missing:
+        raise RuntimeError(f'Профиль {name}: не заданы {", ".join(missing)} (случайные строки, например openssl rand -hex 32)')
+    config = {**BASE_CONFIG, 'CONFIG_PROFILE': name}
+    config.update(settings)
+    if name != 'testing':
+        config.update(_environment(instance_path))
+    config.setdefault('JWT_SECRET_KEY', config['SECRET_KEY'])
+    config.setdefault('JWT_ACCESS_TOKEN_EXPIRES', timedelta(hours=12))
+    config.setdefault('REMINDER_SINKS', ['log'])
+    return config
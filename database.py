@@ -0,0 +1,86 @@
+# database.py
+# -*- coding: utf-8 -*-
+
+"""
+Профили подключения к SQLite.
+
+С настройками по умолчанию (журнал отката, synchronous=FULL, без
+busy_timeout) писатель блокирует читателей, и под несколькими воркерами
+gunicorn появляются ошибки "database is locked". Профиль задаёт параметры
+пула соединений и PRAGMA, которые выполняются при каждом новом соединении.
+
+Профиль выбирается переменной окружения NOTEBOOK_DB_PROFILE.
+"""
+
+import os
+
+from sqlalchemy import event
+
+DEFAULT_PROFILE = 'production'
+
+DB_PROFILES = {
+    # Для разработки: только ожидание блокировки вместо мгновенной ошибки
+    'development': {
+        'engine_options': {},
+        'pragmas': {
+            'busy_timeout': 5000,
+        },
+    },
+    # Для gunicorn на Raspberry Pi: WAL (читатели не ждут писателя) и умеренная память
+    'production': {
+        'engine_options': {
+            'pool_size': 5,
+            'max_overflow': 10,
+            'pool_timeout': 10,
+            'pool_recycle': 3600,
+            'pool_pre_ping': True,
+        },
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL', # В режиме WAL безопасно: теряется только последняя транзакция при сбое питания
+            'busy_timeout': 5000, # мс
+            'cache_size': -16000, # Отрицательное значение — в КиБ (16 МБ на соединение)
+            'mmap_size': 64 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+
+
+def get_profile(name=None):
+    name = name or os.environ.get('NOTEBOOK_DB_PROFILE', DEFAULT_PROFILE)
+    if name not in DB_PROFILES:
+        raise ValueError(f'Неизвестный профиль базы данных: {name} (доступны: {", ".join(DB_PROFILES)})')
+    return name, DB_PROFILES[name]
+
+
+def configure_database(app, profile=None):
+    """Записывает параметры профиля в конфиг. Вызывается до db.init_app(app)."""
+    name, settings = get_profile(profile)
+    app.config['DB_PROFILE'] = name
+    app.config['SQLITE_PRAGMAS'] = dict(settings['pragmas'])
+    engine_options = dict(settings['engine_options'])
+    engine_options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options
+
+
+def install_pragmas(engine, pragmas):
+    """Выполняет PRAGMA при каждом новом соединении с SQLite."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma_name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {pragma_name}={value}')
+        finally:
+            cursor.close()
+
+
+def optimize(engine):
+    """Обновляет статистику планировщика для новых индексов (PRAGMA optimize)."""
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            conn.exec_driver_sql('PRAGMA optimize')
@@ -0,0 +1,16 @@
+# extensions.py
+# -*- coding: utf-8 -*-
+
+"""
+Расширения Flask, которые нужны нескольким модулям.
+Создаются без приложения и подключаются в create_app() (app.py) через
+init_app() (по аналогии с db из models.py).
+"""
+
+from flask_caching import Cache
+from flask_jwt_extended import JWTManager
+from flask_login import LoginManager
+
+cache = Cache()
+jwt = JWTManager()
+login_manager = LoginManager()
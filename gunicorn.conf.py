@@ -0,0 +1,23 @@
+# gunicorn.conf.py
+# -*- coding: utf-8 -*-
+
+"""
+Настройки gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+preload_app: приложение создаётся и прогревается один раз в главном
+процессе (см. wsgi.py), воркеры получают его через fork — запуск быстрее
+и память страниц кода общая.
+"""
+
+import os
+
+bind = os.environ.get('NOTEBOOK_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('NOTEBOOK_WORKERS', 2))
+threads = int(os.environ.get('NOTEBOOK_THREADS', 2))
+preload_app = True
+timeout = 60
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.after_fork(wsgi.app)
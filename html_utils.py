@@ -0,0 +1,234 @@
+# html_utils.py
+# -*- coding: utf-8 -*-
+
+"""
+Вспомогательные функции для работы с HTML-контентом записей (TinyMCE).
+"""
+
+import re
+from html import escape
+from html.parser import HTMLParser
+
+# Теги, содержимое которых не является текстом статьи
+_SKIP_TAGS = {'script', 'style', 'template', 'noscript'}
+# Блочные теги: между ними вставляем пробел, чтобы слова не склеивались
+_BLOCK_TAGS = {
+    'p', 'div', 'br', 'li', 'ul', 'ol', 'tr', 'td', 'th', 'table',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre', 'hr',
+    'section', 'article', 'header', 'footer', 'figure', 'figcaption',
+}
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append(' ')
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def strip_html(html):
+    """Возвращает простой текст из HTML: без тегов, скриптов и лишних пробелов."""
+    if not html:
+        return ''
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return _WHITESPACE_RE.sub(' ', ''.join(parser.parts)).strip()
+
+
+def make_excerpt(text, length=300):
+    """Обрезает простой текст до length символов по границе слова."""
+    if not text or len(text) <= length:
+        return text or ''
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut.rstrip(' .,;:—-') + '…'
+
+
+# --- Очистка HTML по белому списку ---
+ALLOWED_TAGS = {
+    'p', 'div', 'span', 'br', 'hr', 'b', 'strong', 'i', 'em', 'u', 's', 'strike', 'sub', 'sup',
+    'blockquote', 'pre', 'code', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol', 'li', 'a', 'img',
+    'figure', 'figcaption', 'table', 'caption', 'thead', 'tbody', 'tfoot', 'tr', 'td', 'th',
+}
+ALLOWED_ATTRIBUTES = {
+    '*': {'class', 'title', 'style'},
+    'a': {'href', 'target', 'rel'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'td': {'colspan', 'rowspan'},
+    'th': {'colspan', 'rowspan', 'scope'},
+    'ol': {'start'},
+}
+# Свойства style, которые ставит TinyMCE (выравнивание, цвет, отступы)
+ALLOWED_STYLES = {
+    'text-align', 'color', 'background-color', 'font-weight', 'font-style', 'text-decoration',
+    'padding-left', 'margin-left', 'width', 'height', 'float', 'vertical-align',
+}
+_VOID_TAGS = {'br', 'hr', 'img'}
+# Содержимое этих тегов выбрасывается целиком, а не только разметка
+_DROP_CONTENT_TAGS = _SKIP_TAGS | {'iframe', 'object', 'embed', 'svg', 'math', 'select', 'textarea'}
+_URL_SCHEMES = {'http', 'https', 'mailto', 'tel'}
+_DATA_IMAGE_RE = re.compile(r'^data:image/(?:png|jpeg|gif|webp);base64,[a-z0-9+/=\s]+$', re.IGNORECASE)
+_UNSAFE_STYLE_RE = re.compile(r'url\s*\(|expression\s*\(|javascript:|[<>\\]', re.IGNORECASE)
+_WORD_RE = re.compile(r'\w+')
+
+
+def _safe_url(value, allow_data_image=False):
+    value = (value or '').strip()
+    # Управляющие символы внутри схемы ("java\tscript:") браузеры игнорируют
+    compact = re.sub(r'[\x00-\x20]', '', value).lower()
+    if allow_data_image and compact.startswith('data:'):
+        return value if _DATA_IMAGE_RE.match(value) else None
+    scheme, colon, _ = compact.partition(':')
+    if colon and '/' not in scheme and '?' not in scheme and '#' not in scheme and scheme not in _URL_SCHEMES:
+        return None
+    return value
+
+
+def _safe_style(value):
+    declarations = []
+    for declaration in (value or '').split(';'):
+        name, colon, style_value = declaration.partition(':')
+        name, style_value = name.strip().lower(), style_value.strip()
+        if colon and name in ALLOWED_STYLES and style_value and not _UNSAFE_STYLE_RE.search(style_value):
+            declarations.append(f'{name}: {style_value}')
+    return '; '.join(declarations) or None
+
+
+def _format_attrs(attrs):
+    return ''.join(f' {name}="{escape(value)}"' for name, value in attrs)
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self, render_image=None):
+        super().__init__(convert_charrefs=True)
+        self.render_image = render_image
+        self.out = []
+        self.text = []
+        self.images = []
+        self._open = []
+        self._drop_depth = 0
+
+    def _clean_attrs(self, tag, attrs):
+        allowed = ALLOWED_ATTRIBUTES['*'] | ALLOWED_ATTRIBUTES.get(tag, set())
+        cleaned = {}
+        for name, value in attrs:
+            name = name.lower()
+            if name not in allowed or value is None:
+                continue
+            if name in ('href', 'src'):
+                value = _safe_url(value, allow_data_image=(name == 'src'))
+            elif name == 'style':
+                value = _safe_style(value)
+            elif name in ('width', 'height', 'colspan', 'rowspan', 'start'):
+                value = value if value.strip().isdigit() else None
+            if value is not None:
+                cleaned[name] = value
+        if tag == 'a' and cleaned.get('target') == '_blank':
+            cleaned['rel'] = 'noopener noreferrer'
+        return cleaned
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _DROP_CONTENT_TAGS:
+            self._drop_depth += 1
+            return
+        if self._drop_depth:
+            return
+        if tag in _BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        cleaned = self._clean_attrs(tag, attrs)
+        if tag == 'img':
+            if not cleaned.get('src'):
+                return
+            self.images.append(cleaned['src'])
+            rendered = self.render_image(cleaned) if self.render_image else None
+            if rendered is None:
+                cleaned.setdefault('loading', 'lazy')
+                cleaned.setdefault('decoding', 'async')
+                rendered = f'<img{_format_attrs(cleaned.items())}>'
+            self.out.append(rendered)
+            return
+        self.out.append(f'<{tag}{_format_attrs(cleaned.items())}>')
+        if tag not in _VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in _DROP_CONTENT_TAGS:
+            self._drop_depth = max(self._drop_depth - 1, 0)
+        elif tag in self._open and self._open[-1] == tag:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in _DROP_CONTENT_TAGS:
+            self._drop_depth = max(self._drop_depth - 1, 0)
+            return
+        if self._drop_depth:
+            return
+        if tag in _BLOCK_TAGS:
+            self.text.append(' ')
+        if tag not in self._open:
+            return
+        # Закрываем и незакрытые вложенные теги, чтобы разметка осталась правильной
+        while self._open:
+            open_tag = self._open.pop()
+            self.out.append(f'</{open_tag}>')
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._drop_depth:
+            self.out.append(escape(data, quote=False))
+            self.text.append(data)
+
+    def close(self):
+        super().close()
+        while self._open:
+            self.out.append(f'</{self._open.pop()}>')
+
+
+class SanitizedHtml:
+    """Результат обработки HTML: безопасная разметка, простой текст и адреса изображений."""
+
+    def __init__(self, html, text, images):
+        self.html = html
+        self.text = text
+        self.images = images
+
+    @property
+    def word_count(self):
+        return len(_WORD_RE.findall(self.text))
+
+
+def sanitize_html(html, render_image=None):
+    """Очищает HTML по белому списку тегов, атрибутов и схем URL за один проход.
+
+    render_image(attrs) может вернуть свою разметку для <img> (например,
+    <picture> с уменьшенными копиями); None — вывести очищенный <img>
+    с loading="lazy".
+    """
+    parser = _Sanitizer(render_image)
+    if html:
+        parser.feed(html)
+    parser.close()
+    text = _WHITESPACE_RE.sub(' ', ''.join(parser.text)).strip()
+    return SanitizedHtml(''.join(parser.out), text, parser.images)
+# --- /Очистка HTML по белому списку ---
@@ -0,0 +1,90 @@
+# http_cache.py
+# -*- coding: utf-8 -*-
+
+"""
+Условные GET-запросы: ETag и Last-Modified.
+
+Валидаторы считаются из дешёвых данных (updated_at одной строки, версии из
+таблицы cache_version через page_cache, max(updated_at) и число строк,
+mtime каталога загрузок) до загрузки и рендеринга страницы, поэтому
+повторный запрос браузера, service worker'а или прокси получает
+304 Not Modified почти бесплатно. Всё это — состояние базы и диска, а не
+памяти процесса: любой воркер gunicorn выдаёт для одних данных один ETag.
+"""
+
+import hashlib
+import os
+from datetime import timezone
+
+from flask import current_app, request, session
+from flask_login import current_user
+
+
+def _templates_version():
+    """Отпечаток шаблонов: после обновления шаблонов старые ETag недействительны."""
+    version = current_app.extensions.get('templates_version')
+    if version is None:
+        folder = os.path.join(current_app.root_path, current_app.template_folder or 'templates')
+        latest = 0
+        for root, _dirs, files in os.walk(folder):
+            for name in files:
+                latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+        version = current_app.extensions['templates_version'] = str(latest)
+    return version
+
+
+def _viewer():
+    # Разметка зависит от пользователя (имя в боковой панели, кнопки админа)
+    return f'user:{current_user.id}' if current_user.is_authenticated else 'anon'
+
+
+def make_etag(*parts):
+    """ETag из частей, от которых зависит ответ, плюс пользователь, версия шаблонов и статики."""
+    raw = '|'.join(map(str, (*parts, _viewer(), _templates_version(),
+                             current_app.extensions.get('asset_version', ''))))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def request_etag(*parts):
+    """ETag для текущего запроса с учётом пути и отсортированных параметров."""
+    args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    return make_etag(request.path, args, *parts)
+
+
+def _utc(dt):
+    if dt is None:
+        return None
+    dt = dt.replace(microsecond=0)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def not_modified(etag, last_modified=None):
+    """Возвращает ответ 304, если у клиента актуальная копия, иначе None."""
+    if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+        return None
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since:
+        fresh = _utc(last_modified) <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+
+    response = current_app.response_class(status=304)
+    return with_validators(response, etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Добавляет ETag/Last-Modified и требует ревалидации при каждом использовании."""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    response.cache_control.no_cache = True
+    if current_user.is_authenticated:
+        response.cache_control.private = True
+    else:
+        response.cache_control.public = True
+    response.vary.add('Cookie')
+    return response
@@ -0,0 +1,250 @@
+# images.py
+# -*- coding: utf-8 -*-
+
+"""
+Фоновая обработка загруженных изображений.
+
+Оригинал сохраняется в хранилище загрузок (media_store.py), а уменьшенные копии
+нескольких ширин — в исходном формате и в WebP — создаются в пуле потоков
+и описываются строкой ImageAsset. Шаблоны выводят <picture> со srcset,
+так что на стене браузер качает копию нужной ширины вместо 16-мегабайтного
+оригинала. Пока копии не готовы (или Pillow не установлен), выводится
+обычный <img> с оригиналом.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, g
+from markupsafe import Markup, escape
+from sqlalchemy import event, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+try:
+    from PIL import Image, ImageOps
+except ImportError: # Pillow не установлен — изображения выводятся как есть
+    Image = ImageOps = None
+
+import media_store
+import page_cache
+from models import db, ImageAsset, Note
+
+logger = logging.getLogger(__name__)
+
+VARIANT_WIDTHS = (320, 640, 1024, 1600)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+DEFAULT_SIZES = '(max-width: 800px) 100vw, 800px'
+SOURCE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Формат уменьшенной копии по расширению оригинала (GIF не трогаем — анимация)
+_FALLBACK_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG'}
+_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+_executor = None
+
+
+def processing_available():
+    return Image is not None
+
+
+def _get_executor(app):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=app.config.get('IMAGE_WORKERS', 2),
+            thread_name_prefix='image-worker',
+        )
+    return _executor
+
+
+def _uploads_dir(app):
+    return os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+
+
+def schedule_processing(filename):
+    """Ставит обработку загруженного файла в очередь. Возвращает Future или None.
+
+    Если сессия ещё сохраняет данные (идёт транзакция или есть несохранённые
+    объекты — например, запись с этим изображением), задача ставится только
+    после завершения транзакции: иначе поток может закончить раньше коммита и
+    не найти записи, которым нужна новая разметка. Тогда возвращается None.
+    """
+    if not processing_available() or not filename:
+        return None
+    app = current_app._get_current_object()
+    session = db.session()
+    if session.in_transaction() or session.new or session.dirty or session.deleted:
+        session.info.setdefault('images_pending', {})[filename] = app
+        return None
+    return _get_executor(app).submit(_process_in_context, app, filename)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _schedule_after_transaction(session, transaction):
+    # Только внешняя транзакция; после отката файл тоже обрабатываем — он уже в хранилище
+    if transaction.parent is not None:
+        return
+    pending = session.info.pop('images_pending', None)
+    for filename, app in (pending or {}).items():
+        _get_executor(app).submit(_process_in_context, app, filename)
+
+
+def _process_in_context(app, filename):
+    with app.app_context():
+        try:
+            return process_image(filename)
+        except Exception:
+            logger.exception('Ошибка обработки изображения %s', filename)
+            db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def _save_variant(image, app, stem, width, image_format):
+    name = f'{media_store.VARIANTS_DIR}/{stem}.w{width}.{_EXTENSIONS[image_format]}'
+    path = os.path.join(_uploads_dir(app), name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if image_format == 'WEBP':
+        image.save(path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    elif image_format == 'JPEG':
+        image.convert('RGB').save(path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, image_format, optimize=True)
+    return {'width': width, 'format': image_format.lower(), 'filename': name}
+
+
+def _build_variants(app, filename):
+    """Создаёт копии на диске. Возвращает (ширина, высота, список копий)."""
+    source = os.path.join(_uploads_dir(app), filename)
+    stem, ext = os.path.splitext(filename)
+    fallback_format = _FALLBACK_FORMATS.get(ext.lstrip('.').lower())
+
+    with Image.open(source) as original:
+        if fallback_format is None:
+            return original.width, original.height, []
+        # Учитываем ориентацию из EXIF (фото с телефона)
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        width, height = image.size
+
+        variants = []
+        for target in [w for w in VARIANT_WIDTHS if w < width]:
+            resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+            variants.append(_save_variant(resized, app, stem, target, 'WEBP'))
+            variants.append(_save_variant(resized, app, stem, target, fallback_format))
+        # WebP полной ширины: оригинал в srcset остаётся только запасным вариантом
+        variants.append(_save_variant(image, app, stem, width, 'WEBP'))
+    return width, height, variants
+
+
+def process_image(filename):
+    """Создаёт уменьшенные копии и сохраняет метаданные. Вызывается в контексте приложения."""
+    app = current_app._get_current_object()
+    asset = ImageAsset.query.filter_by(filename=filename).first()
+    if asset is None:
+        asset = ImageAsset(filename=filename)
+        db.session.add(asset)
+        try:
+            db.session.flush()
+        except IntegrityError: # Этот же файл уже обрабатывается другим потоком
+            db.session.rollback()
+            return None
+
+    try:
+        asset.width, asset.height, asset.variants = _build_variants(app, filename)
+        asset.status = 'ready'
+    except (OSError, ValueError) as error:
+        logger.warning('Не удалось обработать %s: %s', filename, error)
+        asset.status = 'failed'
+        asset.variants = []
+
+    # Разметка карточек и статей с этим изображением изменилась
+    note_ids = db.session.scalars(
+        db.select(Note.id).where(or_(Note.image_filename == filename, Note.preview_image == filename,
+                                     Note.lead_image == filename))
+    ).all()
+    # В сохранённом HTML статей <img> заменяется на <picture> с копиями
+    import note_content # Здесь, а не в начале модуля: note_content сам импортирует images
+    note_ids += note_content.refresh_rendered_images(filename)
+    page_cache.mark_changed(db.session, page_cache.LISTS, *map(page_cache.note_version_name, note_ids))
+    db.session.commit()
+    return asset
+
+
+def process_pending():
+    """Синхронно обрабатывает загрузки без готовых копий (CLI). Возвращает число файлов."""
+    done = set(db.session.scalars(db.select(ImageAsset.filename).where(ImageAsset.status == 'ready')))
+    total = 0
+    for filename in sorted(media_store.iter_uploads()):
+        if filename in done:
+            continue
+        if os.path.splitext(filename)[1].lstrip('.').lower() not in SOURCE_EXTENSIONS:
+            continue
+        process_image(filename)
+        total += 1
+    return total
+
+
+# --- Разметка для шаблонов ---
+def _asset_cache():
+    if 'image_assets' not in g:
+        g.image_assets = {}
+    return g.image_assets
+
+
+def prefetch_assets(notes):
+    """Загружает ImageAsset для изображений списка записей одним запросом."""
+    assets = _asset_cache()
+    wanted = {name for note in notes for name in (note.image_filename, note.preview_image, note.lead_image)
+              if name} - assets.keys()
+    if not wanted:
+        return
+    found = {asset.filename: asset for asset in ImageAsset.query.filter(ImageAsset.filename.in_(wanted))}
+    for name in wanted:
+        assets[name] = found.get(name)
+
+
+def get_asset(filename):
+    assets = _asset_cache()
+    if filename not in assets:
+        assets[filename] = ImageAsset.query.filter_by(filename=filename).first()
+    return assets[filename]
+
+
+def image_state(*filenames):
+    """Строка для ключа фрагментного кэша: меняется, когда копии становятся готовы."""
+    states = []
+    for filename in filenames:
+        asset = get_asset(filename) if filename else None
+        states.append(asset.status if asset else '-')
+    return ','.join(states)
+
+
+def _srcset(entries):
+    return ', '.join(f"{media_store.media_url(name)} {width}w" for width, name in entries)
+
+
+def responsive_image(filename, alt='', sizes=DEFAULT_SIZES, css_class=None):
+    """<picture> с WebP и уменьшенными копиями; до обработки — обычный <img>."""
+    src = media_store.media_url(filename)
+    class_attr = f' class="{escape(css_class)}"' if css_class else ''
+    asset = get_asset(filename)
+    if asset is None or asset.status != 'ready' or not asset.variants:
+        return Markup(f'<img src="{escape(src)}" alt="{escape(alt)}"{class_attr} loading="lazy" style="max-width: 100%;">')
+
+    webp = [(v['width'], v['filename']) for v in asset.variants if v['format'] == 'webp']
+    fallback = [(v['width'], v['filename']) for v in asset.variants if v['format'] != 'webp']
+    fallback_srcset = _srcset(fallback)
+    fallback_srcset = f'{fallback_srcset}, {src} {asset.width}w' if fallback_srcset else f'{src} {asset.width}w'
+    return Markup(
+        '<picture>'
+        f'<source type="image/webp" srcset="{escape(_srcset(webp))}" sizes="{escape(sizes)}">'
+        f'<img src="{escape(src)}" srcset="{escape(fallback_srcset)}" sizes="{escape(sizes)}"'
+        f' width="{asset.width}" height="{asset.height}" alt="{escape(alt)}"{class_attr}'
+        ' loading="lazy" decoding="async" style="max-width: 100%; height: auto;">'
+        '</picture>'
+    )
+# --- /Разметка для шаблонов ---
@@ -0,0 +1,349 @@
+# instrumentation.py
+# -*- coding: utf-8 -*-
+
+"""
+Измерения запросов (включаются настройкой INSTRUMENTATION_ENABLED).
+
+Для каждого запроса считаются: полное время, число и время SQL-запросов,
+время рендеринга шаблонов, попадания и промахи кэша (Flask-Caching). Итог
+отдаётся заголовком Server-Timing (виден во вкладке Network DevTools) и
+накапливается в счётчиках процесса, которые читает /metrics в текстовом
+формате Prometheus. Счётчики у каждого воркера gunicorn свои.
+
+Один и тот же SQL, выполненный за запрос N_PLUS_ONE_THRESHOLD раз и
+больше, — признак N+1 (ленивая загрузка в цикле): пишется предупреждение
+в лог и счётчик notebook_n_plus_one_total.
+
+При PROFILE_SLOW_REQUESTS фоновый поток раз в PROFILE_INTERVAL снимает
+стеки потоков, обрабатывающих запросы. Стеки медленных запросов (дольше
+SLOW_REQUEST_SECONDS) сохраняются в instance/profiles/ в формате
+collapsed stacks — его открывают flamegraph.pl и speedscope.
+"""
+
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from flask import Response, before_render_template, current_app, g, has_request_context, request, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 5
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROFILE_INTERVAL = 0.005 # Секунды между снимками стеков
+PROFILE_MAX_DEPTH = 64
+PROFILE_KEEP_FILES = 50
+
+
+class RequestStats:
+    """Измерения одного запроса (хранятся в g)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.template_started = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def repeated_statements(self):
+        return [(statement, count) for statement, count in self.statements.items() if count >= N_PLUS_ONE_THRESHOLD]
+
+
+def _current_stats():
+    return g.get('request_stats') if has_request_context() else None
+
+
+# --- Счётчики процесса ---
+class MetricsRegistry:
+    """Счётчики и гистограммы в памяти процесса, вывод в формате Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(float) # (имя, метки) -> значение
+        self.histograms = {} # (имя, метки) -> [счётчики корзин, сумма, количество]
+        self.help = {}
+
+    def inc(self, name, labels=(), value=1.0):
+        with self._lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self.histograms.setdefault((name, labels), [[0] * len(DURATION_BUCKETS), 0.0, 0])
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def describe(self, name, text, metric_type):
+        self.help[name] = (text, metric_type)
+
+    def render(self):
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items())
+        lines = []
+        described = set()
+
+        def header(name):
+            if name in self.help and name not in described:
+                text, metric_type = self.help[name]
+                lines.append(f'# HELP {name} {text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                described.add(name)
+
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f'{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), (buckets, total, count) in histograms:
+            header(name)
+            for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", f"{bound:g}"),))} {bucket_count}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+
+metrics = MetricsRegistry()
+metrics.describe('notebook_requests_total', 'HTTP-запросы по маршруту, методу и статусу.', 'counter')
+metrics.describe('notebook_request_duration_seconds', 'Время обработки запроса.', 'histogram')
+metrics.describe('notebook_db_queries_total', 'SQL-запросы по маршруту.', 'counter')
+metrics.describe('notebook_db_query_seconds_total', 'Суммарное время SQL-запросов по маршруту.', 'counter')
+metrics.describe('notebook_template_render_seconds_total', 'Суммарное время рендеринга шаблонов по маршруту.', 'counter')
+metrics.describe('notebook_n_plus_one_total', 'Запросы с повторяющимся SQL (признак N+1).', 'counter')
+metrics.describe('notebook_cache_requests_total', 'Обращения к Flask-Caching: hit/miss.', 'counter')
+metrics.describe('notebook_slow_requests_total', 'Запросы дольше SLOW_REQUEST_SECONDS.', 'counter')
+# --- /Счётчики процесса ---
+
+
+# --- SQL ---
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get('query_started')
+    if stats is None or not started:
+        return
+    stats.query_time += time.perf_counter() - started.pop()
+    stats.query_count += 1
+    # Параметры в тексте не подставлены, поэтому одинаковые запросы с разными id совпадают
+    stats.statements[statement] += 1
+# --- /SQL ---
+
+
+# --- Шаблоны ---
+def _before_render(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None:
+        if stats.template_depth == 0:
+            stats.template_started = time.perf_counter()
+        stats.template_depth += 1
+
+
+def _template_rendered(sender, template, context, **extra):
+    stats = _current_stats()
+    if stats is not None and stats.template_depth:
+        stats.template_depth -= 1
+        # Вложенные render_template учитываются один раз — во внешнем
+        if stats.template_depth == 0:
+            stats.template_time += time.perf_counter() - stats.template_started
+# --- /Шаблоны ---
+
+
+# --- Кэш ---
+def _count_cache(hits, misses):
+    if hits:
+        metrics.inc('notebook_cache_requests_total', (('result', 'hit'),), hits)
+    if misses:
+        metrics.inc('notebook_cache_requests_total', (('result', 'miss'),), misses)
+    stats = _current_stats()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def instrument_cache(cache):
+    """Оборачивает get/get_many объекта Flask-Caching (им пользуются и фрагменты {% cache %})."""
+    if getattr(cache, '_instrumented', False): # Объект кэша общий для всех create_app()
+        return
+    cache._instrumented = True
+    original_get, original_get_many = cache.get, cache.get_many
+
+    def get(*args, **kwargs):
+        value = original_get(*args, **kwargs)
+        _count_cache(value is not None, value is None)
+        return value
+
+    def get_many(*args, **kwargs):
+        values = original_get_many(*args, **kwargs)
+        hits = sum(value is not None for value in values)
+        _count_cache(hits, len(values) - hits)
+        return values
+
+    cache.get, cache.get_many = get, get_many
+# --- /Кэш ---
+
+
+# --- Профилировщик медленных запросов ---
+class SamplingProfiler:
+    """Фоновый поток, который периодически снимает стеки зарегистрированных потоков."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self._samples = {} # id потока -> Counter стеков
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        with self._lock:
+            self._samples[thread_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+                self._thread.start()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._samples.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse_stack(frame)] += 1
+
+
+def _collapse_stack(frame):
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+profiler = SamplingProfiler()
+
+
+def _save_profile(samples, endpoint, duration):
+    directory = os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = f'{datetime.utcnow():%Y%m%d-%H%M%S-%f}-{endpoint or "unknown"}-{duration * 1000:.0f}ms.folded'
+    path = os.path.join(directory, name.replace('/', '_'))
+    with open(path, 'w', encoding='utf-8') as out:
+        for stack, count in samples.most_common():
+            out.write(f'{stack} {count}\n')
+    # Храним только последние профили
+    files = sorted(os.listdir(directory))
+    for old in files[:-PROFILE_KEEP_FILES]:
+        os.remove(os.path.join(directory, old))
+    return path
+# --- /Профилировщик медленных запросов ---
+
+
+# --- Обработчики запроса ---
+def _start_request():
+    g.request_stats = RequestStats()
+    if current_app.config['PROFILE_SLOW_REQUESTS']:
+        profiler.start(threading.get_ident())
+
+
+def _finish_request(response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return response
+    duration = time.perf_counter() - stats.started
+    samples = profiler.stop(threading.get_ident()) if current_app.config['PROFILE_SLOW_REQUESTS'] else None
+    endpoint = request.endpoint or 'unknown'
+    labels = (('endpoint', endpoint),)
+
+    metrics.inc('notebook_requests_total', labels + (('method', request.method), ('status', response.status_code)))
+    metrics.observe('notebook_request_duration_seconds', labels, duration)
+    metrics.inc('notebook_db_queries_total', labels, stats.query_count)
+    metrics.inc('notebook_db_query_seconds_total', labels, stats.query_time)
+    metrics.inc('notebook_template_render_seconds_total', labels, stats.template_time)
+
+    repeated = stats.repeated_statements()
+    if repeated:
+        metrics.inc('notebook_n_plus_one_total', labels)
+        for statement, count in repeated:
+            logger.warning('Возможный N+1 в %s: %d раз %s', endpoint, count, ' '.join(statement.split())[:300])
+
+    if duration >= current_app.config['SLOW_REQUEST_SECONDS']:
+        metrics.inc('notebook_slow_requests_total', labels)
+        if samples:
+            path = _save_profile(samples, endpoint, duration)
+            logger.warning('Медленный запрос %s %s: %.0f мс, профиль: %s', request.method, request.path, duration * 1000, path)
+
+    response.headers.add('Server-Timing', ', '.join((
+        f'app;dur={duration * 1000:.1f}',
+        f'db;dur={stats.query_time * 1000:.1f};desc="{stats.query_count} SQL"',
+        f'tpl;dur={stats.template_time * 1000:.1f}',
+        f'cache;desc="hit {stats.cache_hits}, miss {stats.cache_misses}"',
+    )))
+    return response
+
+
+def _discard_samples(error=None):
+    # Запрос завершился без after_request — поток больше не профилируем
+    if current_app.config['PROFILE_SLOW_REQUESTS']:
+        profiler.stop(threading.get_ident())
+
+
+def _metrics_allowed():
+    # Адрес клиента не проверяем: за обратным прокси каждый запрос приходит с 127.0.0.1
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode()):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+
+def metrics_view():
+    if not _metrics_allowed():
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    response = Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+    response.cache_control.no_store = True
+    return response
+# --- /Обработчики запроса ---
+
+
+def init_app(app, engine, cache):
+    """Подключает измерения, если включены настройкой INSTRUMENTATION_ENABLED."""
+    if not app.config.get('INSTRUMENTATION_ENABLED'):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_template_rendered, app)
+    instrument_cache(cache)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_discard_samples)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,210 @@
+# media_store.py
+# -*- coding: utf-8 -*-
+
+"""
+Хранилище загрузок с адресацией по содержимому.
+
+Файл хешируется (SHA-256) прямо во время записи загрузки на диск и
+сохраняется как uploads/ab/cd/<sha256>.<ext>. Одинаковые файлы хранятся
+один раз, разные файлы с одним именем больше не затирают друг друга, а
+содержимое по такому URL никогда не меняется — его можно отдавать с
+Cache-Control: immutable. Ссылки на файлы считаются по записям (Note), и
+файлы без ссылок удаляются командой gc-uploads.
+
+Старые загрузки с "плоскими" именами продолжают работать как раньше.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import Counter
+from urllib.parse import unquote, urlsplit
+
+from flask import current_app, url_for
+
+from models import db, ImageAsset, Note
+
+HASH_CHUNK_SIZE = 64 * 1024
+INCOMING_DIR = '.incoming' # Временные файлы незавершённых загрузок
+VARIANTS_DIR = 'variants' # Уменьшенные копии (images.py)
+# Файлы без ссылок удаляются не сразу: картинку, вставленную в редактор,
+# могут ещё не сохранить в записи
+ORPHAN_GRACE_SECONDS = 24 * 3600
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_HASHED_NAME_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+_HASHED_VARIANT_RE = re.compile(r'^variants/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.w\d+\.[a-z0-9]+$')
+# Ссылки на загрузки в HTML записей (TinyMCE вставляет URL из /upload_image и /uploads)
+_UPLOAD_URL_RE = re.compile(r'/(?:static/uploads|media)/([^"\'\s?#)<>]+)')
+# Сигнатуры (первые байты) принимаемых форматов изображений -> расширение файла
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SIGNATURE_LENGTH = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+def uploads_dir():
+    return os.path.join(current_app.root_path, current_app.config['UPLOAD_FOLDER'])
+
+
+def is_content_addressed(name):
+    """True для файлов хранилища и их копий: содержимое по имени не меняется."""
+    return bool(_HASHED_NAME_RE.match(name) or _HASHED_VARIANT_RE.match(name))
+
+
+def media_url(name):
+    return url_for('media', filename=name)
+
+
+def upload_name_from_url(url):
+    """Имя загрузки по относительному URL /media/<имя> или /static/uploads/<имя>; иначе None."""
+    parts = urlsplit(url or '')
+    if parts.scheme or parts.netloc:
+        return None
+    match = _UPLOAD_URL_RE.fullmatch(parts.path)
+    return unquote(match.group(1)) if match else None
+
+
+def detect_image_type(header):
+    """Расширение по первым байтам файла (png, jpg, gif) или None."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return ext
+    return None
+
+
+def store_upload(file):
+    """Сохраняет FileStorage по хешу содержимого.
+
+    Возвращает (имя относительно UPLOAD_FOLDER, True если файл новый).
+    """
+    root = uploads_dir()
+    incoming = os.path.join(root, INCOMING_DIR)
+    os.makedirs(incoming, exist_ok=True)
+    ext = file.filename.rsplit('.', 1)[1].lower()
+
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=incoming)
+    try:
+        # Хешируем по мере записи: файл читается из запроса один раз
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(HASH_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        return _commit_incoming(root, tmp_path, digest.hexdigest(), ext)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def store_file(path, ext):
+    """Переносит готовый файл из INCOMING_DIR в хранилище (загрузка частями, chunked_upload.py).
+
+    Файл хешируется одним проходом и перемещается без копирования.
+    Возвращает то же, что store_upload().
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return _commit_incoming(uploads_dir(), path, digest.hexdigest(), ext)
+
+
+def _commit_incoming(root, tmp_path, hex_digest, ext):
+    name = f'{hex_digest[:2]}/{hex_digest[2:4]}/{hex_digest}.{ext}'
+    target = os.path.join(root, name)
+    if os.path.exists(target):
+        try:
+            # Повторная загрузка: отсчёт срока сборки мусора (collect_garbage) начинается заново,
+            # иначе давний файл без ссылок удалят раньше, чем запись с ним сохранят
+            os.utime(target)
+        except FileNotFoundError:
+            pass # Файл только что удалила сборка мусора — сохраняем загруженный
+        else:
+            os.remove(tmp_path)
+            return name, False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Временный файл в том же каталоге хранилища: перенос атомарный
+    os.replace(tmp_path, target)
+    # mtime корня — версия списка изображений (ETag /api/images)
+    os.utime(root)
+    return name, True
+
+
+def iter_uploads():
+    """Имена всех оригиналов (старых и из хранилища) относительно UPLOAD_FOLDER."""
+    root = uploads_dir()
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == root:
+            dirnames[:] = [d for d in dirnames if d not in (INCOMING_DIR, VARIANTS_DIR)]
+        for filename in filenames:
+            yield os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/')
+
+
+def reference_counts(user_id=None):
+    """Число ссылок на каждый файл из записей: поля изображений и <img> в тексте.
+
+    user_id — только записи этого владельца (выгрузка одного пользователя).
+    """
+    counts = Counter()
+    stmt = db.select(Note.image_filename, Note.preview_image, Note.content, Note.full_content)
+    if user_id is not None:
+        stmt = stmt.where(Note.user_id == user_id)
+    rows = db.session.execute(stmt.execution_options(yield_per=500))
+    for image_filename, preview_image, content, full_content in rows:
+        for name in (image_filename, preview_image):
+            if name:
+                counts[name] += 1
+        for text in (content, full_content):
+            if text:
+                counts.update(_UPLOAD_URL_RE.findall(text))
+    return counts
+
+
+def collect_garbage(dry_run=False, grace_seconds=ORPHAN_GRACE_SECONDS):
+    """Удаляет файлы хранилища без ссылок (и их копии). Возвращает список имён.
+
+    Старые файлы с "плоскими" именами не трогаются.
+    """
+    root = uploads_dir()
+    counts = reference_counts()
+    cutoff = time.time() - grace_seconds
+    removed = []
+    for name in iter_uploads():
+        path = os.path.join(root, name)
+        if not is_content_addressed(name) or counts[name] or os.path.getmtime(path) > cutoff:
+            continue
+        removed.append(name)
+        if dry_run:
+            continue
+        asset = ImageAsset.query.filter_by(filename=name).first()
+        if asset is not None:
+            for variant in asset.variants or []:
+                variant_path = os.path.join(root, variant['filename'])
+                if os.path.exists(variant_path):
+                    os.remove(variant_path)
+            db.session.delete(asset)
+        os.remove(path)
+
+    # Обрывки прерванных загрузок
+    incoming = os.path.join(root, INCOMING_DIR)
+    if not dry_run and os.path.isdir(incoming):
+        for filename in os.listdir(incoming):
+            path = os.path.join(incoming, filename)
+            if os.path.getmtime(path) <= cutoff:
+                os.remove(path)
+
+    if removed and not dry_run:
+        db.session.commit()
+        os.utime(root)
+    return removed
@@ -38,7 +38,16 @@ class Note(db.Model):
     background_color = db.Column(db.String(20), default='white')
     summary = db.Column(db.Text, nullable=True) # Краткое описание статьи
     preview_image = db.Column(db.String(200), nullable=True) # Изображение превью статьи
+    # Устаревшее поле: категории хранятся в таблице note_categories.
+    # Оставлено только для переноса старых данных (migrate_legacy_category_ids).
     category_ids = db.Column(db.String(200), nullable=True)
+    # Простой текст для карточек (без HTML), считается при сохранении — см. note_content.py
+    excerpt = db.Column(db.Text, nullable=True)
+    # Очищенный HTML для показа (без скриптов, <img> с lazy-загрузкой и копиями) — см. note_content.py
+    rendered_html = db.Column(db.Text, nullable=True)
+    word_count = db.Column(db.Integer, nullable=True)
+    reading_time = db.Column(db.Integer, nullable=True) # Минуты
+    lead_image = db.Column(db.String(200), nullable=True) # Первое загруженное изображение в тексте — запасное превью
     # --- Новое поле: опубликована ли запись ---
     is_published = db.Column(db.Boolean, default=False) # По умолчанию False
     # --- /Новое поле ---
@@ -49,6 +58,15 @@ class Note(db.Model):
     user = db.relationship('User', backref=db.backref('notes', lazy=True))
     # --- /Связь ---
 
+    __table_args__ = (
+        # Составные индексы под keyset-пагинацию по (updated_at, id) в /wall и /admin
+        db.Index('ix_note_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_note_published_updated_at_id', 'is_published', 'updated_at', 'id'),
+        db.Index('ix_note_user_updated_at_id', 'user_id', 'updated_at', 'id'),
+        # Опубликованные статьи (/ и /public_articles) и фильтр по типу на стене
+        db.Index('ix_note_type_published_updated_at_id', 'note_type', 'is_published', 'updated_at', 'id'),
+    )
+
     def __repr__(self):
         return f'<Note {self.title or "Без заголовка"}>'
 
@@ -64,7 +82,15 @@ class Task(db.Model):
     # --- Привязка к пользователю ---
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     # --- /Привязка ---
-    user = db.relationship('User', backref=db.backref('tasks', lazy='selectin')) # Используем selectin для задач
+    # Не selectin: иначе каждая загрузка User (например, при входе) читает все его задачи
+    user = db.relationship('User', backref=db.backref('tasks', lazy=True))
+
+    __table_args__ = (
+        # Список задач пользователя отсортирован по сроку выполнения
+        db.Index('ix_task_user_due_date', 'user_id', 'due_date'),
+        # Изменения задач пользователя для синхронизации (см. sync.py)
+        db.Index('ix_task_user_updated_at_id', 'user_id', 'updated_at', 'id'),
+    )
 
     def __repr__(self):
         status = 'Выполнена' if self.completed else 'Не выполнена'
@@ -77,12 +103,22 @@ class Event(db.Model):
     start_time = db.Column(db.DateTime, nullable=False) # Начало события
     end_time = db.Column(db.DateTime, nullable=True) # Окончание события (может быть None)
     location = db.Column(db.String(300), nullable=True) # Место проведения
+    # --- Повторение: None, 'daily', 'weekly', 'monthly', 'yearly' (см. calendar_feed.py) ---
+    recurrence = db.Column(db.String(20), nullable=True)
+    recurrence_until = db.Column(db.DateTime, nullable=True) # Последний повтор (None — бессрочно)
+    # --- /Повторение ---
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # --- Привязка к пользователю ---
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     # --- /Привязка ---
-    user = db.relationship('User', backref=db.backref('events', lazy='selectin')) # Используем selectin для событий
+    user = db.relationship('User', backref=db.backref('events', lazy=True)) # Не selectin — см. Task.user
+
+    __table_args__ = (
+        # Выборка событий пользователя в видимом окне календаря (start_time < конец окна)
+        db.Index('ix_event_user_start_time', 'user_id', 'start_time'),
+        db.Index('ix_event_user_updated_at_id', 'user_id', 'updated_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Event {self.title} ({self.start_time.strftime("%d.%m.%Y %H:%M")})>'
@@ -90,12 +126,198 @@ class Event(db.Model):
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
-    notes = db.relationship('Note', secondary='note_categories', lazy='subquery', backref=db.backref('categories', lazy=True))
+    # lazy='dynamic': список записей категории не загружается целиком вместе с категорией
+    notes = db.relationship('Note', secondary='note_categories', lazy='dynamic', backref=db.backref('categories', lazy=True))
 
     def __repr__(self):
         return f'<Category {self.name}>'
 
 note_categories = db.Table('note_categories',
     db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
-    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True)
-)
\ No newline at end of file
+    db.Column('category_id', db.Integer, db.ForeignKey('category.id'), primary_key=True),
+    # Первичный ключ (note_id, category_id) обслуживает "категории записи",
+    # обратный индекс — выборку записей категории
+    db.Index('ix_note_categories_category_note', 'category_id', 'note_id')
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), unique=True, nullable=False) # Нормализованное имя (без пробелов, в нижнем регистре)
+    # Индекс тегов ведётся автоматически по строке Note.tags (см. tags.py)
+    notes = db.relationship('Note', secondary='note_tag', lazy='dynamic', backref=db.backref('indexed_tags', lazy=True))
+
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
+note_tag = db.Table('note_tag',
+    db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True),
+    # Выборка записей по тегу и подсчёт облака тегов идут по (tag_id, note_id)
+    db.Index('ix_note_tag_tag_note', 'tag_id', 'note_id')
+)
+
+# Загрузки, выведенные в тексте записи (ведётся note_content.py): по имени файла
+# находятся записи, разметку которых нужно пересчитать после обработки изображения
+note_image = db.Table('note_image',
+    db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
+    db.Column('filename', db.String(200), primary_key=True),
+    db.Index('ix_note_image_filename_note', 'filename', 'note_id')
+)
+
+class ImageAsset(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(200), unique=True, nullable=False) # Оригинал в static/uploads
+    status = db.Column(db.String(20), default='pending') # 'pending', 'ready', 'failed'
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    # Уменьшенные копии: [{"width": 320, "format": "webp", "filename": "variants/x.w320.webp"}, ...]
+    variants = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ImageAsset {self.filename} ({self.status})>'
+
+class CacheVersion(db.Model):
+    """Версия данных для ключей кэша страниц и ETag (см. page_cache.py).
+
+    Хранится в базе, а не в кэше процесса: её видят все воркеры gunicorn,
+    бот и фоновые процессы, а увеличивается она в той же транзакции, что и
+    изменение данных.
+    """
+    name = db.Column(db.String(64), primary_key=True) # 'lists', 'categories', 'note:<id>'
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+class Tombstone(db.Model):
+    """Отметка об удалении записи, задачи или события для синхронизации клиентов (см. sync.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(20), nullable=False) # 'note', 'task', 'event'; '*' — клиентам нужна полная синхронизация
+    entity_id = db.Column(db.Integer, nullable=True)
+    user_id = db.Column(db.Integer, nullable=True) # Владелец удалённого объекта
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_tombstone_entity_entity_id', 'entity', 'entity_id'),
+        db.Index('ix_tombstone_deleted_at', 'deleted_at'),
+        # id — курсор клиентов: без AUTOINCREMENT SQLite повторно выдаёт id удалённой последней отметки
+        {'sqlite_autoincrement': True},
+    )
+
+    def __repr__(self):
+        return f'<Tombstone {self.entity} {self.entity_id}>'
+
+class Reminder(db.Model):
+    """Напоминание о сроке задачи или начале события (см. reminders.py)."""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), nullable=False) # 'task' или 'event'
+    entity_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    occurrence = db.Column(db.DateTime, nullable=False) # Срок задачи или начало (вхождения) события
+    due_at = db.Column(db.DateTime, nullable=False) # Когда отправить (при повторной попытке сдвигается)
+    # 'pending', 'sending', 'sent', 'failed', 'missed', 'cancelled'
+    status = db.Column(db.String(10), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    error = db.Column(db.String(300), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Одно напоминание на срок: так одно вхождение не будет отправлено дважды
+        db.UniqueConstraint('kind', 'entity_id', 'occurrence', name='uq_reminder_kind_entity_occurrence'),
+        # Планировщик читает ожидающие напоминания по времени и изменения после последней проверки
+        db.Index('ix_reminder_status_due_at', 'status', 'due_at'),
+        db.Index('ix_reminder_updated_at', 'updated_at'),
+    )
+
+    def __repr__(self):
+        return f'<Reminder {self.kind} {self.entity_id} {self.occurrence} ({self.status})>'
+
+class PushSubscription(db.Model):
+    """Подписка браузера на web push (PushSubscription.toJSON())."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    endpoint = db.Column(db.String(500), unique=True, nullable=False)
+    p256dh = db.Column(db.String(200), nullable=False)
+    auth = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PushSubscription {self.user_id}>'
+
+def ensure_columns(engine):
+    """Добавляет в существующие таблицы колонки, объявленные в моделях позже.
+
+    db.create_all() не меняет уже созданные таблицы, поэтому новые колонки
+    добавляются через ALTER TABLE ADD COLUMN (такие колонки должны быть nullable).
+    """
+    inspector = db.inspect(engine)
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def ensure_indexes(engine):
+    """Создаёт объявленные в моделях индексы, которых ещё нет в существующей базе.
+
+    db.create_all() создаёт индексы только вместе с новыми таблицами.
+    """
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def _missing_autoincrement(conn):
+    """Таблицы с sqlite_autoincrement в модели, созданные в базе без AUTOINCREMENT."""
+    if conn.dialect.name != 'sqlite':
+        return []
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not table.dialect_options['sqlite']['autoincrement']:
+            continue
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+        ).scalar()
+        if sql is not None and 'AUTOINCREMENT' not in sql.upper():
+            missing.append(table)
+    return missing
+
+def ensure_autoincrement(engine):
+    """Пересоздаёт с AUTOINCREMENT таблицы, созданные до его объявления в модели.
+
+    ALTER TABLE не умеет менять первичный ключ, поэтому таблица копируется:
+    старая переименовывается, её индексы удаляются (имена индексов общие для
+    базы), новая создаётся по модели, строки переносятся с прежними id.
+    """
+    with engine.begin() as conn:
+        for table in _missing_autoincrement(conn):
+            old_name = f'{table.name}__old'
+            conn.execute(db.text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+            for index in table.indexes:
+                conn.execute(db.text(f'DROP INDEX IF EXISTS {index.name}'))
+            table.create(bind=conn)
+            columns = ', '.join(column.name for column in table.columns)
+            conn.execute(db.text(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {old_name}'))
+            conn.execute(db.text(f'DROP TABLE {old_name}'))
+
+def schema_changes(engine):
+    """Чего не хватает в базе по сравнению с моделями: таблицы, колонки, индексы (только чтение)."""
+    inspector = db.inspect(engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            missing.append(f'таблица {table.name}')
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(f'колонка {table.name}.{column.name}' for column in table.columns if column.name not in existing)
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(f'индекс {index.name}' for index in table.indexes if index.name not in indexes)
+    with engine.connect() as conn:
+        missing.extend(f'AUTOINCREMENT у таблицы {table.name}' for table in _missing_autoincrement(conn))
+    return missing
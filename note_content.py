@@ -0,0 +1,191 @@
+# note_content.py
+# -*- coding: utf-8 -*-
+
+"""
+Поля записи, вычисляемые при сохранении.
+
+HTML из TinyMCE один раз, перед flush, очищается по белому списку
+(html_utils.sanitize_html) и сохраняется в Note.rendered_html вместе с
+простым текстом для карточек (excerpt), числом слов, временем чтения и
+первым загруженным изображением (lead_image — запасное превью). Страницы
+только читают эти колонки и не разбирают HTML на каждом запросе.
+
+Изображения из загрузок в rendered_html выводятся как <picture> с
+уменьшенными копиями (images.py), а пока копии не готовы — как <img>
+с loading="lazy"; после обработки изображения разметка пересчитывается
+(refresh_rendered_images). Какие загрузки выведены в тексте записи, хранится
+в таблице note_image — по ней находятся записи для пересчёта.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime
+
+from flask import current_app, has_request_context
+from markupsafe import escape
+from sqlalchemy import bindparam, event
+from sqlalchemy.orm import Session
+
+import images
+import media_store
+from html_utils import make_excerpt, sanitize_html
+from models import db, Note, note_image
+
+EXCERPT_LENGTH = 300
+WORDS_PER_MINUTE = 200
+BACKFILL_BATCH_SIZE = 500
+# Поля, от которых зависят вычисляемые значения
+SOURCE_FIELDS = ('content', 'full_content')
+DERIVED_FIELDS = ('rendered_html', 'excerpt', 'word_count', 'reading_time', 'lead_image')
+ARTICLE_IMAGE_SIZES = '(max-width: 800px) 100vw, 800px'
+
+
+def _render_image(attrs):
+    name = media_store.upload_name_from_url(attrs.get('src'))
+    if name is None:
+        return None # Внешнее изображение: очищенный <img loading="lazy">
+    markup = images.responsive_image(name, attrs.get('alt', ''), ARTICLE_IMAGE_SIZES, attrs.get('class'))
+    if attrs.get('title'):
+        markup = markup.replace('<img ', f'<img title="{escape(attrs["title"])}" ', 1)
+    return str(markup)
+
+
+def _derive(content, full_content):
+    """Вычисляемые поля и имена загрузок, выведенных в тексте."""
+    # У статей основной текст в full_content (HTML), у заметок — в content
+    result = sanitize_html(full_content or content, _render_image)
+    words = result.word_count
+    uploads = [name for name in map(media_store.upload_name_from_url, result.images) if name]
+    fields = {
+        'rendered_html': result.html,
+        'excerpt': make_excerpt(result.text, EXCERPT_LENGTH),
+        'word_count': words,
+        'reading_time': max(1, round(words / WORDS_PER_MINUTE)) if words else 0,
+        'lead_image': uploads[0] if uploads else None,
+    }
+    return fields, set(uploads)
+
+
+def derive_fields(content, full_content):
+    """Значения вычисляемых полей по исходному тексту записи."""
+    return _derive(content, full_content)[0]
+
+
+def _sources_changed(note):
+    state = db.inspect(note)
+    return any(state.attrs[field].history.has_changes() for field in SOURCE_FIELDS)
+
+
+@event.listens_for(Session, 'before_flush')
+def _update_derived_fields(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Note) and (obj in session.new or _sources_changed(obj)):
+            fields, uploads = _derive(obj.content, obj.full_content)
+            for field, value in fields.items():
+                setattr(obj, field, value)
+            session.info.setdefault('note_images', {})[obj] = uploads
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_note_images(session, flush_context):
+    # id новых записей известны только после flush
+    uploads = session.info.pop('note_images', {})
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Note)]
+    if uploads or removed:
+        _write_note_images(session.connection(), removed, {note.id: names for note, names in uploads.items()})
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_note_images(session):
+    session.info.pop('note_images', None)
+
+
+def _write_note_images(conn, removed_ids, uploads):
+    """Заменяет строки note_image записей uploads ({id: {имя, ...}}) и удаляет строки removed_ids."""
+    stale_ids = list(removed_ids) + list(uploads)
+    for i in range(0, len(stale_ids), BACKFILL_BATCH_SIZE):
+        conn.execute(note_image.delete().where(note_image.c.note_id.in_(stale_ids[i:i + BACKFILL_BATCH_SIZE])))
+    links = [{'note_id': note_id, 'filename': name} for note_id, names in uploads.items() for name in names]
+    if links:
+        conn.execute(note_image.insert(), links)
+
+
+def _update_stmt(updated_at=None):
+    table = Note.__table__
+    # Без updated_at дата изменения записей сохраняется
+    return (
+        table.update()
+        .where(table.c.id == bindparam('note_id'))
+        .values(updated_at=updated_at or table.c.updated_at,
+                **{field: bindparam(f'new_{field}') for field in DERIVED_FIELDS})
+    )
+
+
+def _derive_rows(rows, updated_at=None):
+    """Пересчитывает и сохраняет вычисляемые поля и строки note_image для строк (id, content, full_content)."""
+    params, uploads = [], {}
+    # Вне запроса (CLI, фоновый поток) url_for для ссылок на изображения нужен контекст запроса
+    with nullcontext() if has_request_context() else current_app.test_request_context():
+        for note_id, content, full_content in rows:
+            fields, uploads[note_id] = _derive(content, full_content)
+            params.append({'note_id': note_id, **{f'new_{field}': value for field, value in fields.items()}})
+    db.session.execute(_update_stmt(updated_at), params)
+    _write_note_images(db.session.connection(), [], uploads)
+
+
+def backfill_derived_fields():
+    """Заполняет вычисляемые поля у записей, сохранённых до их появления. Возвращает число записей."""
+    total = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Note.id, Note.content, Note.full_content)
+            .where(Note.word_count.is_(None))
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        _derive_rows(rows)
+        db.session.commit()
+        total += len(rows)
+    return total
+
+
+def image_index_needs_rebuild():
+    """True, если в записях есть загрузки, а note_image ещё пуста (база до появления таблицы)."""
+    if db.session.execute(db.select(note_image.c.note_id).limit(1)).first() is not None:
+        return False
+    return db.session.execute(db.select(Note.id).where(Note.lead_image.isnot(None)).limit(1)).first() is not None
+
+
+def rebuild_image_index():
+    """Заполняет note_image по тексту всех записей пакетами. Возвращает число записей."""
+    db.session.execute(note_image.delete())
+    total = 0
+    rows = db.session.execute(
+        db.select(Note.id, Note.content, Note.full_content).execution_options(yield_per=BACKFILL_BATCH_SIZE)
+    )
+    for partition in rows.partitions():
+        uploads = {}
+        for note_id, content, full_content in partition:
+            result = sanitize_html(full_content or content)
+            uploads[note_id] = set(filter(None, map(media_store.upload_name_from_url, result.images)))
+        _write_note_images(db.session.connection(), [], uploads)
+        total += len(uploads)
+    db.session.commit()
+    return total
+
+
+def refresh_rendered_images(filename):
+    """Пересчитывает разметку записей, в тексте которых есть изображение filename.
+
+    Вызывается после обработки изображения, в той же транзакции. У пересчитанных
+    записей обновляется updated_at: меняется разметка, которую видят клиенты
+    синхронизации и фрагменты кэша. Возвращает id записей.
+    """
+    rows = db.session.execute(
+        db.select(Note.id, Note.content, Note.full_content)
+        .join(note_image, note_image.c.note_id == Note.id)
+        .where(note_image.c.filename == filename)
+    ).all()
+    if rows:
+        _derive_rows(rows, updated_at=datetime.utcnow())
+    return [note_id for note_id, _, _ in rows]
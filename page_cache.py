@@ -0,0 +1,141 @@
+# page_cache.py
+# -*- coding: utf-8 -*-
+
+"""
+Кэширование публичных страниц для анонимных посетителей.
+
+Ключ страницы = путь + отсортированные параметры запроса + "версии" данных,
+от которых страница зависит. Версии — счётчики в таблице cache_version; они
+увеличиваются в той же транзакции, что и изменение Note или Category,
+поэтому старые ключи просто перестают использоваться — без угадывания TTL.
+Счётчики в базе общие для всех воркеров gunicorn, бота и фоновых процессов,
+даже если сами страницы лежат в кэше своего процесса (SimpleCache).
+"""
+
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from extensions import cache
+from models import db, CacheVersion, Category, Note
+
+# Версия всех списков записей (/, /public_articles, /wall, /api/wall, счётчики)
+LISTS = 'lists'
+# Версия названий категорий (выводятся на страницах статей)
+CATEGORIES = 'categories'
+# Заголовки, которые сохраняются в кэше вместе с телом страницы
+_STORED_HEADERS = {'ETag', 'Last-Modified', 'Cache-Control', 'Vary'}
+
+
+def note_version_name(note_id):
+    return f'note:{note_id}'
+
+
+def get_versions(names):
+    """Текущие версии (0 — данные ещё не менялись). За запрос читаются из базы один раз."""
+    known = g.setdefault('cache_versions', {})
+    missing = [name for name in names if name not in known]
+    if missing:
+        known.update(dict.fromkeys(missing, 0))
+        known.update(db.session.execute(
+            db.select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.in_(missing))
+        ).all())
+    return [known[name] for name in names]
+
+
+def _bump_stmt(names):
+    return insert(CacheVersion).values([{'name': name, 'version': 1} for name in sorted(names)]) \
+        .on_conflict_do_update(index_elements=[CacheVersion.name], set_={'version': CacheVersion.version + 1})
+
+
+def _forget(names):
+    # Версии, прочитанные в этом запросе до изменения, больше не актуальны
+    known = g.get('cache_versions') if g else None
+    if known:
+        for name in names:
+            known.pop(name, None)
+
+
+def versioned_key(prefix, names, *parts):
+    raw = '|'.join([prefix, *map(str, get_versions(names)), *map(str, parts)])
+    return f'{prefix}:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+# --- Отслеживание изменений в сессии ---
+def mark_changed(session, *names):
+    """Увеличивает версии в текущей транзакции (для bulk-запросов мимо ORM)."""
+    if names:
+        session.execute(_bump_stmt(set(names)))
+        _forget(names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_changed(session, flush_context):
+    names = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Note):
+            # Записи без id (ещё не сохранённые) затрагивают только списки
+            names.update([LISTS] if obj.id is None else [LISTS, note_version_name(obj.id)])
+        elif isinstance(obj, Category):
+            names.update((LISTS, CATEGORIES))
+    if names:
+        # Тем же соединением: версия меняется в той же транзакции, что и данные
+        session.connection().execute(_bump_stmt(names))
+        _forget(names)
+# --- /Отслеживание изменений в сессии ---
+
+
+def _request_cache_key(names):
+    args = sorted(request.args.items(multi=True))
+    path = request.path + ('?' + urlencode(args) if args else '')
+    # Страницы ссылаются на статику по URL с отпечатками (assets.py)
+    return versioned_key('page', names, path, current_app.extensions.get('asset_version', ''))
+
+
+def _cacheable_request():
+    # Кэшируем только анонимные GET-запросы без flash-сообщений в сессии
+    return (
+        current_app.config.get('PAGE_CACHE_ENABLED', True)
+        and request.method == 'GET'
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+    )
+
+
+def cached_page(versions):
+    """Декоратор маршрута: кэширует ответ для анонимных посетителей.
+
+    versions — функция от аргументов маршрута, возвращающая имена версий,
+    от которых зависит страница, например lambda id: [note_version_name(id)].
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _cacheable_request():
+                return view(*args, **kwargs)
+
+            key = _request_cache_key(versions(*args, **kwargs))
+            cached = cache.get(key)
+            if isinstance(cached, tuple) and len(cached) == 3:
+                body, mimetype, headers = cached
+                response = current_app.response_class(body, mimetype=mimetype, headers=headers)
+                response.headers['X-Cache'] = 'HIT'
+                # Валидаторы (ETag/Last-Modified) сохранены вместе с телом ответа
+                return response.make_conditional(request)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                headers = [(name, value) for name, value in response.headers
+                           if name in _STORED_HEADERS]
+                cache.set(key, (response.get_data(), response.mimetype, headers),
+                          timeout=current_app.config.get('PAGE_CACHE_TIMEOUT'))
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+# pagination.py
+# -*- coding: utf-8 -*-
+
+"""
+Курсорная (keyset) пагинация списков записей.
+
+Вместо OFFSET n*10 и COUNT(*) на каждой странице следующая страница
+выбирается условием (updated_at, id) < (последняя запись предыдущей страницы)
+по составному индексу. Курсор непрозрачен для клиента: это base64 от JSON.
+"""
+
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import Note
+
+
+class KeysetPage:
+    """Страница результатов: записи, курсор текущей и следующей страницы."""
+
+    def __init__(self, items, cursor=None, next_cursor=None, total=None):
+        self.items = items
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Возвращает словарь курсора или None, если курсор пуст или повреждён."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def paginate_notes(query, cursor=None, per_page=10, ranked=False):
+    """Возвращает KeysetPage для запроса по Note.
+
+    Обычные списки сортируются по (updated_at, id) по убыванию и листаются по
+    ключу. Результаты полнотекстового поиска (ranked=True) упорядочены по
+    релевантности, которую нельзя использовать как ключ, поэтому для них
+    курсор хранит смещение — такие выборки и так невелики.
+    """
+    payload = decode_cursor(cursor) or {}
+
+    if ranked:
+        try:
+            offset = max(int(payload.get('o', 0)), 0)
+        except (TypeError, ValueError):
+            offset = 0
+        rows = query.offset(offset).limit(per_page + 1).all()
+        next_cursor = encode_cursor({'o': offset + per_page}) if len(rows) > per_page else None
+        return KeysetPage(rows[:per_page], cursor, next_cursor)
+
+    query = query.order_by(None).order_by(Note.updated_at.desc(), Note.id.desc())
+    after = _parse_position(payload)
+    if after is not None:
+        query = query.filter(tuple_(Note.updated_at, Note.id) < after)
+
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page and items:
+        last = items[-1]
+        next_cursor = encode_cursor({'u': last.updated_at.isoformat(), 'i': last.id})
+    return KeysetPage(items, cursor, next_cursor)
+
+
+def _parse_position(payload):
+    try:
+        return datetime.fromisoformat(payload['u']), int(payload['i'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def paginate_by_id(query, model, cursor=None, per_page=10):
+    """KeysetPage по возрастанию id — для задач, событий и категорий в API."""
+    payload = decode_cursor(cursor) or {}
+    query = query.order_by(None).order_by(model.id.asc())
+    try:
+        query = query.filter(model.id > int(payload['i']))
+    except (KeyError, TypeError, ValueError):
+        pass
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor({'i': items[-1].id}) if len(rows) > per_page and items else None
+    return KeysetPage(items, cursor, next_cursor)
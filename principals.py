@@ -0,0 +1,119 @@
+# principals.py
+# -*- coding: utf-8 -*-
+
+"""
+Кэш пользователей для Flask-Login.
+
+user_loader вызывается на каждом запросе авторизованного пользователя, а
+маршрутам нужны только id, имя и роль. Вместо строки User из базы
+current_user — лёгкий UserPrincipal из небольшого LRU-кэша в памяти
+процесса с ограниченным временем жизни. Запись сбрасывается после коммита,
+изменившего или удалившего пользователя; в других воркерах gunicorn
+изменение роли вступает в силу не позже чем через PRINCIPAL_TTL секунд.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User
+
+PRINCIPAL_TTL = 60 # Секунды
+PRINCIPAL_CACHE_SIZE = 256
+
+
+class UserPrincipal(UserMixin):
+    """Данные пользователя, нужные маршрутам и шаблонам (без сессии БД)."""
+
+    def __init__(self, id, username, is_admin, telegram_id=None):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+        self.telegram_id = telegram_id
+
+    def __repr__(self):
+        return f'<UserPrincipal {self.username} (Admin: {self.is_admin})>'
+
+
+class PrincipalCache:
+    """Потокобезопасный LRU-кэш с временем жизни записей."""
+
+    def __init__(self, maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None:
+                return None
+            expires, principal = item
+            if expires < time.monotonic():
+                del self._items[user_id]
+                return None
+            self._items.move_to_end(user_id)
+            return principal
+
+    def set(self, user_id, principal):
+        with self._lock:
+            self._items[user_id] = (time.monotonic() + self.ttl, principal)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+def load_principal(user_id):
+    """user_loader: пользователь из кэша, при промахе — один запрос к базе."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        row = db.session.execute(
+            db.select(User.id, User.username, User.is_admin, User.telegram_id).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        principal = UserPrincipal(*row)
+        principal_cache.set(user_id, principal)
+    return principal
+
+
+# --- Сброс кэша при изменении пользователей ---
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('principals_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_principals(session):
+    changed = session.info.pop('principals_changed', None)
+    if changed:
+        principal_cache.discard(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('principals_changed', None)
+# --- /Сброс кэша при изменении пользователей ---
@@ -0,0 +1,432 @@
+# reminders.py
+# -*- coding: utf-8 -*-
+
+"""
+Напоминания о сроках задач и начале событий.
+
+Таблица reminder ведётся в той же транзакции, что и задачи/события: после
+flush для новых и изменённых Task/Event вставляется напоминание на
+ближайший срок (для событий — за EVENT_LEAD до начала вхождения), старые
+ожидающие отменяются. Поэтому create_task/edit_task/create_event/edit_event
+и API менять не нужно.
+
+Планировщик (flask --app app reminders, отдельный процесс) держит в памяти
+кучу (heapq) ожидающих напоминаний на LOAD_HORIZON вперёд, прочитанных по
+индексу (status, due_at), и спит до ближайшего. Раз в секунду он проверяет
+PRAGMA data_version — без чтения таблиц — и, только если база менялась,
+дочитывает изменённые напоминания по индексу updated_at.
+
+Доставка ровно один раз: перед отправкой напоминание атомарно переводится
+в 'sending' (UPDATE ... WHERE status = 'pending'), поэтому два планировщика
+не отправят его дважды, а после отправки — в 'sent'. Если процесс упал
+между отправкой и отметкой, при запуске такие напоминания помечаются
+'failed' и не повторяются. Пропущенные за время простоя напоминания
+(не старше CATCHUP_WINDOW) отправляются сразу после запуска, более старые
+помечаются 'missed'.
+
+Сроки задач и начала событий вводятся как местное время сервера без
+часового пояса, поэтому с ними сравнивается local_now(), а не UTC;
+служебные отметки (updated_at, sent_at) остаются в UTC, как во всех таблицах.
+
+Каналы (sinks) подключаются настройкой REMINDER_SINKS: log, telegram
+(User.telegram_id), webpush (пакет pywebpush и ключи VAPID); свои — через
+register_sink().
+"""
+
+import heapq
+import json
+import logging
+import threading
+import urllib.request
+from datetime import datetime, timedelta
+
+from flask import url_for
+from sqlalchemy import event, func, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+try:
+    from pywebpush import WebPushException, webpush
+except ImportError: # Без pywebpush канал webpush ничего не отправляет
+    webpush = WebPushException = None
+
+import calendar_feed
+from models import db, Event, PushSubscription, Reminder, Task, User
+
+logger = logging.getLogger(__name__)
+
+EVENT_LEAD = timedelta(minutes=15)
+LOAD_HORIZON = timedelta(hours=6)
+CATCHUP_WINDOW = timedelta(hours=24)
+CHANGE_CHECK_INTERVAL = 1.0 # Секунды между проверками PRAGMA data_version
+CHANGE_OVERLAP = timedelta(seconds=5) # updated_at ставится до коммита — перечитываем с запасом
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(minutes=1) # Удваивается с каждой попыткой
+OCCURRENCE_SEARCH = timedelta(days=400) # Где искать следующее вхождение повторяющегося события
+TRACKED_FIELDS = {
+    Task: ('due_date', 'completed', 'user_id'),
+    Event: ('start_time', 'end_time', 'recurrence', 'recurrence_until', 'user_id'),
+}
+KINDS = {Task: 'task', Event: 'event'}
+ENSURE_BATCH_SIZE = 500
+
+
+def local_now():
+    """Текущее местное время без пояса — в нём хранятся due_date и start_time."""
+    return datetime.now()
+
+
+# --- Ведение таблицы reminder ---
+def next_occurrence(obj, after):
+    """Ближайший срок задачи или начало вхождения события не раньше after; None — напоминать не о чем."""
+    if isinstance(obj, Task):
+        return obj.due_date if obj.due_date and not obj.completed and obj.due_date >= after else None
+    for start, _ in calendar_feed.iter_occurrences(obj, after, after + OCCURRENCE_SEARCH):
+        if start >= after:
+            return start
+    return None
+
+
+def reminder_time(kind, occurrence):
+    return occurrence - EVENT_LEAD if kind == 'event' else occurrence
+
+
+def _schedule_stmt(kind, entity_id, user_id, occurrence, updated_at):
+    """Вставка напоминания; отменённое на тот же срок снова становится ожидающим."""
+    stmt = insert(Reminder.__table__).values(
+        kind=kind, entity_id=entity_id, user_id=user_id, occurrence=occurrence,
+        due_at=reminder_time(kind, occurrence), status='pending', attempts=0, updated_at=updated_at,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=['kind', 'entity_id', 'occurrence'],
+        set_={'status': 'pending', 'due_at': stmt.excluded.due_at, 'user_id': stmt.excluded.user_id,
+              'attempts': 0, 'updated_at': updated_at},
+        where=Reminder.__table__.c.status == 'cancelled',
+    )
+
+
+def _cancel_stmt(kind, entity_id, keep_occurrence, updated_at):
+    table = Reminder.__table__
+    stmt = update(table).where(table.c.kind == kind, table.c.entity_id == entity_id, table.c.status == 'pending')
+    if keep_occurrence is not None:
+        stmt = stmt.where(table.c.occurrence != keep_occurrence)
+    return stmt.values(status='cancelled', updated_at=updated_at)
+
+
+def _tracked_changed(obj):
+    state = db.inspect(obj)
+    return any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS[type(obj)])
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_reminders(session, flush_context):
+    now, stamp = local_now(), datetime.utcnow()
+    statements = []
+    for obj in list(session.new) + list(session.dirty):
+        if type(obj) in KINDS and (obj in session.new or _tracked_changed(obj)):
+            kind = KINDS[type(obj)]
+            occurrence = next_occurrence(obj, now)
+            statements.append(_cancel_stmt(kind, obj.id, occurrence, stamp))
+            if occurrence is not None:
+                statements.append(_schedule_stmt(kind, obj.id, obj.user_id, occurrence, stamp))
+    for obj in session.deleted:
+        if type(obj) in KINDS:
+            statements.append(_cancel_stmt(KINDS[type(obj)], obj.id, None, stamp))
+    for stmt in statements:
+        session.execute(stmt)
+
+
+def _schedule_upcoming(objects, now, stamp):
+    count = 0
+    for obj in objects:
+        occurrence = next_occurrence(obj, now)
+        if occurrence is not None:
+            db.session.execute(_schedule_stmt(KINDS[type(obj)], obj.id, obj.user_id, occurrence, stamp))
+            count += 1
+    return count
+
+
+def _upcoming_tasks(now):
+    return Task.query.filter(Task.due_date >= now, or_(Task.completed.is_(False), Task.completed.is_(None)))
+
+
+def _upcoming_events(now):
+    return Event.query.filter(or_(Event.start_time >= now, Event.recurrence.isnot(None)))
+
+
+def ensure_reminders(task_ids=None, event_ids=None):
+    """Создаёт напоминания для будущих задач и событий, сохранённых мимо событий сессии.
+
+    Без аргументов — для всех (база до появления таблицы reminder); со списками id —
+    только для них (строки, вставленные импортом блокнота). Возвращает число напоминаний.
+    """
+    now, stamp = local_now(), datetime.utcnow()
+    if task_ids is None and event_ids is None:
+        count = _schedule_upcoming(list(_upcoming_tasks(now)) + list(_upcoming_events(now)), now, stamp)
+    else:
+        count = 0
+        for query, model, ids in ((_upcoming_tasks(now), Task, list(task_ids or ())),
+                                  (_upcoming_events(now), Event, list(event_ids or ()))):
+            for i in range(0, len(ids), ENSURE_BATCH_SIZE):
+                count += _schedule_upcoming(query.filter(model.id.in_(ids[i:i + ENSURE_BATCH_SIZE])), now, stamp)
+    db.session.commit()
+    return count
+# --- /Ведение таблицы reminder ---
+
+
+# --- Каналы доставки ---
+class ReminderMessage:
+    def __init__(self, title, body, url):
+        self.title = title
+        self.body = body
+        self.url = url
+
+
+class LogSink:
+    """Пишет напоминание в лог (для отладки и как запасной канал)."""
+    name = 'log'
+
+    def __init__(self, app):
+        self.app = app
+
+    def send(self, user, message):
+        logger.info('Напоминание для %s: %s — %s', user.username, message.title, message.body)
+        return True
+
+
+class TelegramSink:
+    """Сообщение от бота (telegram_bot.py) пользователю с привязанным User.telegram_id."""
+    name = 'telegram'
+    timeout = 10
+
+    def __init__(self, app):
+        self.token = app.config.get('TELEGRAM_BOT_TOKEN')
+        self.api_url = app.config.get('TELEGRAM_API_URL') or 'https://api.telegram.org/bot'
+
+    def send(self, user, message):
+        if not self.token or not user.telegram_id:
+            return False
+        payload = json.dumps({'chat_id': user.telegram_id, 'text': f'{message.title}\n{message.body}'}).encode('utf-8')
+        request = urllib.request.Request(f'{self.api_url}{self.token}/sendMessage', data=payload,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.load(response).get('ok', False)
+
+
+class WebPushSink:
+    """Web push во все браузеры пользователя (подписки из /push/subscribe)."""
+    name = 'webpush'
+
+    def __init__(self, app):
+        self.private_key = app.config.get('VAPID_PRIVATE_KEY')
+        self.claims = {'sub': f"mailto:{app.config.get('VAPID_CLAIMS_EMAIL') or 'admin@localhost'}"}
+
+    def send(self, user, message):
+        if webpush is None or not self.private_key:
+            return False
+        data = json.dumps({'title': message.title, 'body': message.body, 'url': message.url})
+        delivered = False
+        for subscription in PushSubscription.query.filter_by(user_id=user.id):
+            info = {'endpoint': subscription.endpoint, 'keys': {'p256dh': subscription.p256dh, 'auth': subscription.auth}}
+            try:
+                webpush(info, data=data, vapid_private_key=self.private_key, vapid_claims=dict(self.claims))
+                delivered = True
+            except WebPushException as error:
+                # 404/410 — браузер отозвал подписку
+                if error.response is not None and error.response.status_code in (404, 410):
+                    db.session.delete(subscription)
+                else:
+                    raise
+        return delivered
+
+
+SINKS = {'log': LogSink, 'telegram': TelegramSink, 'webpush': WebPushSink}
+
+
+def register_sink(name, factory):
+    """Добавляет канал: factory(app) -> объект с name и send(user, message) -> bool."""
+    SINKS[name] = factory
+
+
+def build_sinks(app):
+    names = app.config.get('REMINDER_SINKS') or ['log']
+    unknown = [name for name in names if name not in SINKS]
+    if unknown:
+        raise ValueError(f'Неизвестные каналы напоминаний: {", ".join(unknown)}')
+    return [SINKS[name](app) for name in names]
+# --- /Каналы доставки ---
+
+
+# --- Планировщик ---
+def _message(reminder, entity):
+    if reminder.kind == 'task':
+        return ReminderMessage(f'Срок задачи: {entity.title}',
+                               f'до {reminder.occurrence:%d.%m.%Y %H:%M}', url_for('list_tasks'))
+    location = f', {entity.location}' if entity.location else ''
+    return ReminderMessage(f'Скоро: {entity.title}',
+                           f'начало в {reminder.occurrence:%d.%m.%Y %H:%M}{location}', url_for('list_events'))
+
+
+class ReminderScheduler:
+    """Куча ожидающих напоминаний и цикл их отправки."""
+
+    def __init__(self, app, sinks=None):
+        self.app = app
+        self.sinks = sinks if sinks is not None else build_sinks(app)
+        self.heap = [] # (due_at, id)
+        self.scheduled = {} # id -> due_at; записи кучи с другим временем устарели
+        self.loaded_until = None
+        self.last_change = None
+        self.stop_event = threading.Event()
+
+    def push(self, reminder_id, due_at):
+        if self.scheduled.get(reminder_id) != due_at:
+            self.scheduled[reminder_id] = due_at
+            heapq.heappush(self.heap, (due_at, reminder_id))
+
+    def catch_up(self, now):
+        """После запуска: прерванные отправки не повторяем, слишком старые — пропущены.
+
+        Как и после отправки, для событий сразу планируется следующее вхождение:
+        иначе повторяющееся событие после долгого простоя больше не напомнит о себе.
+        """
+        table = Reminder.__table__
+        stamp = datetime.utcnow()
+        closed = table.c.kind, table.c.entity_id, table.c.occurrence
+        rows = db.session.execute(update(table).where(table.c.status == 'sending')
+                                  .values(status='failed', error='Отправка прервана перезапуском', updated_at=stamp)
+                                  .returning(*closed)).all()
+        rows += db.session.execute(update(table).where(table.c.status == 'pending', table.c.due_at < now - CATCHUP_WINDOW)
+                                   .values(status='missed', updated_at=stamp)
+                                   .returning(*closed)).all()
+        last_closed = {}
+        for kind, entity_id, occurrence in rows:
+            if kind == 'event':
+                last_closed[entity_id] = max(occurrence, last_closed.get(entity_id, occurrence))
+        if last_closed:
+            for event in Event.query.filter(Event.id.in_(last_closed)):
+                occurrence = next_occurrence(event, max(now, last_closed[event.id] + timedelta(microseconds=1)))
+                if occurrence is not None:
+                    db.session.execute(_schedule_stmt('event', event.id, event.user_id, occurrence, stamp))
+        db.session.commit()
+
+    def load_window(self, now):
+        self.loaded_until = now + LOAD_HORIZON
+        rows = db.session.execute(
+            db.select(Reminder.id, Reminder.due_at)
+            .where(Reminder.status == 'pending', Reminder.due_at <= self.loaded_until)
+        )
+        for reminder_id, due_at in rows:
+            self.push(reminder_id, due_at)
+        if self.last_change is None:
+            self.last_change = db.session.scalar(db.select(func.max(Reminder.updated_at))) or datetime.utcnow()
+        db.session.rollback() # Не держим снимок базы открытым
+
+    def apply_changes(self):
+        """Изменённые после прошлой проверки напоминания (по индексу updated_at)."""
+        rows = db.session.execute(
+            db.select(Reminder.id, Reminder.status, Reminder.due_at, Reminder.updated_at)
+            .where(Reminder.updated_at >= self.last_change - CHANGE_OVERLAP)
+        ).all()
+        db.session.rollback()
+        for reminder_id, status, due_at, updated_at in rows:
+            if status == 'pending' and due_at <= self.loaded_until:
+                self.push(reminder_id, due_at)
+            else:
+                self.scheduled.pop(reminder_id, None)
+            self.last_change = max(self.last_change, updated_at)
+
+    def dispatch_due(self, now):
+        while self.heap and self.heap[0][0] <= now:
+            due_at, reminder_id = heapq.heappop(self.heap)
+            if self.scheduled.get(reminder_id) != due_at:
+                continue
+            del self.scheduled[reminder_id]
+            try:
+                self.dispatch(reminder_id, now)
+            except Exception as error:
+                logger.exception('Ошибка отправки напоминания %s', reminder_id)
+                db.session.rollback()
+                # Не оставляем напоминание в 'sending' до перезапуска
+                table = Reminder.__table__
+                db.session.execute(update(table).where(table.c.id == reminder_id, table.c.status == 'sending')
+                                   .values(status='failed', error=str(error)[:300], updated_at=datetime.utcnow()))
+                db.session.commit()
+
+    def _claim(self, reminder_id, now):
+        table = Reminder.__table__
+        result = db.session.execute(
+            update(table).where(table.c.id == reminder_id, table.c.status == 'pending', table.c.due_at <= now)
+            .values(status='sending', attempts=table.c.attempts + 1, updated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def dispatch(self, reminder_id, now):
+        """Отправляет одно напоминание, если его ещё никто не отправил."""
+        if not self._claim(reminder_id, now):
+            return
+        reminder = db.session.get(Reminder, reminder_id)
+        model = Task if reminder.kind == 'task' else Event
+        entity = db.session.get(model, reminder.entity_id)
+        user = db.session.get(User, reminder.user_id)
+        if entity is None or user is None or (model is Task and entity.completed):
+            reminder.status = 'cancelled'
+            db.session.commit()
+            return
+
+        delivered, errors = False, []
+        message = _message(reminder, entity)
+        for sink in self.sinks:
+            try:
+                delivered = bool(sink.send(user, message)) or delivered
+            except Exception as error:
+                logger.warning('Канал %s: не удалось отправить напоминание %s: %s', sink.name, reminder_id, error)
+                errors.append(f'{sink.name}: {error}')
+        reminder.error = '; '.join(errors)[:300] or None
+        if delivered:
+            reminder.status, reminder.sent_at = 'sent', datetime.utcnow()
+        elif errors and reminder.attempts < MAX_ATTEMPTS:
+            reminder.status = 'pending'
+            reminder.due_at = now + RETRY_DELAY * 2 ** (reminder.attempts - 1)
+        else:
+            reminder.status = 'failed'
+            reminder.error = reminder.error or 'Нет канала доставки'
+        if reminder.status != 'pending' and model is Event:
+            # Следующее вхождение повторяющегося события
+            occurrence = next_occurrence(entity, reminder.occurrence + timedelta(microseconds=1))
+            if occurrence is not None:
+                db.session.execute(_schedule_stmt('event', entity.id, entity.user_id, occurrence, datetime.utcnow()))
+        db.session.commit()
+
+    def run_forever(self):
+        """Цикл планировщика; завершается по stop_event."""
+        with self.app.app_context(), self.app.test_request_context():
+            # Отдельное соединение: data_version меняется, когда базу изменило другое соединение
+            with db.engine.connect() as watcher:
+                version = self._data_version(watcher)
+                now = local_now()
+                self.catch_up(now)
+                if db.session.scalar(db.select(func.count(Reminder.id))) == 0:
+                    ensure_reminders()
+                self.load_window(now)
+                while not self.stop_event.is_set():
+                    now = local_now()
+                    self.dispatch_due(now)
+                    if now >= self.loaded_until - timedelta(minutes=1):
+                        self.load_window(now)
+                    timeout = CHANGE_CHECK_INTERVAL
+                    if self.heap:
+                        timeout = min(timeout, max((self.heap[0][0] - local_now()).total_seconds(), 0))
+                    self.stop_event.wait(timeout)
+                    current = self._data_version(watcher)
+                    if current != version:
+                        version = current
+                        self.apply_changes()
+
+    @staticmethod
+    def _data_version(connection):
+        value = connection.exec_driver_sql('PRAGMA data_version').scalar()
+        connection.rollback()
+        return value
+# --- /Планировщик ---
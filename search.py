@@ -0,0 +1,255 @@
+# search.py
+# -*- coding: utf-8 -*-
+
+"""
+Полнотекстовый поиск по записям на основе SQLite FTS5.
+
+Индекс `note_fts` хранит копию текстовых полей `Note` (HTML из `full_content`
+очищается от тегов) и синхронизируется событиями сессии SQLAlchemy.
+Если FTS5 недоступен (другая СУБД или SQLite без расширения), поиск
+откатывается к старому фильтру через LIKE.
+"""
+
+import re
+
+from flask import current_app
+from markupsafe import Markup, escape
+from sqlalchemy import bindparam, column, event, false, func, literal_column, table, text
+from sqlalchemy.orm import Session
+
+from html_utils import strip_html
+from models import db, Note
+
+FTS_TABLE = 'note_fts'
+# Порядок колонок индекса и их веса для bm25 (заголовок важнее тела)
+FTS_COLUMNS = ('title', 'summary', 'tags', 'content', 'body')
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0, 1.0)
+# Поля Note, изменение которых требует переиндексации
+INDEXED_FIELDS = ('title', 'summary', 'tags', 'content', 'full_content')
+REBUILD_BATCH_SIZE = 500
+
+# Лёгкое описание виртуальной таблицы для JOIN (не входит в db.metadata,
+# чтобы create_all() не пытался создать её как обычную таблицу)
+note_fts = table(FTS_TABLE, column('rowid'))
+
+# Маркеры подсветки: заменяются на <mark> уже после экранирования сниппета
+_MARK_OPEN, _MARK_CLOSE = '\x02', '\x03'
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_enabled():
+    return current_app.config.get('SEARCH_FTS_ENABLED', False)
+
+
+def detect_search_index():
+    """Включает FTS, если таблица индекса уже есть (только чтение — для запуска воркеров)."""
+    engine = db.engine
+    enabled = False
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            enabled = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE},
+            ).first() is not None
+    current_app.config['SEARCH_FTS_ENABLED'] = enabled
+    return enabled
+
+
+def init_search_index():
+    """Создаёт виртуальную таблицу FTS5, если её ещё нет.
+
+    Возвращает True, если таблица была создана только что (индекс пуст и его
+    нужно заполнить через rebuild_search_index()).
+    """
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        current_app.config['SEARCH_FTS_ENABLED'] = False
+        return False
+
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE},
+        ).first() is not None
+        if not exists:
+            try:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                    f"{', '.join(FTS_COLUMNS)}, "
+                    f"tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+            except Exception:
+                current_app.logger.warning('SQLite собран без FTS5, поиск будет работать через LIKE')
+                current_app.config['SEARCH_FTS_ENABLED'] = False
+                return False
+
+    current_app.config['SEARCH_FTS_ENABLED'] = True
+    return not exists
+
+
+def _index_row(note):
+    return {
+        'rowid': note.id,
+        'title': note.title or '',
+        'summary': note.summary or '',
+        'tags': note.tags or '',
+        'content': strip_html(note.content),
+        'body': strip_html(note.full_content),
+    }
+
+
+_INSERT_SQL = text(
+    f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+    f"VALUES (:rowid, {', '.join(':' + c for c in FTS_COLUMNS)})"
+)
+
+
+_DELETE_SQL = text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(
+    bindparam('ids', expanding=True)
+)
+
+
+def _delete_rows(conn, note_ids):
+    ids = list(note_ids)
+    for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+        conn.execute(_DELETE_SQL, {'ids': ids[i:i + REBUILD_BATCH_SIZE]})
+
+
+_INDEX_COLUMNS = (Note.id, Note.title, Note.summary, Note.tags, Note.content, Note.full_content)
+
+
+def _insert_rows(conn, rows):
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(_index_row(row))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            conn.execute(_INSERT_SQL, batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        conn.execute(_INSERT_SQL, batch)
+        total += len(batch)
+    return total
+
+
+def rebuild_search_index():
+    """Полностью перестраивает индекс по всем записям. Возвращает число записей."""
+    if not fts_enabled():
+        return 0
+
+    conn = db.session.connection()
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    total = _insert_rows(conn, db.session.execute(
+        db.select(*_INDEX_COLUMNS).execution_options(yield_per=REBUILD_BATCH_SIZE)
+    ))
+    db.session.commit()
+    return total
+
+
+def index_notes(note_ids):
+    """Индексирует только указанные записи (после bulk-вставки). Возвращает число записей."""
+    if not fts_enabled():
+        return 0
+
+    ids = list(note_ids)
+    conn = db.session.connection()
+    _delete_rows(conn, ids)
+    total = 0
+    for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+        total += _insert_rows(conn, db.session.execute(
+            db.select(*_INDEX_COLUMNS).where(Note.id.in_(ids[i:i + REBUILD_BATCH_SIZE]))
+        ).all())
+    db.session.commit()
+    return total
+
+
+def _needs_reindex(note):
+    state = db.inspect(note)
+    return any(state.attrs[field].history.has_changes() for field in INDEXED_FIELDS)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    # Записи, добавленные/изменённые/удалённые в этом flush, переиндексируем
+    # в той же транзакции, поэтому откат сессии откатывает и индекс.
+    changed = [obj for obj in session.new if isinstance(obj, Note)]
+    changed += [obj for obj in session.dirty if isinstance(obj, Note) and _needs_reindex(obj)]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, Note)]
+    if not changed and not removed:
+        return
+    if not fts_enabled():
+        return
+
+    conn = session.connection()
+    stale_ids = removed + [note.id for note in changed]
+    _delete_rows(conn, stale_ids)
+    if changed:
+        conn.execute(_INSERT_SQL, [_index_row(note) for note in changed])
+
+
+def build_match_query(search_query):
+    """Превращает пользовательский ввод в безопасное выражение FTS5 MATCH.
+
+    Каждое слово берётся в кавычки (операторы FTS5 во вводе не работают),
+    последнее слово ищется по префиксу — удобно для поиска при наборе.
+    """
+    tokens = _TOKEN_RE.findall(search_query or '')
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def _like_filter(query, search_query):
+    return query.filter(
+        Note.title.contains(search_query) |
+        Note.content.contains(search_query) |
+        Note.full_content.contains(search_query) |
+        Note.summary.contains(search_query)
+    )
+
+
+def filter_notes(query, search_query):
+    """Ограничивает запрос записями, найденными по search_query.
+
+    Результаты упорядочены по релевантности (bm25), а не по дате.
+    """
+    if not fts_enabled():
+        return _like_filter(query, search_query)
+
+    match = build_match_query(search_query)
+    if match is None:
+        return query.filter(false())
+
+    fts = literal_column(FTS_TABLE)
+    rank = func.bm25(fts, *FTS_WEIGHTS)
+    return (
+        query.join(note_fts, note_fts.c.rowid == Note.id)
+        .filter(fts.op('MATCH')(match))
+        .order_by(None)
+        .order_by(rank, Note.updated_at.desc())
+    )
+
+
+def search_snippets(search_query, note_ids, tokens=16):
+    """Возвращает {note_id: Markup} с фрагментами текста и подсветкой совпадений."""
+    match = build_match_query(search_query)
+    note_ids = list(note_ids)
+    if not fts_enabled() or match is None or not note_ids:
+        return {}
+
+    rows = db.session.execute(
+        text(
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, :open, :close, '…', :tokens) "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match AND rowid IN :ids"
+        ).bindparams(bindparam('ids', expanding=True)),
+        {'match': match, 'open': _MARK_OPEN, 'close': _MARK_CLOSE, 'tokens': tokens, 'ids': note_ids},
+    )
+
+    snippets = {}
+    for note_id, snippet in rows:
+        highlighted = str(escape(snippet)).replace(_MARK_OPEN, '<mark>').replace(_MARK_CLOSE, '</mark>')
+        snippets[note_id] = Markup(highlighted)
+    return snippets
@@ -0,0 +1,74 @@
+# service_worker.py
+# -*- coding: utf-8 -*-
+
+"""
+Генерация service worker'а.
+
+Список предзагрузки (precache) строится по реальному содержимому static/ с
+хешами файлов, а версия кэшей — хеш этого списка. После изменения любого
+файла браузер получает новый service worker, который заново загружает
+только изменённые файлы и удаляет старые кэши при активации.
+"""
+
+import hashlib
+import json
+import os
+
+from flask import current_app, render_template, url_for
+
+# Каталоги static/, которые не предзагружаются: загрузки пользователей и
+# редактор (нужен только админу, ~1 МБ)
+PRECACHE_EXCLUDE_DIRS = ('uploads', 'tinymce')
+PRECACHE_EXCLUDE_FILES = ('service-worker.js',)
+# Сжатые копии (.br/.gz) отдаются сервером по тем же URL, что и оригиналы
+PRECACHE_EXCLUDE_SUFFIXES = ('.br', '.gz')
+IMAGE_CACHE_MAX_ENTRIES = 60
+
+
+def _file_revision(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build_precache_manifest():
+    """[{'url': ..., 'revision': ...}] для всех файлов static/, кроме исключённых и пустых."""
+    static_folder = current_app.static_folder
+    manifest = []
+    for dirpath, dirnames, filenames in os.walk(static_folder):
+        if dirpath == static_folder:
+            dirnames[:] = [d for d in dirnames if d not in PRECACHE_EXCLUDE_DIRS]
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            if (filename in PRECACHE_EXCLUDE_FILES or filename.endswith(PRECACHE_EXCLUDE_SUFFIXES)
+                    or filename.startswith('.') or os.path.getsize(path) == 0):
+                continue
+            relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+            manifest.append({'url': url_for('static', filename=relative), 'revision': _file_revision(path)})
+    return manifest
+
+
+def get_precache_manifest():
+    """Манифест с версией; считается один раз на процесс (в режиме отладки — каждый раз)."""
+    cached = current_app.extensions.get('precache_manifest')
+    if cached is None or current_app.debug:
+        manifest = build_precache_manifest()
+        raw = json.dumps(manifest, sort_keys=True).encode('utf-8')
+        cached = current_app.extensions['precache_manifest'] = {
+            'version': hashlib.sha256(raw).hexdigest()[:12],
+            'entries': manifest,
+        }
+    return cached
+
+
+def render_service_worker():
+    manifest = get_precache_manifest()
+    return render_template(
+        'service-worker.js',
+        version=manifest['version'],
+        precache=manifest['entries'],
+        image_cache_max_entries=IMAGE_CACHE_MAX_ENTRIES,
+    ), manifest['version']
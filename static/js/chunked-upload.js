@@ -0,0 +1,162 @@
+// static/js/chunked-upload.js
+// -*- coding: utf-8 -*-
+
+// --- Загрузка файла частями с докачкой (маршруты /uploads, см. chunked_upload.py) ---
+// chunkedUpload(blob, filename, onProgress) возвращает Promise с URL файла.
+// При обрыве связи часть повторяется с растущей паузой, а смещение уточняется
+// у сервера. id незавершённой загрузки хранится в localStorage: тот же файл
+// продолжает загружаться и после перезагрузки страницы. Ключ — имя, размер,
+// время изменения и хеш начала файла: другой файл с тем же именем и размером
+// не допишется к чужой незавершённой загрузке.
+(function () {
+    var MAX_RETRIES = 8;
+    var RETRY_DELAY_MS = 1000;
+    var STORAGE_PREFIX = 'chunked-upload:';
+    var DIGEST_BYTES = 1024 * 1024; // Начало файла для ключа (размер части по умолчанию)
+
+    function send(method, url, body, headers) {
+        return fetch(url, { method: method, body: body, headers: headers || {}, credentials: 'same-origin' })
+            .then(function (response) {
+                return response.json()
+                    .catch(function () { return {}; })
+                    .then(function (data) { return { status: response.status, data: data }; });
+            });
+    }
+
+    // FNV-1a: crypto.subtle есть только на https и localhost, а блокнот бывает открыт по http в локальной сети
+    function fnv1a(bytes) {
+        var hash = 0x811c9dc5;
+        for (var i = 0; i < bytes.length; i++) {
+            hash = Math.imul(hash ^ bytes[i], 0x01000193);
+        }
+        return (hash >>> 0).toString(16);
+    }
+
+    function hex(buffer) {
+        return Array.prototype.map.call(new Uint8Array(buffer), function (b) {
+            return ('0' + b.toString(16)).slice(-2);
+        }).join('');
+    }
+
+    function digestStart(blob) {
+        return blob.slice(0, DIGEST_BYTES).arrayBuffer().then(function (buffer) {
+            var subtle = window.crypto && window.crypto.subtle;
+            return subtle ? subtle.digest('SHA-256', buffer).then(hex) : fnv1a(new Uint8Array(buffer));
+        });
+    }
+
+    function resumeKey(blob, filename) {
+        return digestStart(blob).then(function (digest) {
+            return [STORAGE_PREFIX + filename, blob.size, blob.lastModified || 0, digest].join(':');
+        });
+    }
+
+    function sleep(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    function fail(result) {
+        throw new Error(result.data.error || ('HTTP ' + result.status));
+    }
+
+    // Загрузка, начатая раньше для этого же файла, или новая
+    function openUpload(blob, filename, key) {
+        var savedId = localStorage.getItem(key);
+        var resumed = savedId
+            ? send('GET', '/uploads/' + savedId).then(function (result) {
+                return result.status === 200 ? result.data : null;
+            })
+            : Promise.resolve(null);
+        return resumed.then(function (upload) {
+            if (upload) {
+                return upload;
+            }
+            return send('POST', '/uploads', JSON.stringify({ filename: filename, size: blob.size }),
+                        { 'Content-Type': 'application/json' })
+                .then(function (result) {
+                    if (result.status !== 201) {
+                        fail(result);
+                    }
+                    localStorage.setItem(key, result.data.id);
+                    return result.data;
+                });
+        });
+    }
+
+    function uploadChunks(blob, upload, onProgress) {
+        var chunkSize = upload.chunk_size || 1024 * 1024;
+        var offset = upload.offset;
+        var retries = 0;
+
+        function next() {
+            if (onProgress) {
+                onProgress(Math.round(offset / blob.size * 100));
+            }
+            if (offset >= blob.size) {
+                return Promise.resolve();
+            }
+            var chunk = blob.slice(offset, offset + chunkSize);
+            return send('PUT', '/uploads/' + upload.id, chunk, {
+                'Content-Type': 'application/octet-stream',
+                'Upload-Offset': String(offset)
+            }).then(function (result) {
+                if (result.status === 200) {
+                    offset = result.data.offset;
+                    retries = 0;
+                    return next();
+                }
+                if (result.status === 409 && typeof result.data.offset === 'number') {
+                    // Сервер получил больше или меньше, чем мы думали — продолжаем с его смещения
+                    offset = result.data.offset;
+                    return next();
+                }
+                if (result.status >= 500 || result.status === 409) {
+                    return retry();
+                }
+                fail(result);
+            }, retry);
+        }
+
+        // Обрыв связи: ждём и спрашиваем у сервера, сколько байт дошло
+        function retry() {
+            retries += 1;
+            if (retries > MAX_RETRIES) {
+                throw new Error('Нет связи с сервером');
+            }
+            return sleep(RETRY_DELAY_MS * Math.pow(2, retries - 1))
+                .then(function () { return send('GET', '/uploads/' + upload.id); })
+                .then(function (result) {
+                    if (result.status !== 200) {
+                        fail(result);
+                    }
+                    offset = result.data.offset;
+                    return next();
+                }, retry);
+        }
+
+        return next();
+    }
+
+    window.chunkedUpload = function (blob, filename, onProgress) {
+        var key, upload;
+        return resumeKey(blob, filename)
+            .then(function (resume) {
+                key = resume;
+                return openUpload(blob, filename, key);
+            })
+            .then(function (opened) {
+                upload = opened;
+                return uploadChunks(blob, upload, onProgress);
+            })
+            .then(function () { return send('POST', '/uploads/' + upload.id + '/complete'); })
+            .then(function (result) {
+                localStorage.removeItem(key);
+                if (result.status !== 200) {
+                    fail(result);
+                }
+                return result.data.location;
+            });
+    };
+    window.chunkedUpload.resumeKey = resumeKey;
+})();
+// --- /Загрузка файла частями с докачкой ---
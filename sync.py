@@ -0,0 +1,213 @@
+# sync.py
+# -*- coding: utf-8 -*-
+
+"""
+Инкрементальная синхронизация записей, задач и событий.
+
+Клиент хранит непрозрачный курсор и запрашивает только то, что изменилось
+после него: строки с (updated_at, id) больше позиции курсора и отметки об
+удалении (Tombstone) с id больше запомненного. Первый запрос без курсора
+возвращает полный снимок теми же страницами.
+
+Время updated_at ставит приложение до коммита, поэтому транзакция может
+зафиксироваться позже, чем уже выданная строка с большим временем. Строки
+моложе SETTLE_SECONDS не выдаются — они попадут в следующий запрос.
+Отметки об удалении нумеруются по порядку коммитов (SQLite выполняет
+записи последовательно), для них достаточно id.
+
+Удаления попадают в Tombstone автоматически через события сессии; bulk-
+запросы мимо ORM (импорт блокнота) вызывают request_resync(), и клиенты
+получают 410 — нужна полная синхронизация. Старые отметки удаляются
+командой prune-tombstones; курсор старше TOMBSTONE_RETENTION тоже требует
+полной синхронизации.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+
+from models import db, Event, Note, Task, Tombstone, note_categories
+from pagination import decode_cursor, encode_cursor
+
+CURSOR_VERSION = 1
+SETTLE_SECONDS = 5
+TOMBSTONE_RETENTION = timedelta(days=90)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+RESYNC = '*'
+
+# Синхронизируемые модели: тип в Tombstone, ключ в курсоре и ответе, колонки ответа
+ENTITIES = {
+    'note': (Note, 'n', 'notes', ('id', 'title', 'note_type', 'summary', 'excerpt', 'content', 'full_content',
+                                  'rendered_html', 'word_count', 'reading_time', 'lead_image', 'tags',
+                                  'background_color', 'image_filename', 'preview_image', 'is_published',
+                                  'created_at', 'updated_at')),
+    'task': (Task, 't', 'tasks', ('id', 'title', 'description', 'due_date', 'completed', 'priority',
+                                  'created_at', 'updated_at')),
+    'event': (Event, 'e', 'events', ('id', 'title', 'description', 'start_time', 'end_time', 'location',
+                                     'recurrence', 'recurrence_until', 'created_at', 'updated_at')),
+}
+ENTITY_BY_MODEL = {model: entity for entity, (model, _, _, _) in ENTITIES.items()}
+
+
+class SyncResetRequired(Exception):
+    """Курсор больше не годится: клиент должен заново загрузить снимок без курсора."""
+
+
+# --- Отметки об удалении ---
+@event.listens_for(Session, 'before_flush')
+def _record_deletions(session, flush_context, instances):
+    for obj in session.deleted:
+        entity = ENTITY_BY_MODEL.get(type(obj))
+        if entity is not None and obj.id is not None:
+            session.add(Tombstone(entity=entity, entity_id=obj.id, user_id=obj.user_id))
+    # Смена категорий не меняет колонки записи, но для клиентов это изменение записи
+    for obj in session.dirty:
+        if isinstance(obj, Note) and db.inspect(obj).attrs.categories.history.has_changes():
+            obj.updated_at = datetime.utcnow()
+
+
+@event.listens_for(Session, 'after_flush')
+def _forget_reused_ids(session, flush_context):
+    # SQLite может выдать id удалённой строки новой; старая отметка удалила бы новый объект у клиента
+    reused = [(ENTITY_BY_MODEL[type(obj)], obj.id) for obj in session.new if type(obj) in ENTITY_BY_MODEL]
+    if reused:
+        session.execute(
+            Tombstone.__table__.delete().where(tuple_(Tombstone.entity, Tombstone.entity_id).in_(reused))
+        )
+
+
+def request_resync(session):
+    """Отмечает, что изменения прошли мимо ORM и клиентам нужна полная синхронизация."""
+    session.add(Tombstone(entity=RESYNC))
+
+
+def prune_tombstones(older_than=TOMBSTONE_RETENTION):
+    """Удаляет отметки старше older_than. Возвращает их число."""
+    result = db.session.execute(
+        Tombstone.__table__.delete().where(Tombstone.deleted_at < datetime.utcnow() - older_than)
+    )
+    db.session.commit()
+    return result.rowcount
+# --- /Отметки об удалении ---
+
+
+# --- Выборка изменений ---
+def _parse_cursor(cursor, user_id, is_admin):
+    if not cursor:
+        return None
+    payload = decode_cursor(cursor)
+    if not payload or payload.get('v') != CURSOR_VERSION:
+        raise SyncResetRequired('Неверный курсор')
+    # Курсор выдан другому пользователю или роли — видимые записи другие
+    if payload.get('u') != user_id or payload.get('a') != is_admin:
+        raise SyncResetRequired('Курсор выдан другому пользователю')
+    try:
+        issued = datetime.fromisoformat(payload['s'])
+        positions = {
+            key: (datetime.fromisoformat(payload[key][0]), int(payload[key][1])) if payload.get(key) else None
+            for _, key, _, _ in ENTITIES.values()
+        }
+        payload['d'] = int(payload['d'])
+    except (KeyError, TypeError, ValueError, IndexError):
+        raise SyncResetRequired('Неверный курсор')
+    if issued < datetime.utcnow() - TOMBSTONE_RETENTION:
+        raise SyncResetRequired('Курсор устарел')
+    payload['positions'] = positions
+    return payload
+
+
+def _visible_rows(entity, user_id, is_admin, initial):
+    model, _, _, columns = ENTITIES[entity]
+    stmt = db.select(*[getattr(model, name) for name in columns])
+    if model is Note and not is_admin:
+        # Читатель видит опубликованные записи; снятые с публикации приходят как удалённые
+        return stmt.where(Note.is_published.is_(True)) if initial else stmt
+    return stmt.where(model.user_id == user_id)
+
+
+def _note_categories(note_ids):
+    links = {note_id: [] for note_id in note_ids}
+    if note_ids:
+        rows = db.session.execute(
+            db.select(note_categories.c.note_id, note_categories.c.category_id)
+            .where(note_categories.c.note_id.in_(note_ids))
+        )
+        for note_id, category_id in rows:
+            links[note_id].append(category_id)
+    return links
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def collect_changes(user_id, is_admin, cursor=None, limit=DEFAULT_LIMIT):
+    """Изменения после курсора: до limit строк каждого типа и новый курсор.
+
+    Ответ: {'changes': {'notes': [...], ...}, 'deleted': {'notes': [id, ...], ...},
+    'cursor': ..., 'has_more': bool, 'reset': bool}. reset=True — это первая
+    страница полного снимка, клиент должен очистить локальную копию.
+    """
+    limit = min(max(int(limit), 1), MAX_LIMIT)
+    state = _parse_cursor(cursor, user_id, is_admin)
+    initial = state is None
+    horizon = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+
+    changes = {name: [] for _, _, name, _ in ENTITIES.values()}
+    deleted = {name: [] for _, _, name, _ in ENTITIES.values()}
+    next_positions = {}
+    has_more = False
+
+    for entity, (model, key, name, columns) in ENTITIES.items():
+        position = None if initial else state['positions'][key]
+        stmt = _visible_rows(entity, user_id, is_admin, initial).where(model.updated_at <= horizon)
+        if position is not None:
+            stmt = stmt.where(tuple_(model.updated_at, model.id) > position)
+        rows = db.session.execute(stmt.order_by(model.updated_at, model.id).limit(limit + 1)).all()
+        if len(rows) > limit:
+            rows, has_more = rows[:limit], True
+        if model is Note and not is_admin:
+            deleted[name].extend(row.id for row in rows if not row.is_published)
+            rows_out = [row for row in rows if row.is_published]
+        else:
+            rows_out = rows
+        links = _note_categories([row.id for row in rows_out]) if model is Note else None
+        for row in rows_out:
+            record = {column: _to_json(getattr(row, column)) for column in columns}
+            if links is not None:
+                record['categories'] = links.get(row.id, [])
+            changes[name].append(record)
+        last = rows[-1] if rows else None
+        next_positions[key] = [last.updated_at.isoformat(), last.id] if last else (
+            None if initial else state.get(key))
+
+    if initial:
+        # Снимок уже отражает все прошлые удаления
+        last_tombstone = db.session.scalar(db.select(db.func.max(Tombstone.id))) or 0
+    else:
+        last_tombstone = state['d']
+        tombstones = db.session.execute(
+            db.select(Tombstone.id, Tombstone.entity, Tombstone.entity_id, Tombstone.user_id)
+            .where(Tombstone.id > last_tombstone)
+            .order_by(Tombstone.id)
+            .limit(limit + 1)
+        ).all()
+        if len(tombstones) > limit:
+            tombstones, has_more = tombstones[:limit], True
+        for tombstone in tombstones:
+            if tombstone.entity == RESYNC:
+                raise SyncResetRequired('Данные изменены импортом')
+            # Записи читателя — чужие; задачи и события — только свои
+            if tombstone.user_id == user_id or (tombstone.entity == 'note' and not is_admin):
+                deleted[ENTITIES[tombstone.entity][2]].append(tombstone.entity_id)
+            last_tombstone = tombstone.id
+
+    next_cursor = encode_cursor({
+        'v': CURSOR_VERSION, 'u': user_id, 'a': is_admin, 'd': last_tombstone,
+        's': datetime.utcnow().isoformat(),
+        **next_positions,
+    })
+    return {'changes': changes, 'deleted': deleted, 'cursor': next_cursor, 'has_more': has_more, 'reset': initial}
+# --- /Выборка изменений ---
@@ -0,0 +1,156 @@
+# tags.py
+# -*- coding: utf-8 -*-
+
+"""
+Индекс тегов записей.
+
+Пользователь по-прежнему вводит теги строкой через запятую (Note.tags), а
+нормализованная копия хранится в таблицах tag/note_tag. Она обновляется
+событием сессии перед каждым flush, поэтому фильтр по тегу — точное
+совпадение по индексу, а облако тегов считается одним агрегирующим запросом.
+Ключ облака в кэше содержит версию списков (page_cache.LISTS): любое
+изменение записей увеличивает её, и устаревшее облако не видит ни один воркер.
+"""
+
+from sqlalchemy import event, false, func
+from sqlalchemy.orm import Session
+
+import page_cache
+from extensions import cache
+from models import db, Note, Tag, note_tag
+
+TAG_CLOUD_CACHE_TIMEOUT = 300 # Секунды; ключ также меняется при сохранении записей
+REBUILD_BATCH_SIZE = 500
+
+
+def normalize_tag(name):
+    return (name or '').strip().lower()
+
+
+def parse_tags(tags_str):
+    """Разбирает строку тегов в список уникальных нормализованных имён (порядок сохраняется)."""
+    names = []
+    for part in (tags_str or '').split(','):
+        name = normalize_tag(part)[:100]
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _field_changed(note, field):
+    return db.inspect(note).attrs[field].history.has_changes()
+
+
+@event.listens_for(Session, 'before_flush')
+def _sync_note_tags(session, flush_context, instances):
+    notes = [obj for obj in session.new if isinstance(obj, Note)]
+    notes += [obj for obj in session.dirty if isinstance(obj, Note) and _field_changed(obj, 'tags')]
+    if not notes:
+        return
+
+    wanted = {name for note in notes for name in parse_tags(note.tags)}
+    with session.no_autoflush:
+        known = {tag.name: tag for tag in session.query(Tag).filter(Tag.name.in_(wanted))} if wanted else {}
+        for note in notes:
+            tags = []
+            for name in parse_tags(note.tags):
+                if name not in known:
+                    known[name] = Tag(name=name)
+                    session.add(known[name])
+                tags.append(known[name])
+            note.indexed_tags = tags
+
+
+def filter_by_tag(query, tag_name):
+    """Точный фильтр по тегу через индекс (tag_id, note_id) вместо LIKE по строке."""
+    tag_id = db.session.scalar(db.select(Tag.id).where(Tag.name == normalize_tag(tag_name)))
+    if tag_id is None:
+        return query.filter(false())
+    return query.join(note_tag, note_tag.c.note_id == Note.id).filter(note_tag.c.tag_id == tag_id)
+
+
+def tag_cloud(published_only=False):
+    """Список (тег, число записей) по всем записям, самые частые первыми. Кэшируется."""
+    key = page_cache.versioned_key('tag_cloud', [page_cache.LISTS], 'published' if published_only else 'all')
+    cloud = cache.get(key)
+    if cloud is None:
+        count = func.count(note_tag.c.note_id)
+        stmt = (
+            db.select(Tag.name, count)
+            .join(note_tag, note_tag.c.tag_id == Tag.id)
+            .group_by(Tag.id)
+            .order_by(count.desc(), Tag.name)
+        )
+        if published_only:
+            stmt = stmt.join(Note, Note.id == note_tag.c.note_id).where(Note.is_published.is_(True))
+        cloud = [(name, total) for name, total in db.session.execute(stmt)]
+        cache.set(key, cloud, timeout=TAG_CLOUD_CACHE_TIMEOUT)
+    return cloud
+
+
+def _index_tag_rows(rows):
+    """Добавляет связи note_tag для строк (id, tags) пакетами. Возвращает число записей."""
+    tag_ids = {name: tag_id for tag_id, name in db.session.execute(db.select(Tag.id, Tag.name))}
+    total = 0
+
+    def flush_batch(batch):
+        new_names = {name for _, names in batch for name in names} - tag_ids.keys()
+        if new_names:
+            db.session.execute(Tag.__table__.insert(), [{'name': name} for name in new_names])
+            tag_ids.update(
+                (name, tag_id) for tag_id, name in
+                db.session.execute(db.select(Tag.id, Tag.name).where(Tag.name.in_(new_names)))
+            )
+        links = [{'note_id': note_id, 'tag_id': tag_ids[name]} for note_id, names in batch for name in names]
+        if links:
+            db.session.execute(note_tag.insert(), links)
+
+    batch = []
+    for note_id, tags_str in rows:
+        batch.append((note_id, parse_tags(tags_str)))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            flush_batch(batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        flush_batch(batch)
+        total += len(batch)
+    return total
+
+
+def rebuild_tag_index():
+    """Перестраивает tag/note_tag по строкам Note.tags пакетами. Возвращает число записей."""
+    db.session.execute(note_tag.delete())
+    total = _index_tag_rows(db.session.execute(
+        db.select(Note.id, Note.tags).where(Note.tags.isnot(None))
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    ))
+    # Bulk-запросы идут мимо ORM — версию списков увеличиваем явно
+    page_cache.mark_changed(db.session, page_cache.LISTS)
+    db.session.commit()
+    return total
+
+
+def index_note_tags(note_ids):
+    """Обновляет индекс только для указанных записей (после bulk-вставки). Возвращает число записей."""
+    ids = list(note_ids)
+    total = 0
+    for i in range(0, len(ids), REBUILD_BATCH_SIZE):
+        chunk = ids[i:i + REBUILD_BATCH_SIZE]
+        db.session.execute(note_tag.delete().where(note_tag.c.note_id.in_(chunk)))
+        total += _index_tag_rows(db.session.execute(
+            db.select(Note.id, Note.tags).where(Note.id.in_(chunk), Note.tags.isnot(None))
+        ).all())
+    page_cache.mark_changed(db.session, page_cache.LISTS)
+    db.session.commit()
+    return total
+
+
+def tag_index_needs_rebuild():
+    """True, если у записей есть теги, а индекс ещё не заполнен (старая база)."""
+    has_links = db.session.execute(db.select(note_tag.c.note_id).limit(1)).first() is not None
+    if has_links:
+        return False
+    return db.session.execute(
+        db.select(Note.id).where(Note.tags.isnot(None), Note.tags != '').limit(1)
+    ).first() is not None
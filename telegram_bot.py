@@ -0,0 +1,289 @@
+# telegram_bot.py
+# -*- coding: utf-8 -*-
+
+"""
+Telegram-бот для быстрых записей (python-telegram-bot, asyncio).
+
+Запускается отдельным процессом: flask --app app telegram-bot. Сообщения,
+фото и пересылки администратора (User.telegram_id, см. flask link-telegram)
+становятся записями. Обработчик обновления только кладёт сообщение в
+ограниченную очередь; фоновая задача забирает из неё пачки (до BATCH_SIZE
+сообщений или BATCH_WINDOW секунд), параллельно скачивает вложения в
+хранилище загрузок и сохраняет всю пачку одной транзакцией в отдельном
+потоке. Сотня пересланных подряд сообщений — это несколько коммитов, а не
+сотня, и цикл событий не блокируется SQLite. Когда очередь заполнена,
+обработчик ждёт — получение новых обновлений притормаживает.
+
+Кэш страниц веб-воркеров сбрасывается версиями в базе (page_cache.py),
+поэтому новые записи видны сразу при любом бэкенде кэша.
+
+Для проверки без Telegram: NOTEBOOK_TELEGRAM_API_URL и
+NOTEBOOK_TELEGRAM_FILE_URL направляют бота на локальную заглушку Bot API.
+"""
+
+import asyncio
+import io
+import logging
+from collections import defaultdict
+
+from werkzeug.datastructures import FileStorage
+
+try:
+    from telegram import Update
+    from telegram.ext import Application, CommandHandler, MessageHandler, filters
+except ImportError: # python-telegram-bot не установлен — бот недоступен
+    Update = Application = None
+
+import images
+import media_store
+from models import db, Note, User
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 1000
+BATCH_SIZE = 100
+BATCH_WINDOW = 1.0 # Секунды ожидания остальных сообщений пачки
+DOWNLOAD_CONCURRENCY = 4
+TITLE_LENGTH = 100
+NOTE_TAG = 'telegram'
+IMAGE_MIME_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif'}
+
+
+def bot_available():
+    return Application is not None
+
+
+class CapturedMessage:
+    """Данные сообщения, нужные для записи (без объектов telegram)."""
+
+    def __init__(self, telegram_user_id, chat_id, text, file_id=None, file_ext=None, forward_from=None, date=None):
+        self.telegram_user_id = telegram_user_id
+        self.chat_id = chat_id
+        self.text = text or ''
+        self.file_id = file_id
+        self.file_ext = file_ext
+        self.forward_from = forward_from
+        self.date = date
+        self.filename = None # Имя в хранилище после скачивания
+        self.new_upload = False # Файл впервые попал в хранилище — нужны копии
+
+
+def _forward_origin_name(origin):
+    if origin is None:
+        return None
+    for attr in ('sender_user', 'sender_chat', 'chat'):
+        source = getattr(origin, attr, None)
+        if source is not None:
+            return getattr(source, 'full_name', None) or getattr(source, 'title', None) or getattr(source, 'username', None)
+    return getattr(origin, 'sender_user_name', None) or 'неизвестно'
+
+
+def capture_message(message):
+    """CapturedMessage из telegram.Message или None, если сохранять нечего."""
+    file_id = file_ext = None
+    if message.photo:
+        file_id, file_ext = message.photo[-1].file_id, 'jpg' # Самый крупный размер
+    elif message.document and message.document.mime_type in IMAGE_MIME_EXTENSIONS:
+        file_id, file_ext = message.document.file_id, IMAGE_MIME_EXTENSIONS[message.document.mime_type]
+    text = message.text or message.caption
+    if not text and not file_id:
+        return None
+    return CapturedMessage(
+        telegram_user_id=message.from_user.id if message.from_user else None,
+        chat_id=message.chat_id,
+        text=text,
+        file_id=file_id,
+        file_ext=file_ext,
+        forward_from=_forward_origin_name(message.forward_origin),
+        date=message.date.replace(tzinfo=None) if message.date else None,
+    )
+
+
+def _note_from_message(item, user_id):
+    content = item.text
+    if item.forward_from:
+        content = f'Переслано от: {item.forward_from}\n\n{content}'.strip()
+    first_line = item.text.strip().splitlines()[0] if item.text.strip() else ''
+    note = Note(
+        title=first_line[:TITLE_LENGTH] or ('Фото из Telegram' if item.filename else 'Из Telegram'),
+        content=content,
+        note_type='image_note' if item.filename else 'note',
+        image_filename=item.filename,
+        tags=NOTE_TAG,
+        user_id=user_id,
+    )
+    if item.date:
+        note.created_at = item.date
+    return note
+
+
+class IngestQueue:
+    """Ограниченная очередь сообщений, которая сохраняет их пачками."""
+
+    def __init__(self, flask_app, bot, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE, batch_window=BATCH_WINDOW):
+        self.flask_app = flask_app
+        self.bot = bot
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._downloads = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def put(self, item):
+        await self.queue.put(item) # Ждёт, если очередь заполнена
+
+    async def close(self):
+        """Дожидается сохранения всего, что уже в очереди."""
+        await self.queue.join()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process(batch)
+            except Exception:
+                logger.exception('Не удалось сохранить пачку из %d сообщений', len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def process(self, batch):
+        owners = await asyncio.to_thread(self._load_owners, batch)
+        # Вложения скачиваются только для сообщений, которые будут сохранены
+        await asyncio.gather(*(self._download(item) for item in batch
+                               if item.file_id and item.telegram_user_id in owners))
+        saved = await asyncio.to_thread(self._save_batch, batch, owners)
+        await self._notify(saved)
+
+    async def _download(self, item):
+        async with self._downloads:
+            try:
+                telegram_file = await self.bot.get_file(item.file_id)
+                data = await telegram_file.download_as_bytearray()
+            except Exception as error: # Запись сохраняем и без вложения
+                logger.warning('Не удалось скачать файл %s: %s', item.file_id, error)
+                return
+        item.filename, item.new_upload = await asyncio.to_thread(self._store, bytes(data), item.file_ext)
+
+    def _store(self, data, ext):
+        with self.flask_app.app_context():
+            return media_store.store_upload(FileStorage(stream=io.BytesIO(data), filename=f'telegram.{ext}'))
+
+    def _load_owners(self, batch):
+        """{telegram_id: id пользователя} одним запросом на пачку."""
+        telegram_ids = {item.telegram_user_id for item in batch if item.telegram_user_id}
+        if not telegram_ids:
+            return {}
+        with self.flask_app.app_context():
+            # Записи создаёт только администратор — как и на сайте
+            return dict(db.session.execute(
+                db.select(User.telegram_id, User.id)
+                .where(User.telegram_id.in_(telegram_ids), User.is_admin.is_(True))
+            ).all())
+
+    def _save_batch(self, batch, owners):
+        """Сохраняет пачку одной транзакцией. Возвращает {chat_id: (сохранено, отклонено)}."""
+        with self.flask_app.app_context():
+            results = defaultdict(lambda: [0, 0])
+            notes = []
+            for item in batch:
+                user_id = owners.get(item.telegram_user_id)
+                if user_id is None:
+                    results[item.chat_id][1] += 1
+                    continue
+                notes.append(_note_from_message(item, user_id))
+                results[item.chat_id][0] += 1
+            if notes:
+                db.session.add_all(notes)
+                # Копии изображений создаются после коммита пачки (см. images.schedule_processing)
+                for item in batch:
+                    if item.new_upload and item.telegram_user_id in owners:
+                        images.schedule_processing(item.filename)
+                db.session.commit()
+            return dict(results)
+
+    async def _notify(self, results):
+        # Одно сообщение на чат за пачку, а не ответ на каждое сообщение
+        for chat_id, (saved, rejected) in results.items():
+            parts = []
+            if saved:
+                parts.append(f'Сохранено записей: {saved}')
+            if rejected:
+                parts.append('Нет доступа: Telegram ID не привязан к администратору (узнать ID — /start)')
+            try:
+                await self.bot.send_message(chat_id, '\n'.join(parts))
+            except Exception as error:
+                logger.warning('Не удалось ответить в чат %s: %s', chat_id, error)
+
+
+# --- Приложение бота ---
+async def _start_command(update, context):
+    await update.effective_message.reply_text(
+        f'Ваш Telegram ID: {update.effective_user.id}\n'
+        'Администратор привязывает его командой: flask --app app link-telegram <имя> <ID>\n'
+        'После этого присылайте текст, фото или пересылайте сообщения — они станут записями.'
+    )
+
+
+async def _capture(update, context):
+    item = capture_message(update.effective_message)
+    if item is not None:
+        await context.application.bot_data['ingest'].put(item)
+
+
+def build_application(flask_app, token, base_url=None, base_file_url=None):
+    """Application с обработчиками; base_url/base_file_url — для локальной заглушки Bot API."""
+    if not bot_available():
+        raise RuntimeError('python-telegram-bot не установлен: pip install python-telegram-bot')
+
+    async def post_init(application):
+        ingest = IngestQueue(flask_app, application.bot)
+        application.bot_data['ingest'] = ingest
+        ingest.start()
+
+    async def post_shutdown(application):
+        await application.bot_data['ingest'].close()
+
+    builder = Application.builder().token(token).post_init(post_init).post_shutdown(post_shutdown)
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    application = builder.build()
+    application.add_handler(CommandHandler('start', _start_command))
+    application.add_handler(MessageHandler(
+        (filters.TEXT & ~filters.COMMAND) | filters.PHOTO | filters.Document.IMAGE, _capture))
+    return application
+
+
+def run_bot(flask_app):
+    """Запускает бота (long polling) с настройками из конфигурации приложения."""
+    token = flask_app.config.get('TELEGRAM_BOT_TOKEN')
+    if not token:
+        raise RuntimeError('Не задан токен бота: NOTEBOOK_TELEGRAM_TOKEN')
+    application = build_application(
+        flask_app, token,
+        base_url=flask_app.config.get('TELEGRAM_API_URL'),
+        base_file_url=flask_app.config.get('TELEGRAM_FILE_URL'),
+    )
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+# --- /Приложение бота ---
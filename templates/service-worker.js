@@ -0,0 +1,153 @@
+// templates/service-worker.js
+// -*- coding: utf-8 -*-
+// Генерируется маршрутом /service-worker.js (см. service_worker.py).
+// Версия меняется вместе с содержимым static/, поэтому браузер
+// устанавливает новый worker сразу после обновления файлов.
+
+const VERSION = '{{ version }}';
+const PRECACHE = 'notebook-precache-' + VERSION;
+const PAGES_CACHE = 'notebook-pages-' + VERSION;
+const DYNAMIC_CACHE = 'notebook-dynamic-' + VERSION;
+const IMAGES_CACHE = 'notebook-images'; // Содержимое по хешу не устаревает — кэш переживает обновления
+const CURRENT_CACHES = [PRECACHE, PAGES_CACHE, DYNAMIC_CACHE, IMAGES_CACHE];
+
+const PRECACHE_ENTRIES = {{ precache | tojson }};
+const PRECACHE_URLS = new Set(PRECACHE_ENTRIES.map((entry) => entry.url));
+const IMAGE_CACHE_MAX_ENTRIES = {{ image_cache_max_entries }};
+
+// Публичные страницы: сразу из кэша, обновление в фоне
+const STALE_WHILE_REVALIDATE_PATHS = ['/', '/wall', '/public_articles'];
+const STALE_WHILE_REVALIDATE_PREFIXES = ['/read_article/'];
+// После входа/выхода закэшированная разметка относится к другому пользователю
+const SESSION_PATHS = ['/login', '/logout', '/register'];
+const IMAGE_PREFIXES = ['/media/', '/static/uploads/'];
+// Ответ зависит от курсора клиента — старая копия из кэша недопустима
+const NETWORK_ONLY_PATHS = ['/sync', '/push/public-key'];
+// Админка и страницы входа не попадают в кэш: после выхода их увидел бы следующий пользователь браузера
+const NEVER_CACHE_PREFIXES = ['/admin', '/login', '/logout', '/register'];
+
+// --- Установка: предзагрузка файлов из манифеста ---
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(PRECACHE)
+      .then((cache) => cache.addAll(PRECACHE_ENTRIES.map((entry) => new Request(entry.url, { cache: 'reload' }))))
+      .then(() => self.skipWaiting())
+  );
+});
+
+// --- Активация: удаляем кэши предыдущих версий ---
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((names) => Promise.all(
+        names.filter((name) => name.startsWith('notebook-') && !CURRENT_CACHES.includes(name))
+             .map((name) => caches.delete(name))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+function isCacheable(response) {
+  // Страницы авторизованного пользователя (Cache-Control: private) в общий кэш страниц не кладём
+  const cacheControl = response.headers.get('Cache-Control') || '';
+  return response.ok && response.type === 'basic' && !cacheControl.includes('private') && !cacheControl.includes('no-store');
+}
+
+function staleWhileRevalidate(event, cacheName) {
+  const network = fetch(event.request).then((response) => {
+    if (isCacheable(response)) {
+      const copy = response.clone();
+      caches.open(cacheName).then((cache) => cache.put(event.request, copy));
+    }
+    return response;
+  });
+  event.waitUntil(network.catch(() => undefined));
+  return caches.match(event.request).then((cached) => cached || network);
+}
+
+function clearSessionCaches() {
+  // Кэши страниц всех версий worker'а: разметка в них относится к вышедшему пользователю
+  return caches.keys().then((names) => Promise.all(names
+    .filter((name) => name.startsWith('notebook-pages-') || name.startsWith('notebook-dynamic-'))
+    .map((name) => caches.delete(name))));
+}
+
+function networkFirst(request, cacheName) {
+  return fetch(request)
+    .then((response) => {
+      if (isCacheable(response)) {
+        const copy = response.clone();
+        caches.open(cacheName).then((cache) => cache.put(request, copy));
+      }
+      return response;
+    })
+    .catch(() => caches.match(request).then((cached) => cached || Response.error()));
+}
+
+async function trimCache(cache, maxEntries) {
+  const keys = await cache.keys();
+  // keys() возвращает записи в порядке добавления: первые — самые давно использованные
+  await Promise.all(keys.slice(0, Math.max(0, keys.length - maxEntries)).map((key) => cache.delete(key)));
+}
+
+async function cacheFirstLru(request) {
+  const cache = await caches.open(IMAGES_CACHE);
+  const cached = await cache.match(request);
+  if (cached) {
+    // Перекладываем в конец, чтобы запись считалась недавно использованной
+    await cache.delete(request);
+    await cache.put(request, cached.clone());
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    await cache.put(request, response.clone());
+    await trimCache(cache, IMAGE_CACHE_MAX_ENTRIES);
+  }
+  return response;
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (SESSION_PATHS.includes(url.pathname)) {
+    // Очищаем до ответа и ещё раз после: запросы, завершившиеся во время выхода, не оставят копий
+    event.waitUntil(clearSessionCaches());
+    event.respondWith(fetch(request).then((response) => clearSessionCaches().then(() => response)));
+    return;
+  }
+  if (request.method !== 'GET' || NETWORK_ONLY_PATHS.includes(url.pathname)
+      || NEVER_CACHE_PREFIXES.some((prefix) => url.pathname.startsWith(prefix))) {
+    return;
+  }
+
+  if (PRECACHE_URLS.has(url.pathname)) {
+    event.respondWith(caches.match(url.pathname, { cacheName: PRECACHE }).then((cached) => cached || fetch(request)));
+  } else if (IMAGE_PREFIXES.some((prefix) => url.pathname.startsWith(prefix))) {
+    event.respondWith(cacheFirstLru(request));
+  } else if (STALE_WHILE_REVALIDATE_PATHS.includes(url.pathname)
+             || STALE_WHILE_REVALIDATE_PREFIXES.some((prefix) => url.pathname.startsWith(prefix))) {
+    event.respondWith(staleWhileRevalidate(event, PAGES_CACHE));
+  } else if (!url.pathname.startsWith('/static/')) {
+    // Админка, API и прочие динамические страницы: сеть, при отсутствии сети — последняя копия
+    event.respondWith(networkFirst(request, DYNAMIC_CACHE));
+  }
+});
+
+// Напоминания о задачах и событиях (web push, см. reminders.py)
+self.addEventListener('push', (event) => {
+  const data = event.data ? event.data.json() : {};
+  event.waitUntil(self.registration.showNotification(data.title || 'Напоминание', {
+    body: data.body || '',
+    data: { url: data.url || '/' },
+  }));
+});
+
+self.addEventListener('notificationclick', (event) => {
+  event.notification.close();
+  event.waitUntil(self.clients.openWindow(event.notification.data.url));
+});
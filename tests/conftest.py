@@ -0,0 +1,78 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+
+"""
+Общие фикстуры: приложение с профилем testing на временной базе SQLite.
+
+База — файл во временном каталоге (а не в памяти), чтобы тесты могли
+открыть её из второго экземпляра приложения, как второй воркер gunicorn.
+"""
+
+import pytest
+
+import principals
+from app import create_app
+from models import db, Note, User
+
+
+def make_app(tmp_path, **overrides):
+    config = {
+        'CONFIG_PROFILE': 'testing',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "notes.db"}',
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+    }
+    config.update(overrides)
+    return create_app(config)
+
+
+@pytest.fixture
+def app(tmp_path):
+    # Кэш пользователей — на процесс: в каждом тесте своя база с теми же id
+    principals.principal_cache.clear()
+    app = make_app(tmp_path)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def create_user(app, username, is_admin=False, password='secret'):
+    with app.app_context():
+        user = User(username=username, is_admin=is_admin)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_id(app):
+    return create_user(app, 'admin', is_admin=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app, admin_id):
+    return login(app.test_client(), admin_id)
+
+
+def create_note(app, user_id, **fields):
+    fields.setdefault('title', 'Запись')
+    fields.setdefault('note_type', 'note')
+    # Контекст запроса — для url_for в разметке изображений (note_content.py)
+    with app.test_request_context():
+        note = Note(user_id=user_id, **fields)
+        db.session.add(note)
+        db.session.commit()
+        return note.id
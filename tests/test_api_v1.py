@@ -0,0 +1,77 @@
+# tests/test_api_v1.py
+# -*- coding: utf-8 -*-
+
+import pytest
+
+
+@pytest.fixture
+def api(client, admin_id):
+    token = client.post('/api/v1/auth/token', json={'username': 'admin', 'password': 'secret'}).get_json()
+    headers = {'Authorization': f'Bearer {token["access_token"]}'}
+
+    def call(method, path, **kwargs):
+        return client.open(f'/api/v1{path}', method=method, headers=headers, **kwargs)
+    return call
+
+
+def test_batch_is_atomic_and_lists_by_cursor(api):
+    response = api('POST', '/tasks/batch', json={'create': [{'title': f'Задача {i}'} for i in range(3)]})
+    assert response.status_code == 200
+    created = response.get_json()['created']
+    assert len(created) == 3
+
+    # Ошибка во втором элементе откатывает всю пачку
+    response = api('POST', '/tasks/batch', json={'create': [{'title': 'Ещё'}], 'delete': [created[0], 999999]})
+    assert response.status_code == 404
+    page = api('GET', '/tasks/?limit=2&fields=title').get_json()
+    assert [item['title'] for item in page['items']] == ['Задача 0', 'Задача 1']
+    assert set(page['items'][0]) == {'id', 'title'}
+    rest = api('GET', f'/tasks/?limit=2&cursor={page["next_cursor"]}').get_json()
+    assert [item['title'] for item in rest['items']] == ['Задача 2'] and rest['next_cursor'] is None
+
+
+@pytest.mark.parametrize('payload', [
+    {'delete': [[1]]},
+    {'delete': ['1']},
+    {'delete': [True]},
+    {'update': [{'id': {'x': 1}, 'title': 'Нет'}]},
+    {'update': ['1']},
+])
+def test_batch_rejects_malformed_ids(api, payload):
+    response = api('POST', '/tasks/batch', json=payload)
+    assert response.status_code == 400
+    assert 'id' in response.get_json()['message']
+
+
+def test_required_fields_cannot_be_cleared(api):
+    event = api('POST', '/events/', json={'title': 'Встреча', 'start_time': '2026-05-01T10:00:00'})
+    assert event.status_code == 201
+    event_id = event.get_json()['id']
+    response = api('PATCH', f'/events/{event_id}', json={'start_time': None})
+    assert response.status_code == 400
+    assert 'start_time' in response.get_json()['message']
+    response = api('POST', '/events/batch', json={'update': [{'id': event_id, 'title': ''}]})
+    assert response.status_code == 400
+    assert api('GET', f'/events/{event_id}').get_json()['title'] == 'Встреча'
+
+
+def test_only_unique_violations_are_conflicts(api):
+    assert api('POST', '/categories/', json={'name': 'Работа'}).status_code == 201
+    response = api('POST', '/categories/', json={'name': 'Работа'})
+    assert response.status_code == 409
+    response = api('POST', '/categories/batch', json={'create': [{'name': 'Дом'}, {'name': 'Дом'}]})
+    assert response.status_code == 409
+    assert [item['name'] for item in api('GET', '/categories/').get_json()['items']] == ['Работа']
+
+
+@pytest.mark.parametrize('path, payload, field', [
+    ('/tasks/', {'title': {'text': 'Задача'}}, 'title'),
+    ('/tasks/', {'title': 'Задача', 'completed': 'yes'}, 'completed'),
+    ('/notes/', {'title': 'Запись', 'is_published': 1}, 'is_published'),
+    ('/categories/', {'name': ['Дом']}, 'name'),
+])
+def test_scalar_fields_are_type_checked(api, path, payload, field):
+    response = api('POST', path, json=payload)
+    assert response.status_code == 400
+    assert field in response.get_json()['message']
+    assert api('GET', path).get_json()['items'] == []
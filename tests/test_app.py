@@ -0,0 +1,69 @@
+# tests/test_app.py
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+import pytest
+from flask import url_for
+
+import app as app_module
+import config as app_config
+from conftest import make_app
+from models import db
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_each_app_gets_routes_commands_and_template_helpers(app, tmp_path):
+    (tmp_path / 'other').mkdir()
+    other = make_app(tmp_path / 'other')
+    for instance in (app, other):
+        with instance.test_request_context():
+            # Маршруты — без префикса blueprint'а
+            assert url_for('wall') == '/wall' and url_for('read_article', id=1) == '/read_article/1'
+        assert {'init-db', 'reminders', 'export'} <= set(instance.cli.list_commands(None))
+        assert 'time_ago' in instance.jinja_env.filters
+        assert 'responsive_image' in instance.jinja_env.globals
+    assert sorted(map(str, app.url_map.iter_rules())) == sorted(map(str, other.url_map.iter_rules()))
+    assert len(app.view_functions) == len(other.view_functions) > len(app_module.ROUTES)
+    with other.app_context():
+        db.engine.dispose()
+
+
+def test_init_db_command(app):
+    result = app.test_cli_runner().invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'База данных готова' in result.output
+
+
+def _run(code, database, *args):
+    env = {**os.environ, 'NOTEBOOK_CONFIG': 'production', 'NOTEBOOK_DATABASE_URL': f'sqlite:///{database}',
+           'NOTEBOOK_WARM_UP': '0', 'NOTEBOOK_SECRET_KEY': 'session-key', 'NOTEBOOK_JWT_SECRET_KEY': 'jwt-key'}
+    return subprocess.run([sys.executable, *args] if args else [sys.executable, '-c', code],
+                          cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=120)
+
+
+def test_wsgi_refuses_outdated_schema_until_init_db(tmp_path):
+    database = tmp_path / 'prod.db'
+    refused = _run('import wsgi', database)
+    assert refused.returncode != 0 and 'init-db' in refused.stderr
+
+    migrated = _run(None, database, '-m', 'flask', '--app', 'app', 'init-db')
+    assert migrated.returncode == 0, migrated.stderr
+    started = _run('import wsgi; print(wsgi.app.url_map.bind("localhost").build("wall"))', database)
+    assert started.returncode == 0, started.stderr
+    assert started.stdout.strip() == '/wall'
+
+
+def test_production_requires_secret_keys(monkeypatch):
+    for variable in app_config.REQUIRED_SECRETS['production']:
+        monkeypatch.delenv(variable, raising=False)
+    monkeypatch.setenv('NOTEBOOK_SECRET_KEY', 'session-key')
+    with pytest.raises(RuntimeError, match='NOTEBOOK_JWT_SECRET_KEY'):
+        app_config.load_config('production')
+    monkeypatch.setenv('NOTEBOOK_JWT_SECRET_KEY', 'jwt-key')
+    config = app_config.load_config('production')
+    assert (config['SECRET_KEY'], config['JWT_SECRET_KEY']) == ('session-key', 'jwt-key')
+    assert app_config.load_config('testing')['SECRET_KEY'] == app_config.BASE_CONFIG['SECRET_KEY']
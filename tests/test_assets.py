@@ -0,0 +1,39 @@
+# tests/test_assets.py
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+
+from flask import url_for
+
+import assets
+
+
+def test_fingerprinted_url_is_immutable(app, client):
+    with app.test_request_context():
+        url = url_for('static', filename='css/style.css')
+    assert url != '/static/css/style.css'
+    response = client.get(url)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_stale_compressed_copy_is_not_served(app, client, tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    source = static / 'app.js'
+    source.write_text('console.log("v1");' * 64, encoding='utf-8')
+    assert assets.compress_assets(str(static)) >= 1
+    app.static_folder = str(static)
+
+    response = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'v1' in gzip.decompress(response.get_data())
+
+    # Исходник обновили, а build-assets не запускали: сжатая копия устарела
+    source.write_text('console.log("v2");' * 64, encoding='utf-8')
+    compressed = str(source) + '.gz'
+    os.utime(compressed, (os.path.getmtime(source) - 10,) * 2)
+    response = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert b'v2' in response.get_data()
@@ -0,0 +1,88 @@
+# tests/test_backup.py
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import tarfile
+
+import pytest
+from sqlalchemy import event, text
+
+import backup
+import media_store
+import search
+import tags
+from conftest import create_note, create_user
+from models import db, Category, Note
+
+
+def test_export_import_round_trip_indexes_only_imported_notes(app, admin_id):
+    create_note(app, admin_id, title='Старая', tags='дом', content='<p>черновик</p>')
+    with app.app_context():
+        category = Category(name='Работа')
+        db.session.add(category)
+        db.session.flush()
+        note = Note(user_id=admin_id, title='Отчёт', note_type='note', tags='Работа, квартал',
+                    content='<p>квартальный отчёт</p>', categories=[category])
+        db.session.add(note)
+        db.session.commit()
+        lines = list(backup.iter_export(admin_id))
+
+    other_id = create_user(app, 'editor')
+    with app.app_context():
+        # Строка индекса старой записи, которую полная перестройка восстановила бы
+        existing_ids = [row.id for row in db.session.execute(db.select(Note.id))]
+        db.session.execute(text('DELETE FROM note_fts'))
+        db.session.commit()
+
+        statements = []
+
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            counts = backup.import_lines(lines, other_id)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+
+        assert counts['note'] == 2 and counts['category'] == 1
+        # Без полной очистки индексов
+        assert not any(s.strip() in ('DELETE FROM note_tag', 'DELETE FROM note_fts') for s in statements)
+
+        copy = Note.query.filter_by(user_id=other_id, title='Отчёт').one()
+        assert [n.id for n in search.filter_notes(Note.query, 'квартальный')] == [copy.id]
+        assert search.filter_notes(Note.query.filter(Note.id.in_(existing_ids)), 'черновик').all() == []
+
+        tagged = tags.filter_by_tag(Note.query, 'работа').all()
+        assert {n.user_id for n in tagged} == {admin_id, other_id}
+        assert copy.word_count and [c.name for c in copy.categories] == ['Работа']
+
+
+@pytest.mark.parametrize('line', ['[1]', '"x"', '42'])
+def test_non_object_line_is_a_format_error(app, admin_client, line):
+    with app.app_context():
+        with pytest.raises(backup.BackupFormatError, match='Строка 1'):
+            backup.import_lines([line], 1)
+    response = admin_client.post('/admin/import', data={'notebook': (io.BytesIO(line.encode()), 'notebook.ndjson')})
+    assert response.status_code == 400
+
+
+def test_user_export_contains_only_own_uploads(app, admin_id, admin_client, tmp_path):
+    other_id = create_user(app, 'editor')
+    with app.app_context():
+        root = media_store.uploads_dir()
+    for name in ('own.png', 'foreign.png'):
+        with open(os.path.join(root, name), 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+    create_note(app, admin_id, image_filename='own.png')
+    create_note(app, other_id, image_filename='foreign.png')
+
+    with app.app_context():
+        lines, files = backup.export_to_directory(str(tmp_path / 'export'), admin_id)
+        assert files == 1
+    with tarfile.open(tmp_path / 'export' / 'uploads.tar') as archive:
+        assert archive.getnames() == ['uploads/own.png']
+    response = admin_client.get('/admin/export/uploads.tar')
+    with tarfile.open(fileobj=io.BytesIO(response.get_data())) as archive:
+        assert archive.getnames() == ['uploads/own.png']
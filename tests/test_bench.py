@@ -0,0 +1,42 @@
+# tests/test_bench.py
+# -*- coding: utf-8 -*-
+
+# Скрипты bench/ импортируют друг друга как модули верхнего уровня (pythonpath в pytest.ini)
+import generate
+import routes
+import search
+import tags
+from models import db, Note, note_image
+
+
+def test_generator_is_deterministic():
+    first, second = generate.NotebookGenerator(200, seed=7), generate.NotebookGenerator(200, seed=7)
+    rows = [first.note_row(1) for _ in range(20)] + [first.task_row(1), first.event_row(1)]
+    assert rows == [second.note_row(1) for _ in range(20)] + [second.task_row(1), second.event_row(1)]
+    assert generate.NotebookGenerator(200, seed=8).note_row(1) != generate.NotebookGenerator(200, seed=7).note_row(1)
+    # Время данных не зависит от текущего момента
+    assert all(row['created_at'] <= generate.BASE_TIME for row in rows[:20])
+
+
+def test_populate_builds_indexes(app):
+    with app.test_request_context():
+        counts = generate.populate(generate.NotebookGenerator(60, seed=3), log=lambda message: None)
+        assert counts['notes'] == db.session.scalar(db.select(db.func.count(Note.id))) == 60
+        assert counts['tasks'] == 12 and counts['events'] == 10
+
+        tagged = Note.query.filter(Note.tags.isnot(None)).first()
+        tag = tagged.tags.split(',')[0]
+        assert tagged in tags.filter_by_tag(Note.query, tag).all()
+        word = tagged.title.split()[0]
+        assert tagged.id in [note.id for note in search.filter_notes(Note.query, word)]
+        # Изображения в статьях попадают в note_image, как при сохранении через ORM
+        with_images = Note.query.filter(Note.lead_image.isnot(None)).count()
+        assert db.session.scalar(db.select(db.func.count(db.distinct(note_image.c.note_id)))) == with_images
+
+
+def test_route_helpers():
+    assert routes.query_count({'Server-Timing': 'app;dur=5.0, db;dur=1.2;desc="7 SQL", tpl;dur=0.3'}) == 7
+    assert routes.query_count({}) is None
+    assert routes.percentile(list(range(1, 101)), 0.5) == 50
+    assert routes.percentile(list(range(1, 101)), 0.95) == 95
+    assert [route.name for route in routes.select_routes('wall_guest,api_events')] == ['wall_guest', 'api_events']
@@ -0,0 +1,40 @@
+# tests/test_calendar_feed.py
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from calendar_feed import iter_occurrences
+from models import db, Event
+
+
+def _starts(event, start, end):
+    return [occurrence for occurrence, _ in iter_occurrences(event, start, end)]
+
+
+def test_monthly_recurrence_keeps_the_day_of_month():
+    event = Event(title='Отчёт', start_time=datetime(2026, 1, 31, 9), recurrence='monthly')
+    assert _starts(event, datetime(2026, 2, 1), datetime(2026, 5, 1)) == [
+        datetime(2026, 2, 28, 9), datetime(2026, 3, 31, 9), datetime(2026, 4, 30, 9)]
+
+
+def test_weekly_recurrence_is_clipped_by_window_and_until():
+    event = Event(title='Йога', start_time=datetime(2025, 1, 6, 18), end_time=datetime(2025, 1, 6, 19),
+                  recurrence='weekly', recurrence_until=datetime(2026, 3, 16, 18))
+    occurrences = list(iter_occurrences(event, datetime(2026, 3, 1), datetime(2026, 4, 1)))
+    assert occurrences == [(datetime(2026, 3, day, 18), datetime(2026, 3, day, 19)) for day in (2, 9, 16)]
+    # Вхождение, которое началось до окна, но ещё идёт, тоже попадает
+    assert _starts(event, datetime(2026, 3, 2, 18, 30), datetime(2026, 3, 3)) == [datetime(2026, 3, 2, 18)]
+
+
+def test_api_events_returns_only_the_visible_window(app, admin_client, admin_id):
+    with app.app_context():
+        db.session.add_all([
+            Event(title='Внутри', start_time=datetime(2026, 3, 10, 10), user_id=admin_id),
+            Event(title='Раньше', start_time=datetime(2026, 1, 10, 10), user_id=admin_id),
+            Event(title='Каждый день', start_time=datetime(2026, 3, 30, 8), recurrence='daily', user_id=admin_id),
+        ])
+        db.session.commit()
+    response = admin_client.get('/api/events?start=2026-03-01T00:00:00+03:00&end=2026-04-01T00:00:00+03:00')
+    titles = [item['title'] for item in response.get_json()]
+    assert titles == ['Внутри', 'Каждый день', 'Каждый день']
+    assert admin_client.get('/api/events?start=вчера').status_code == 400
@@ -0,0 +1,44 @@
+# tests/test_categories.py
+# -*- coding: utf-8 -*-
+
+from app import migrate_legacy_category_ids
+from conftest import create_note
+from models import db, Category, Note, note_categories
+
+
+def _create_categories(app, *names):
+    with app.app_context():
+        categories = [Category(name=name) for name in names]
+        db.session.add_all(categories)
+        db.session.commit()
+        return [category.id for category in categories]
+
+
+def _links(app):
+    with app.app_context():
+        return set(db.session.execute(db.select(note_categories.c.note_id, note_categories.c.category_id)).all())
+
+
+def test_note_form_writes_join_table_and_filters_by_it(app, admin_client):
+    books, films = _create_categories(app, 'Книги', 'Фильмы')
+    response = admin_client.post('/edit', data={'title': 'Про книгу', 'content': 'Текст', 'categories': [str(books), 'x']})
+    assert response.status_code == 302
+    admin_client.post('/edit', data={'title': 'Про фильм', 'content': 'Текст', 'categories': [str(films)]})
+    with app.app_context():
+        book_note = Note.query.filter_by(title='Про книгу').one().id
+
+    assert (book_note, books) in _links(app)
+    page = admin_client.get(f'/wall?category={books}').get_data(as_text=True)
+    assert 'Про книгу' in page and 'Про фильм' not in page
+
+
+def test_legacy_category_ids_are_migrated_once(app, admin_id):
+    books, films = _create_categories(app, 'Книги', 'Фильмы')
+    note_id = create_note(app, admin_id, category_ids=f'{books}, {films},999,')
+    with app.app_context():
+        assert migrate_legacy_category_ids() == 1
+        # Поле очищено — повторный запуск ничего не переносит
+        assert migrate_legacy_category_ids() == 0
+        assert db.session.get(Note, note_id).category_ids is None
+    # Несуществующая категория 999 пропущена
+    assert _links(app) == {(note_id, books), (note_id, films)}
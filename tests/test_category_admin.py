@@ -0,0 +1,38 @@
+# tests/test_category_admin.py
+# -*- coding: utf-8 -*-
+
+from models import db, Category, Note, note_categories
+
+
+def _setup(app, admin_id):
+    with app.app_context():
+        source, target = Category(name='Старое'), Category(name='Новое')
+        db.session.add_all([source, target])
+        db.session.flush()
+        both = Note(title='В обеих', user_id=admin_id, categories=[source, target])
+        only = Note(title='В старой', user_id=admin_id, categories=[source])
+        db.session.add_all([both, only])
+        db.session.commit()
+        return source.id, target.id, both.id, only.id
+
+
+def _links(app):
+    with app.app_context():
+        return sorted(db.session.execute(db.select(note_categories.c.note_id, note_categories.c.category_id)).all())
+
+
+def test_delete_category_removes_links_but_keeps_notes(app, admin_client, admin_id):
+    source, target, both, only = _setup(app, admin_id)
+    assert admin_client.post(f'/categories/delete/{source}').status_code == 302
+    with app.app_context():
+        assert db.session.get(Category, source) is None
+        assert Note.query.count() == 2
+    assert _links(app) == [(both, target)]
+
+
+def test_rename_to_existing_name_merges_without_duplicates(app, admin_client, admin_id):
+    source, target, both, only = _setup(app, admin_id)
+    admin_client.post(f'/categories/edit/{source}', data={'name': 'Новое'})
+    with app.app_context():
+        assert db.session.get(Category, source) is None
+    assert _links(app) == sorted([(both, target), (only, target)])
@@ -0,0 +1,91 @@
+# tests/test_chunked_upload.py
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import chunked_upload
+import media_store
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 8
+
+
+def _start(client, size=len(PNG)):
+    response = client.post('/uploads', json={'filename': 'big.png', 'size': size})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def _put(client, upload_id, offset, data):
+    return client.put(f'/uploads/{upload_id}', data=data, headers={'Upload-Offset': str(offset)})
+
+
+def test_upload_resumes_from_server_offset(app, admin_client):
+    upload_id = _start(admin_client)
+    assert _put(admin_client, upload_id, 0, PNG[:1000]).get_json()['offset'] == 1000
+    # Повтор той же части после обрыва: сервер называет, с чего продолжить
+    retry = _put(admin_client, upload_id, 0, PNG[:1000])
+    assert retry.status_code == 409 and retry.get_json()['offset'] == 1000
+    assert admin_client.get(f'/uploads/{upload_id}').get_json() == {'id': upload_id, 'offset': 1000, 'size': len(PNG)}
+
+    early = admin_client.post(f'/uploads/{upload_id}/complete')
+    assert early.status_code == 409 and early.get_json()['offset'] == 1000
+    assert _put(admin_client, upload_id, 1000, PNG[1000:] + b'x').status_code == 413
+    assert _put(admin_client, upload_id, 1000, PNG[1000:]).get_json()['offset'] == len(PNG)
+
+    done = admin_client.post(f'/uploads/{upload_id}/complete')
+    assert done.status_code == 200
+    name = done.get_json()['location'].rsplit('/media/', 1)[1]
+    with app.app_context():
+        with open(os.path.join(media_store.uploads_dir(), name), 'rb') as f:
+            assert f.read() == PNG
+    assert admin_client.post(f'/uploads/{upload_id}/complete').status_code == 404
+
+
+@pytest.mark.skipif(chunked_upload.fcntl is None, reason='без fcntl блокировки нет')
+def test_complete_waits_for_the_part_being_written(app, admin_client):
+    upload_id = _start(admin_client)
+    assert _put(admin_client, upload_id, 0, PNG).get_json()['offset'] == len(PNG)
+    with app.app_context():
+        part_path, _ = chunked_upload._paths(upload_id)
+    # Часть ещё пишется другим воркером
+    with open(part_path, 'r+b') as writer:
+        chunked_upload.fcntl.flock(writer, chunked_upload.fcntl.LOCK_EX)
+        busy = admin_client.post(f'/uploads/{upload_id}/complete')
+        assert busy.status_code == 409 and os.path.exists(part_path)
+    assert admin_client.post(f'/uploads/{upload_id}/complete').status_code == 200
+    assert not os.path.exists(part_path)
+
+
+def test_non_image_is_rejected(admin_client):
+    upload_id = _start(admin_client, size=4096)
+    response = _put(admin_client, upload_id, 0, b'MZ' + bytes(4094))
+    assert response.status_code == 415
+    assert admin_client.get(f'/uploads/{upload_id}').get_json()['offset'] == 0
+
+
+RESUME_KEYS_JS = '''
+const script = require('fs').readFileSync(process.argv[1], 'utf-8');
+const file = (text, lastModified) => new File([text], 'photo.png', {lastModified});
+async function keys(window) {
+    new Function('window', script)(window);
+    const key = window.chunkedUpload.resumeKey;
+    return Promise.all([key(file('aaaa', 1), 'photo.png'), key(file('aaaa', 1), 'photo.png'),
+                        key(file('bbbb', 1), 'photo.png'), key(file('aaaa', 2), 'photo.png')]);
+}
+Promise.all([keys({crypto: globalThis.crypto}), keys({})]).then(r => console.log(JSON.stringify(r)));
+'''
+
+
+@pytest.mark.skipif(not shutil.which('node'), reason='нужен node')
+def test_resume_key_distinguishes_files_with_same_name_and_size():
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static/js/chunked-upload.js')
+    result = subprocess.run(['node', '-e', RESUME_KEYS_JS, script], capture_output=True, text=True, check=True)
+    # С crypto.subtle (https, localhost) и без него (http в локальной сети)
+    for same, again, other_content, other_mtime in json.loads(result.stdout):
+        assert same == again and same.startswith('chunked-upload:photo.png:4:1:')
+        assert len({same, other_content, other_mtime}) == 3
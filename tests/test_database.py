@@ -0,0 +1,27 @@
+# tests/test_database.py
+# -*- coding: utf-8 -*-
+
+from conftest import make_app
+from models import db, schema_changes
+
+
+def test_production_profile_sets_wal_and_pool(app, tmp_path):
+    production = make_app(tmp_path, DB_PROFILE='production')
+    with production.app_context():
+        engine = db.engine
+        with engine.connect() as conn:
+            pragma = lambda name: conn.exec_driver_sql(f'PRAGMA {name}').scalar()
+            assert pragma('journal_mode') == 'wal'
+            assert pragma('busy_timeout') == 5000
+            assert pragma('synchronous') == 1 # NORMAL
+        assert engine.pool.size() == 5
+        engine.dispose()
+
+
+def test_schema_has_all_model_indexes(app):
+    with app.app_context():
+        assert schema_changes(db.engine) == []
+        plan = db.session.execute(db.text(
+            'EXPLAIN QUERY PLAN SELECT id FROM note WHERE is_published = 1 ORDER BY updated_at DESC, id DESC LIMIT 10'
+        )).all()
+        assert any('ix_note_published_updated_at_id' in row[-1] for row in plan)
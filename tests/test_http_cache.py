@@ -0,0 +1,47 @@
+# tests/test_http_cache.py
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+from conftest import create_note, login, make_app
+from models import db, Event
+
+
+def test_wall_etag_revalidates_until_notes_change(app, client, admin_id, tmp_path):
+    create_note(app, admin_id, title='Раз', is_published=True)
+    first = client.get('/wall')
+    etag = first.headers['ETag']
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    assert client.get('/wall', headers={'If-None-Match': etag}).status_code == 304
+    # Другой пользователь видит другую разметку — и другой ETag
+    assert login(app.test_client(), admin_id).get('/wall', headers={'If-None-Match': etag}).status_code == 200
+
+    # Изменение из второго экземпляра приложения на той же базе
+    other = make_app(tmp_path)
+    create_note(other, admin_id, title='Два', is_published=True)
+    with other.app_context():
+        db.engine.dispose()
+    assert client.get('/wall', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_article_last_modified_and_api_events_etag(app, client, admin_client, admin_id):
+    note_id = create_note(app, admin_id, title='Статья', note_type='article', is_published=True,
+                          full_content='<p>Текст</p>')
+    response = client.get(f'/read_article/{note_id}')
+    assert response.status_code == 200 and response.last_modified is not None
+    since = response.headers['Last-Modified']
+    assert client.get(f'/read_article/{note_id}', headers={'If-Modified-Since': since}).status_code == 304
+
+    with app.app_context():
+        db.session.add(Event(title='Встреча', start_time=datetime(2026, 3, 1, 10), user_id=admin_id))
+        db.session.commit()
+    events = admin_client.get('/api/events?start=2026-02-01&end=2026-04-01')
+    assert events.status_code == 200
+    assert admin_client.get('/api/events?start=2026-02-01&end=2026-04-01',
+                            headers={'If-None-Match': events.headers['ETag']}).status_code == 304
+    with app.app_context():
+        Event.query.one().title = 'Перенесена'
+        db.session.commit()
+    assert admin_client.get('/api/events?start=2026-02-01&end=2026-04-01',
+                            headers={'If-None-Match': events.headers['ETag']}).status_code == 200
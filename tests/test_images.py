@@ -0,0 +1,88 @@
+# tests/test_images.py
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import images
+import media_store
+import note_content
+from models import db, ImageAsset, Note, note_image
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def png_bytes(width=400, height=300):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def wait_for_workers(app):
+    # Пул из одного потока (профиль testing) выполняет задачи по порядку
+    images._get_executor(app).submit(lambda: None).result(timeout=30)
+
+
+def test_processing_waits_for_the_commit_that_references_the_image(app, admin_id):
+    with app.test_request_context():
+        name, is_new = media_store.store_upload(FileStorage(io.BytesIO(png_bytes()), filename='photo.png'))
+        note = Note(title='Статья', note_type='article', user_id=admin_id,
+                    full_content=f'<p><img src="{media_store.media_url(name)}" alt="Фото"></p>')
+        db.session.add(note)
+        # Запись ещё не сохранена — обработка откладывается до коммита
+        assert is_new and images.schedule_processing(name) is None
+        db.session.commit()
+        note_id = note.id
+    wait_for_workers(app)
+
+    with app.app_context():
+        asset = ImageAsset.query.filter_by(filename=name).one()
+        assert asset.status == 'ready' and (asset.width, asset.height) == (400, 300)
+        assert {variant['width'] for variant in asset.variants} == {320, 400}
+        # Разметка статьи пересчитана: <picture> с копиями вместо <img>
+        assert '<picture>' in db.session.get(Note, note_id).rendered_html
+
+
+def test_tinymce_upload_is_processed_without_a_note(app, admin_client):
+    response = admin_client.post('/upload_image', data={'file': (io.BytesIO(png_bytes(200, 100)), 'small.png')})
+    assert response.status_code == 200
+    wait_for_workers(app)
+    with app.app_context():
+        asset = ImageAsset.query.one()
+        assert response.get_json()['location'].endswith(asset.filename)
+        # Уже (200 px) самой маленькой копии — только WebP полной ширины
+        assert asset.status == 'ready' and [v['width'] for v in asset.variants] == [200]
+
+
+def test_refresh_uses_note_image_links_and_bumps_updated_at(app, admin_id):
+    with app.test_request_context():
+        name, _ = media_store.store_upload(FileStorage(io.BytesIO(png_bytes()), filename='photo.png'))
+        url = media_store.media_url(name)
+        article = Note(title='С фото', note_type='article', user_id=admin_id, full_content=f'<p><img src="{url}"></p>')
+        # Имя файла встречается только в тексте — это не ссылка на изображение
+        mention = Note(title='Упоминание', note_type='note', user_id=admin_id, content=f'<p>файл {name}</p>')
+        db.session.add_all([article, mention])
+        db.session.commit()
+        before = {note.id: note.updated_at for note in (article, mention)}
+        article_id, mention_id = article.id, mention.id
+    wait_for_workers(app)
+
+    with app.app_context():
+        assert db.session.execute(db.select(note_image)).all() == [(article_id, name)]
+        assert note_content.image_index_needs_rebuild() is False
+        assert images.process_image(name) is not None
+        article, mention = db.session.get(Note, article_id), db.session.get(Note, mention_id)
+        assert '<picture>' in article.rendered_html and article.updated_at > before[article_id]
+        assert mention.updated_at == before[mention_id]
+
+        # Ссылки пересобираются по тексту записей и исчезают вместе с записью
+        db.session.execute(note_image.delete())
+        db.session.commit()
+        assert note_content.image_index_needs_rebuild()
+        assert note_content.rebuild_image_index() == 2
+        assert db.session.execute(db.select(note_image.c.note_id)).scalars().all() == [article_id]
+        db.session.delete(article)
+        db.session.commit()
+        assert db.session.execute(db.select(note_image)).all() == []
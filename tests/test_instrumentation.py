@@ -0,0 +1,71 @@
+# tests/test_instrumentation.py
+# -*- coding: utf-8 -*-
+
+import logging
+import re
+
+import pytest
+
+import instrumentation
+from conftest import create_note, make_app
+from models import db
+
+
+@pytest.fixture
+def instrumented(tmp_path):
+    app = make_app(tmp_path, INSTRUMENTATION_ENABLED=True, METRICS_TOKEN='секрет'.encode().hex())
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_server_timing_and_metrics(instrumented):
+    client = instrumented.test_client()
+    response = client.get('/wall')
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    assert re.search(r'app;dur=[\d.]+', timing) and 'tpl;dur=' in timing
+    queries = int(re.search(r'desc="(\d+) SQL"', timing).group(1))
+    assert queries >= 1
+
+    # Запросы через обратный прокси приходят с 127.0.0.1 — одного адреса недостаточно
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 403
+    assert client.get('/metrics', headers={'Authorization': 'Bearer неверный'}).status_code == 403
+    token = instrumented.config['METRICS_TOKEN']
+    metrics = client.get('/metrics', headers={'Authorization': f'Bearer {token}'})
+    assert metrics.status_code == 200 and 'no-store' in metrics.headers['Cache-Control']
+    text = metrics.get_data(as_text=True)
+    assert '# TYPE notebook_request_duration_seconds histogram' in text
+    assert re.search(r'notebook_requests_total\{endpoint="wall",method="GET",status="200"\} \d+', text)
+    assert 'notebook_request_duration_seconds_bucket{endpoint="wall",le="+Inf"}' in text
+
+
+def test_repeated_sql_is_reported_as_n_plus_one(instrumented, caplog):
+    @instrumented.route('/test-n-plus-one')
+    def n_plus_one():
+        for _ in range(instrumentation.N_PLUS_ONE_THRESHOLD):
+            db.session.execute(db.text('SELECT 1 FROM note WHERE id = :id'), {'id': 1})
+        return 'ok'
+
+    with caplog.at_level(logging.WARNING, logger='instrumentation'):
+        assert instrumented.test_client().get('/test-n-plus-one').status_code == 200
+    assert any('Возможный N+1 в n_plus_one' in record.getMessage() for record in caplog.records)
+
+
+def test_disabled_by_default(app, client, admin_id):
+    create_note(app, admin_id, is_published=True)
+    assert 'Server-Timing' not in client.get('/wall').headers
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_registry_renders_prometheus_text():
+    registry = instrumentation.MetricsRegistry()
+    registry.describe('demo_total', 'Пример.', 'counter')
+    registry.inc('demo_total', (('path', 'a"b'),), 2)
+    registry.observe('demo_seconds', (), 0.02)
+    text = registry.render()
+    assert '# TYPE demo_total counter' in text
+    assert 'demo_total{path="a\\"b"} 2' in text
+    assert 'demo_seconds_bucket{le="0.01"} 0' in text and 'demo_seconds_bucket{le="0.025"} 1' in text
+    assert 'demo_seconds_count 1' in text
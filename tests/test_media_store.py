@@ -0,0 +1,69 @@
+# tests/test_media_store.py
+# -*- coding: utf-8 -*-
+
+import io
+import os
+
+from werkzeug.datastructures import FileStorage
+
+import media_store
+from conftest import create_note
+
+
+def _store(data, filename='photo.jpg'):
+    return media_store.store_upload(FileStorage(io.BytesIO(data), filename=filename))
+
+
+def test_same_content_is_stored_once_under_its_hash(app):
+    with app.app_context():
+        name, is_new = _store(b'\xff\xd8\xff' + b'x' * 1000)
+        again, again_new = _store(b'\xff\xd8\xff' + b'x' * 1000, 'other-name.JPG')
+        different, _ = _store(b'\xff\xd8\xff' + b'y' * 1000)
+        root = media_store.uploads_dir()
+        assert (is_new, again_new) == (True, False)
+        assert name == again != different
+        assert media_store.is_content_addressed(name)
+        first, second, filename = name.split('/')
+        assert filename.startswith(first + second) and filename.endswith('.jpg')
+        # Временных файлов не осталось
+        assert os.listdir(os.path.join(root, media_store.INCOMING_DIR)) == []
+
+
+def test_media_route_serves_hashed_files_as_immutable(app, client):
+    with app.app_context():
+        name, _ = _store(b'GIF89a' + b'z' * 100, 'anim.gif')
+    response = client.get(f'/media/{name}')
+    assert response.status_code == 200 and response.data.startswith(b'GIF89a')
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_gc_removes_only_old_unreferenced_files(app, admin_id):
+    with app.app_context():
+        kept, _ = _store(b'\xff\xd8\xff' + b'kept')
+        orphan, _ = _store(b'\xff\xd8\xff' + b'orphan')
+        fresh, _ = _store(b'\xff\xd8\xff' + b'fresh')
+        root = media_store.uploads_dir()
+        for name in (kept, orphan):
+            os.utime(os.path.join(root, name), (0, 0))
+    create_note(app, admin_id, content=f'<img src="/media/{kept}">')
+
+    with app.app_context():
+        assert media_store.collect_garbage(dry_run=True) == [orphan]
+        assert os.path.exists(os.path.join(root, orphan))
+        assert media_store.collect_garbage() == [orphan]
+        assert not os.path.exists(os.path.join(root, orphan))
+        # Новый файл без ссылок ещё может понадобиться редактору
+        assert os.path.exists(os.path.join(root, fresh)) and os.path.exists(os.path.join(root, kept))
+
+
+def test_reupload_restarts_gc_grace_period(app):
+    with app.app_context():
+        data = b'\xff\xd8\xff' + b'old orphan'
+        name, _ = _store(data)
+        path = os.path.join(media_store.uploads_dir(), name)
+        os.utime(path, (0, 0))
+        # Файл снова вставили в редактор, но запись ещё не сохранена
+        again, is_new = _store(data, 'again.jpg')
+        assert (again, is_new) == (name, False)
+        assert media_store.collect_garbage() == []
+        assert os.path.exists(path)
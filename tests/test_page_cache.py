@@ -0,0 +1,60 @@
+# tests/test_page_cache.py
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from conftest import create_note, make_app
+from models import db, CacheVersion, Note
+
+
+@pytest.fixture
+def workers(app, tmp_path):
+    """Два экземпляра приложения на одной базе, у каждого свой SimpleCache — как два воркера gunicorn."""
+    first = make_app(tmp_path, CACHE_TYPE='SimpleCache')
+    second = make_app(tmp_path, CACHE_TYPE='SimpleCache')
+    yield first, second
+    for worker in (first, second):
+        with worker.app_context():
+            db.engine.dispose()
+
+
+def test_anonymous_pages_are_cached_until_a_commit(workers, admin_id):
+    worker, _ = workers
+    create_note(worker, admin_id, title='Первая', is_published=True)
+    client = worker.test_client()
+    assert client.get('/wall').headers['X-Cache'] == 'MISS'
+    assert client.get('/wall').headers['X-Cache'] == 'HIT'
+
+    create_note(worker, admin_id, title='Вторая', is_published=True)
+    response = client.get('/wall')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'Вторая' in response.get_data(as_text=True)
+
+
+def test_commit_in_one_worker_invalidates_the_other(workers, admin_id):
+    first, second = workers
+    create_note(first, admin_id, title='Старая', is_published=True)
+    reader = second.test_client()
+    cached = reader.get('/wall')
+    assert reader.get('/wall').headers['X-Cache'] == 'HIT'
+
+    # Запись добавлена другим процессом (воркер, бот, фоновая обработка)
+    create_note(first, admin_id, title='Свежая', is_published=True)
+    response = reader.get('/wall')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert 'Свежая' in response.get_data(as_text=True)
+    # Старый ETag тоже больше не подходит
+    assert reader.get('/wall', headers={'If-None-Match': cached.headers['ETag']}).status_code == 200
+
+
+def test_version_is_bumped_in_the_same_transaction(app, admin_id):
+    note_id = create_note(app, admin_id)
+    with app.app_context():
+        before = {row.name: row.version for row in CacheVersion.query}
+        note = db.session.get(Note, note_id)
+        note.title = 'Изменено'
+        db.session.flush()
+        db.session.rollback()
+        # Откат убирает и увеличение версий
+        assert {row.name: row.version for row in CacheVersion.query} == before
+        assert before['lists'] >= 1 and before[f'note:{note_id}'] >= 1
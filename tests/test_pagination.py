@@ -0,0 +1,46 @@
+# tests/test_pagination.py
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timedelta
+
+from models import db, Note
+from pagination import paginate_notes
+
+BASE_TIME = datetime(2026, 1, 1, 12, 0)
+
+
+def _create_notes(app, user_id, count, published=True):
+    with app.app_context():
+        # Пары записей с одинаковым updated_at — ключу нужен id как второй столбец
+        notes = [Note(title=f'Запись {i}', user_id=user_id, is_published=published,
+                      updated_at=BASE_TIME + timedelta(minutes=i // 2)) for i in range(count)]
+        db.session.add_all(notes)
+        db.session.commit()
+        return [note.id for note in notes]
+
+
+def test_keyset_pages_cover_all_rows_once_in_order(app, admin_id):
+    _create_notes(app, admin_id, 25)
+    seen, cursor = [], None
+    with app.app_context():
+        expected = [note.id for note in Note.query.order_by(Note.updated_at.desc(), Note.id.desc())]
+        while True:
+            page = paginate_notes(Note.query, cursor, per_page=10)
+            seen.extend(note.id for note in page.items)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+    assert seen == expected
+
+
+def test_api_wall_feed_follows_cursor_and_ignores_bad_cursor(app, client, admin_id):
+    _create_notes(app, admin_id, 12)
+    first = client.get('/api/wall').get_json()
+    assert first['count'] == 10 and first['next_cursor']
+    second = client.get('/api/wall', query_string={'cursor': first['next_cursor']}).get_json()
+    assert second['count'] == 2 and second['next_cursor'] is None
+    # Самые старые записи — на второй странице
+    assert 'Запись 0' in second['html'] and 'Запись 0' not in first['html']
+
+    broken = client.get('/api/wall', query_string={'cursor': '%%%not-base64'}).get_json()
+    assert broken['count'] == 10
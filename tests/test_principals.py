@@ -0,0 +1,54 @@
+# tests/test_principals.py
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import event
+
+import principals
+from models import db, User
+
+
+def _user_selects(app, client, path):
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return response, [s for s in statements if 'FROM user' in s]
+
+
+def test_user_loader_reads_user_table_once(app, admin_client, admin_id):
+    response, selects = _user_selects(app, admin_client, '/admin')
+    assert response.status_code == 200 and len(selects) == 1
+    response, selects = _user_selects(app, admin_client, '/admin')
+    assert response.status_code == 200 and selects == []
+    assert principals.principal_cache.get(admin_id).is_admin
+
+
+def test_role_change_is_visible_after_commit(app, admin_client, admin_id):
+    assert admin_client.get('/admin').status_code == 200
+    with app.app_context():
+        db.session.get(User, admin_id).is_admin = False
+        db.session.commit()
+    assert principals.principal_cache.get(admin_id) is None
+    assert admin_client.get('/admin').status_code == 302
+
+
+def test_principal_cache_lru_and_ttl(monkeypatch):
+    cache = principals.PrincipalCache(maxsize=2, ttl=60)
+    for user_id in (1, 2):
+        cache.set(user_id, principals.UserPrincipal(user_id, f'u{user_id}', False))
+    cache.get(1)
+    cache.set(3, principals.UserPrincipal(3, 'u3', False))
+    assert cache.get(2) is None # вытеснен как давно не использованный
+    assert cache.get(1).username == 'u1'
+
+    now = principals.time.monotonic()
+    monkeypatch.setattr(principals.time, 'monotonic', lambda: now + 61)
+    assert cache.get(1) is None and cache.get(3) is None
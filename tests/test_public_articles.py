@@ -0,0 +1,42 @@
+# tests/test_public_articles.py
+# -*- coding: utf-8 -*-
+
+from sqlalchemy import event
+
+from conftest import create_note
+from models import db
+
+
+def test_listing_is_paginated_and_skips_heavy_columns(app, client, admin_id):
+    for i in range(12):
+        create_note(app, admin_id, title=f'Статья {i:02}', note_type='article', is_published=True,
+                    full_content=f'<p>Длинный текст статьи номер {i}</p>' * 50)
+    create_note(app, admin_id, title='Черновик', note_type='article', is_published=False)
+    create_note(app, admin_id, title='Просто заметка', is_published=True)
+
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        page = client.get('/public_articles').get_data(as_text=True)
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+
+    assert page.count('Статья ') == 10
+    assert 'Черновик' not in page and 'Просто заметка' not in page
+    # Карточке хватает excerpt: полный HTML статей не читается
+    note_selects = [s for s in statements if 'FROM note' in s]
+    assert note_selects and not any('full_content' in s or 'rendered_html' in s for s in note_selects)
+    assert 'Длинный текст статьи номер 11' in page # excerpt новейшей статьи
+
+
+def test_index_second_page_by_cursor(app, client, admin_id):
+    for i in range(11):
+        create_note(app, admin_id, title=f'Статья {i:02}', note_type='article', is_published=True)
+    first = client.get('/').get_data(as_text=True)
+    assert 'cursor=' in first
+    cursor = first.split('cursor=', 1)[1].split('"', 1)[0].split('&', 1)[0]
+    second = client.get(f'/?cursor={cursor}').get_data(as_text=True)
+    assert second.count('Статья ') == 1 and 'Статья 00' in second
@@ -0,0 +1,115 @@
+# tests/test_reminders.py
+# -*- coding: utf-8 -*-
+
+import os
+import time
+from datetime import timedelta
+
+import pytest
+
+import backup
+import reminders
+from models import db, Event, Reminder, Task
+
+
+@pytest.fixture
+def vladivostok():
+    """Местное время сервера UTC+10: сроки задач вводятся в нём, а не в UTC."""
+    previous = os.environ.get('TZ')
+    os.environ['TZ'] = 'Asia/Vladivostok'
+    time.tzset()
+    yield
+    if previous is None:
+        del os.environ['TZ']
+    else:
+        os.environ['TZ'] = previous
+    time.tzset()
+
+
+class RecordingSink:
+    name = 'recording'
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, user, message):
+        self.messages.append((user.username, message.title))
+        return True
+
+
+def _pending(kind):
+    return db.session.execute(
+        db.select(Reminder.entity_id, Reminder.due_at).where(Reminder.kind == kind, Reminder.status == 'pending')
+    ).all()
+
+
+def test_deadlines_are_local_wall_clock(app, admin_id, vladivostok):
+    with app.test_request_context():
+        now = reminders.local_now()
+        overdue = Task(title='Просрочена', due_date=now - timedelta(minutes=30), user_id=admin_id)
+        soon = Task(title='Скоро', due_date=now + timedelta(minutes=2), user_id=admin_id)
+        meeting = Event(title='Встреча', start_time=now + timedelta(minutes=20), user_id=admin_id)
+        db.session.add_all([overdue, soon, meeting])
+        db.session.commit()
+
+        # По UTC срок просроченной задачи ещё на 9,5 часа впереди — напоминания быть не должно
+        assert [entity_id for entity_id, _ in _pending('task')] == [soon.id]
+        assert _pending('event') == [(meeting.id, meeting.start_time - reminders.EVENT_LEAD)]
+
+        sink = RecordingSink()
+        scheduler = reminders.ReminderScheduler(app, sinks=[sink])
+        scheduler.load_window(now)
+        scheduler.dispatch_due(reminders.local_now())
+        assert sink.messages == [] # До срока ещё две минуты
+        scheduler.dispatch_due(now + timedelta(minutes=6))
+        assert sink.messages == [('admin', 'Срок задачи: Скоро'), ('admin', 'Скоро: Встреча')]
+        assert {r.status for r in Reminder.query} == {'sent'}
+
+
+def test_reminder_is_claimed_once(app, admin_id):
+    with app.test_request_context():
+        task = Task(title='Одна', due_date=reminders.local_now() + timedelta(minutes=1), user_id=admin_id)
+        db.session.add(task)
+        db.session.commit()
+        reminder_id = Reminder.query.one().id
+
+        first, second = RecordingSink(), RecordingSink()
+        later = reminders.local_now() + timedelta(minutes=2)
+        reminders.ReminderScheduler(app, sinks=[first]).dispatch(reminder_id, later)
+        reminders.ReminderScheduler(app, sinks=[second]).dispatch(reminder_id, later)
+        assert len(first.messages) == 1 and second.messages == []
+        assert db.session.get(Reminder, reminder_id).attempts == 1
+
+
+def test_import_schedules_reminders_for_imported_rows(app, admin_id):
+    with app.app_context():
+        soon = reminders.local_now() + timedelta(days=1)
+        db.session.add_all([Task(title='Задача', due_date=soon, user_id=admin_id),
+                            Event(title='Событие', start_time=soon, user_id=admin_id)])
+        db.session.commit()
+        lines = list(backup.iter_export(admin_id))
+
+        backup.import_lines(lines, admin_id)
+        task_ids = [task.id for task in Task.query.order_by(Task.id)]
+        event_ids = [event.id for event in Event.query.order_by(Event.id)]
+        assert sorted(entity_id for entity_id, _ in _pending('task')) == task_ids
+        assert sorted(entity_id for entity_id, _ in _pending('event')) == event_ids
+
+
+def test_catch_up_schedules_next_occurrence_of_missed_event(app, admin_id):
+    with app.app_context():
+        now = reminders.local_now().replace(microsecond=0)
+        start = now - timedelta(days=10) + timedelta(hours=1)
+        weekly = Event(title='Планёрка', start_time=start, recurrence='weekly', user_id=admin_id)
+        db.session.add(weekly)
+        db.session.commit()
+        # Планировщик не работал с прошлой недели: ожидает вхождение трёхдневной давности
+        reminder = Reminder.query.one()
+        reminder.occurrence = start + timedelta(days=7)
+        reminder.due_at = reminders.reminder_time('event', reminder.occurrence)
+        db.session.commit()
+
+        reminders.ReminderScheduler(app, sinks=[]).catch_up(now)
+        assert db.session.get(Reminder, reminder.id).status == 'missed'
+        next_start = start + timedelta(days=14)
+        assert _pending('event') == [(weekly.id, reminders.reminder_time('event', next_start))]
@@ -0,0 +1,41 @@
+# tests/test_search.py
+# -*- coding: utf-8 -*-
+
+import search
+from conftest import create_note
+from models import db, Note
+
+
+def _found(app, text):
+    with app.app_context():
+        return [note.id for note in search.filter_notes(Note.query, text).all()]
+
+
+def test_index_follows_note_changes(app, admin_id):
+    note_id = create_note(app, admin_id, title='Пирог с вишней', content='Рецепт теста')
+    other_id = create_note(app, admin_id, title='Заметка', content='Про вишню в саду')
+    with app.app_context():
+        assert search.fts_enabled()
+
+    # Совпадение в заголовке весит больше, чем в тексте
+    assert _found(app, 'вишней') == [note_id]
+    assert set(_found(app, 'Рецепт')) == {note_id}
+
+    with app.app_context():
+        note = db.session.get(Note, note_id)
+        note.title = 'Пирог с яблоками'
+        db.session.commit()
+    assert _found(app, 'вишней') == []
+    assert _found(app, 'яблоками') == [note_id]
+
+    with app.app_context():
+        db.session.delete(db.session.get(Note, other_id))
+        db.session.commit()
+    assert _found(app, 'вишню') == []
+
+
+def test_wall_search_highlights_matches(app, admin_client, admin_id):
+    create_note(app, admin_id, title='Поход', content='Палатка и котелок', is_published=True)
+    response = admin_client.get('/wall?search=котелок')
+    assert response.status_code == 200
+    assert '<mark>котелок</mark>' in response.get_data(as_text=True)
@@ -0,0 +1,34 @@
+# tests/test_service_worker.py
+# -*- coding: utf-8 -*-
+
+import shutil
+import subprocess
+
+
+def test_worker_script_is_revalidated_and_valid(client, tmp_path):
+    response = client.get('/service-worker.js')
+    assert response.status_code == 200
+    assert 'no-cache' in response.headers['Cache-Control']
+    assert client.get('/service-worker.js', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    script = response.get_data(as_text=True)
+    # Админка и страницы входа идут мимо кэша, приватные ответы не кэшируются
+    assert "const NEVER_CACHE_PREFIXES = ['/admin', '/login', '/logout', '/register'];" in script
+    network_first = script[script.index('function networkFirst'):]
+    assert network_first.split('\n}')[0].count('isCacheable(response)') == 1
+    assert 'clearSessionCaches()' in script
+    if shutil.which('node'):
+        path = tmp_path / 'service-worker.js'
+        path.write_text(script, encoding='utf-8')
+        subprocess.run(['node', '--check', str(path)], check=True)
+
+
+def test_admin_pages_are_not_stored_and_logout_clears_cache(admin_client):
+    response = admin_client.get('/admin')
+    assert response.status_code == 200
+    assert 'no-store' in response.headers['Cache-Control']
+    assert 'private' in response.headers['Cache-Control']
+
+    response = admin_client.get('/logout')
+    assert response.status_code == 302
+    assert response.headers['Clear-Site-Data'] == '"cache"'
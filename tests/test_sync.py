@@ -0,0 +1,111 @@
+# tests/test_sync.py
+# -*- coding: utf-8 -*-
+
+import pytest
+
+import backup
+import sync
+from conftest import create_note
+from models import db, Note, Task
+
+
+@pytest.fixture(autouse=True)
+def no_settle_delay(monkeypatch):
+    monkeypatch.setattr(sync, 'SETTLE_SECONDS', 0)
+
+
+def test_changes_and_deletions_after_cursor(app, admin_id):
+    note_id = create_note(app, admin_id, title='Запись')
+    with app.app_context():
+        tasks = [Task(title=f'Задача {i}', user_id=admin_id) for i in range(2)]
+        db.session.add_all(tasks)
+        db.session.commit()
+        task_ids = [task.id for task in tasks]
+
+        snapshot = sync.collect_changes(admin_id, True, limit=1)
+        assert snapshot['reset'] and snapshot['has_more']
+        assert [t['id'] for t in snapshot['changes']['tasks']] == task_ids[:1]
+        rest = sync.collect_changes(admin_id, True, snapshot['cursor'])
+        assert [t['id'] for t in rest['changes']['tasks']] == task_ids[1:]
+        assert not rest['reset'] and not rest['has_more']
+
+        db.session.delete(db.session.get(Task, task_ids[0]))
+        db.session.get(Note, note_id).title = 'Новый заголовок'
+        db.session.commit()
+        delta = sync.collect_changes(admin_id, True, rest['cursor'])
+        assert delta['deleted']['tasks'] == [task_ids[0]]
+        assert [n['title'] for n in delta['changes']['notes']] == ['Новый заголовок']
+        assert delta['changes']['tasks'] == []
+
+        idle = sync.collect_changes(admin_id, True, delta['cursor'])
+        assert all(not rows for rows in idle['changes'].values())
+        assert all(not ids for ids in idle['deleted'].values())
+
+        # Курсор другого пользователя не принимается
+        with pytest.raises(sync.SyncResetRequired):
+            sync.collect_changes(admin_id + 1, False, idle['cursor'])
+
+
+def test_reused_id_drops_stale_tombstone(app, admin_id):
+    with app.app_context():
+        task = Task(title='Первая', user_id=admin_id)
+        db.session.add(task)
+        db.session.commit()
+        cursor = sync.collect_changes(admin_id, True)['cursor']
+        old_id = task.id
+        db.session.delete(task)
+        db.session.commit()
+        replacement = Task(title='Вторая', user_id=admin_id)
+        db.session.add(replacement)
+        db.session.commit()
+        assert replacement.id == old_id # SQLite без AUTOINCREMENT выдаёт id последней строки повторно
+        delta = sync.collect_changes(admin_id, True, cursor)
+        assert delta['deleted']['tasks'] == []
+        assert [t['title'] for t in delta['changes']['tasks']] == ['Вторая']
+
+
+def test_import_requires_full_resync(app, admin_id, admin_client):
+    create_note(app, admin_id, title='Запись')
+    response = admin_client.get('/sync')
+    assert response.status_code == 200 and response.get_json()['reset']
+    cursor = response.get_json()['cursor']
+    with app.app_context():
+        lines = list(backup.iter_export(admin_id))
+        backup.import_lines(lines, admin_id)
+    assert admin_client.get(f'/sync?cursor={cursor}').status_code == 410
+
+
+def test_tombstone_ids_are_not_reused(app, admin_id):
+    with app.app_context():
+        task = Task(title='Первая', user_id=admin_id)
+        db.session.add(task)
+        db.session.commit()
+        db.session.delete(task)
+        db.session.commit()
+        cursor = sync.collect_changes(admin_id, True)['cursor']
+        # Новая задача получает тот же id, и её появление удаляет последнюю отметку
+        replacement = Task(title='Вторая', user_id=admin_id)
+        db.session.add(replacement)
+        db.session.commit()
+        replacement_id = replacement.id
+        db.session.delete(replacement)
+        db.session.commit()
+        delta = sync.collect_changes(admin_id, True, cursor)
+        assert delta['deleted']['tasks'] == [replacement_id]
+
+
+def test_init_database_adds_tombstone_autoincrement(app, admin_id):
+    from app import init_database
+    from models import Tombstone, schema_changes
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('DROP TABLE tombstone')
+            conn.exec_driver_sql(
+                'CREATE TABLE tombstone (id INTEGER NOT NULL PRIMARY KEY, entity VARCHAR(20) NOT NULL,'
+                ' entity_id INTEGER, user_id INTEGER, deleted_at DATETIME NOT NULL)'
+            )
+            conn.exec_driver_sql("INSERT INTO tombstone VALUES (7, 'task', 3, 1, '2026-01-01 00:00:00')")
+        assert 'AUTOINCREMENT у таблицы tombstone' in schema_changes(db.engine)
+        init_database()
+        assert schema_changes(db.engine) == []
+        assert [(t.id, t.entity_id) for t in Tombstone.query.all()] == [(7, 3)]
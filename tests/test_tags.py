@@ -0,0 +1,49 @@
+# tests/test_tags.py
+# -*- coding: utf-8 -*-
+
+import tags
+from conftest import create_note, make_app
+from models import db, Note, Tag
+
+
+def test_tag_index_follows_note_tags(app, admin_id):
+    note_id = create_note(app, admin_id, tags=' Python, flask ,python,', is_published=True)
+    draft_id = create_note(app, admin_id, tags='python', is_published=False)
+    with app.app_context():
+        assert sorted(tag.name for tag in db.session.get(Note, note_id).indexed_tags) == ['flask', 'python']
+        assert tags.tag_cloud() == [('python', 2), ('flask', 1)]
+        assert tags.tag_cloud(published_only=True) == [('flask', 1), ('python', 1)]
+        assert sorted(note.id for note in tags.filter_by_tag(Note.query, 'PYTHON ')) == [note_id, draft_id]
+
+        note = db.session.get(Note, note_id)
+        note.tags = 'flask'
+        db.session.commit()
+        assert tags.tag_cloud() == [('flask', 1), ('python', 1)]
+        assert tags.filter_by_tag(Note.query, 'нет такого').all() == []
+
+
+def test_rebuild_matches_incremental_index(app, admin_id):
+    create_note(app, admin_id, tags='a, b')
+    create_note(app, admin_id, tags='b')
+    with app.app_context():
+        before = tags.tag_cloud()
+        assert tags.rebuild_tag_index() == 2
+        assert tags.tag_cloud() == before == [('b', 2), ('a', 1)]
+        assert Tag.query.count() == 2
+
+
+def test_tag_cloud_is_refreshed_in_other_workers(app, admin_id, tmp_path):
+    # Два экземпляра на одной базе со своим SimpleCache — как два воркера gunicorn
+    first = make_app(tmp_path, CACHE_TYPE='SimpleCache')
+    second = make_app(tmp_path, CACHE_TYPE='SimpleCache')
+    note_id = create_note(first, admin_id, tags='старый', is_published=True)
+    with second.app_context():
+        assert tags.tag_cloud(published_only=True) == [('старый', 1)]
+    with first.app_context():
+        db.session.get(Note, note_id).tags = 'новый'
+        db.session.commit()
+    with second.app_context():
+        assert tags.tag_cloud(published_only=True) == [('новый', 1)]
+    for worker in (first, second):
+        with worker.app_context():
+            db.engine.dispose()
@@ -0,0 +1,68 @@
+# tests/test_telegram_bot.py
+# -*- coding: utf-8 -*-
+
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import telegram_bot
+from models import db, Note, User
+
+
+class FakeBot:
+    """Вместо Bot API: запоминает ответы, файлов не отдаёт."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+    async def get_file(self, file_id):
+        raise ConnectionError('нет сети')
+
+
+def _run_queue(app, items, batch_size):
+    bot = FakeBot()
+
+    async def scenario():
+        queue = telegram_bot.IngestQueue(app, bot, batch_size=batch_size, batch_window=0.05)
+        queue.start()
+        for item in items:
+            await queue.put(item)
+        await queue.close()
+
+    asyncio.run(scenario())
+    return bot.sent
+
+
+def test_messages_are_saved_in_batches(app, admin_id):
+    with app.app_context():
+        db.session.get(User, admin_id).telegram_id = 777
+        db.session.commit()
+
+    commits = []
+    listener = lambda session: commits.append(1)
+    event.listen(Session, 'after_commit', listener)
+    try:
+        items = [telegram_bot.CapturedMessage(777, 1, f'Запись {i}\nтекст', date=datetime(2026, 1, 2, 3, 4))
+                 for i in range(5)]
+        items.append(telegram_bot.CapturedMessage(777, 1, 'Фото', file_id='f1', file_ext='jpg', forward_from='Канал'))
+        items.append(telegram_bot.CapturedMessage(555, 2, 'Чужое'))
+        sent = _run_queue(app, items, batch_size=4)
+    finally:
+        event.remove(Session, 'after_commit', listener)
+
+    assert len(commits) == 2 # Две пачки — два коммита, а не по одному на сообщение
+    with app.app_context():
+        notes = Note.query.order_by(Note.id).all()
+        assert [note.title for note in notes] == [f'Запись {i}' for i in range(5)] + ['Фото']
+        assert notes[0].created_at == datetime(2026, 1, 2, 3, 4) and notes[0].tags == 'telegram'
+        # Вложение не скачалось — запись сохранена без него
+        assert notes[-1].image_filename is None and notes[-1].content.startswith('Переслано от: Канал')
+    # Один ответ на чат за пачку
+    assert [text for chat_id, text in sent if chat_id == 1] == ['Сохранено записей: 4', 'Сохранено записей: 2']
+    assert [text for chat_id, text in sent if chat_id == 2] == [
+        'Нет доступа: Telegram ID не привязан к администратору (узнать ID — /start)']
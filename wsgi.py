@@ -0,0 +1,72 @@
+# wsgi.py
+# -*- coding: utf-8 -*-
+
+"""
+Точка входа WSGI для gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+При импорте приложение создаётся один раз (с preload_app — в главном
+процессе gunicorn до fork), проверяется схема базы и выполняется прогрев:
+компилируются все шаблоны, заполняются кэши (пользователи, облака тегов,
+публичные страницы). Воркеры получают это состояние готовым и сразу
+отвечают быстро. После fork каждый воркер открывает свои соединения с
+базой (after_fork).
+
+Схему не создаём: несколько процессов не должны менять её одновременно.
+Перед первым запуском и после обновления кода — flask --app app init-db.
+"""
+
+import logging
+
+from app import create_app
+from models import db, schema_changes
+
+logger = logging.getLogger(__name__)
+
+# Публичные страницы, которые запрашиваются при прогреве (как гость)
+WARM_UP_PATHS = ('/', '/public_articles', '/wall')
+
+
+def check_schema(app):
+    with app.app_context():
+        missing = schema_changes(db.engine)
+    if missing:
+        raise RuntimeError('Схема базы устарела (' + ', '.join(missing[:5])
+                           + '): выполните flask --app app init-db')
+
+
+def warm_up(app):
+    """Компилирует шаблоны и заполняет кэши до приёма запросов."""
+    import principals
+    import tags
+    from models import User
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+    with app.app_context():
+        for user_id in db.session.scalars(db.select(User.id)):
+            principals.load_principal(user_id)
+        tags.tag_cloud(published_only=False)
+        tags.tag_cloud(published_only=True)
+    # Запросы через тестовый клиент: таблица маршрутов, кэш страниц и счётчиков записей
+    client = app.test_client()
+    for path in WARM_UP_PATHS:
+        response = client.get(path)
+        if response.status_code >= 400:
+            logger.warning('Прогрев: %s -> %s', path, response.status_code)
+    with app.app_context():
+        db.session.remove()
+        # Соединения главного процесса не должны достаться воркерам
+        db.engine.dispose()
+
+
+def after_fork(app):
+    """Вызывается в воркере после fork (gunicorn.conf.py: post_fork)."""
+    with app.app_context():
+        # close=False: соединения родителя не закрываем — ими он мог ещё пользоваться
+        db.engine.dispose(close=False)
+
+
+app = create_app()
+check_schema(app)
+if app.config.get('WARM_UP', True):
+    warm_up(app)